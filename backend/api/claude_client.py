@@ -1,9 +1,31 @@
 import bisect
 import logging
+from array import array
+from typing import Iterable
 
 logger = logging.getLogger(__name__)
 
 
+class PercentileRanker:
+    """Percentile rank (0-100) of values against a fixed distribution.
+
+    Holds only a sorted float array, so callers can rank contacts one at a
+    time while streaming instead of materializing every percentile up front.
+    """
+
+    def __init__(self, ltv_values: Iterable[float]):
+        self.sorted_values = array("d", sorted(ltv_values))
+
+    def __len__(self) -> int:
+        return len(self.sorted_values)
+
+    def rank(self, value: float) -> int:
+        n = len(self.sorted_values)
+        if n == 1:
+            return 50
+        return int(bisect.bisect_left(self.sorted_values, value) / (n - 1) * 100)
+
+
 def normalize_ltv_values(ltv_values: list[float]) -> list[int]:
     """Compute percentile ranks (0-100) for LTV values.
 
@@ -14,17 +36,8 @@ def normalize_ltv_values(ltv_values: list[float]) -> list[int]:
     if not ltv_values:
         return []
 
-    if len(ltv_values) == 1:
-        return [50]
-
-    sorted_vals = sorted(ltv_values)
-    n = len(sorted_vals)
-
-    result = []
-    for v in ltv_values:
-        rank = bisect.bisect_left(sorted_vals, v)
-        percentile = int(rank / (n - 1) * 100)
-        result.append(percentile)
+    ranker = PercentileRanker(ltv_values)
+    result = [ranker.rank(v) for v in ltv_values]
 
     logger.info(f"Normalization complete: {len(result)} values processed")
     return result
@@ -5,6 +5,7 @@ from typing import Any, TYPE_CHECKING
 
 import httpx
 
+from api import http_pool, rate_limiter
 from config import settings
 
 if TYPE_CHECKING:
@@ -14,6 +15,12 @@ logger = logging.getLogger(__name__)
 
 BASE_URL = "https://services.leadconnectorhq.com"
 
+
+
+class GhlPaginationError(RuntimeError):
+    """A contact listing ended before the last page (raised with raise_on_error)."""
+
+
 # TTL cache keyed by (location_id, cache_key)
 _cache: dict[str, tuple[float, Any]] = {}
 CACHE_TTL = 300  # 5 minutes
@@ -49,17 +56,29 @@ def _headers(creds: "AccountCredentials | None" = None) -> dict:
 
 
 async def _request_with_retry(
-    client: httpx.AsyncClient, method: str, url: str, max_retries: int = 4, **kwargs
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    creds: "AccountCredentials | None" = None,
+    max_retries: int = 4,
+    **kwargs,
 ) -> httpx.Response:
-    for attempt in range(max_retries + 1):
+    """
+    Request paced by the location's rate-limit bucket; 429s wait as long as
+    GHL says. Makes up to max_retries + 1 attempts and returns the last 429
+    response once they are used up.
+    """
+    bucket = rate_limiter.ghl(_location_id(creds))
+    kwargs.setdefault("headers", _headers(creds))
+    attempts = max_retries + 1
+    for attempt in range(attempts):
+        await bucket.acquire()
         resp = await client.request(method, url, **kwargs)
+        bucket.observe_ghl(resp.status_code, resp.headers)
         if resp.status_code != 429:
             return resp
-        if attempt == max_retries:
-            return resp
-        wait = 2 ** attempt
-        logger.warning(f"GHL rate limited (429), retrying in {wait}s (attempt {attempt + 1}/{max_retries})")
-        await asyncio.sleep(wait)
+        logger.warning(f"GHL rate limited (429) (attempt {attempt + 1}/{attempts})")
+    logger.error(f"GHL {method} {url} still rate limited after {attempts} attempts, giving up")
     return resp
 
 
@@ -70,18 +89,18 @@ async def get_custom_fields(creds: "AccountCredentials | None" = None) -> list[d
     if cached is not None:
         return cached
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await _request_with_retry(
-            client, "GET",
-            f"{BASE_URL}/locations/{loc}/customFields",
-            headers=_headers(creds),
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        fields = data.get("customFields", [])
-        _set_cached(cache_key, fields)
-        logger.info(f"Fetched {len(fields)} custom fields from GHL ({loc})")
-        return fields
+    resp = await _request_with_retry(
+        http_pool.get_client(BASE_URL), "GET",
+        f"{BASE_URL}/locations/{loc}/customFields",
+        creds=creds,
+        timeout=30,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    fields = data.get("customFields", [])
+    _set_cached(cache_key, fields)
+    logger.info(f"Fetched {len(fields)} custom fields from GHL ({loc})")
+    return fields
 
 
 async def get_contact_detail(
@@ -93,18 +112,49 @@ async def get_contact_detail(
     Returns None on 404. Raises on other failures.
     The list endpoint omits address fields — only this endpoint returns them.
     """
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await _request_with_retry(
-            client, "GET",
-            f"{BASE_URL}/contacts/{contact_id}",
-            headers=_headers(creds),
-        )
-        if resp.status_code == 404:
-            return None
-        resp.raise_for_status()
-        data = resp.json()
-        # GHL returns {"contact": {...}}; unwrap if needed
-        return data.get("contact") if isinstance(data, dict) and "contact" in data else data
+    resp = await _request_with_retry(
+        http_pool.get_client(BASE_URL), "GET",
+        f"{BASE_URL}/contacts/{contact_id}",
+        creds=creds,
+        timeout=30,
+    )
+    if resp.status_code == 404:
+        return None
+    resp.raise_for_status()
+    data = resp.json()
+    # GHL returns {"contact": {...}}; unwrap if needed
+    return data.get("contact") if isinstance(data, dict) and "contact" in data else data
+
+
+async def find_duplicate_contact(
+    email: str | None = None,
+    phone: str | None = None,
+    creds: "AccountCredentials | None" = None,
+) -> dict | None:
+    """
+    Targeted lookup of a single contact by exact email or phone using GHL's
+    duplicate-search endpoint. Returns None when no contact matches.
+    """
+    params: dict[str, Any] = {"locationId": _location_id(creds)}
+    if email:
+        params["email"] = email
+    elif phone:
+        params["number"] = phone
+    else:
+        return None
+
+    resp = await _request_with_retry(
+        http_pool.get_client(BASE_URL), "GET",
+        f"{BASE_URL}/contacts/search/duplicate",
+        creds=creds,
+        params=params,
+        timeout=15,
+    )
+    if resp.status_code == 404:
+        return None
+    resp.raise_for_status()
+    data = resp.json()
+    return data.get("contact") if isinstance(data, dict) else None
 
 
 async def enrich_contacts_with_address(
@@ -148,8 +198,18 @@ async def enrich_contacts_with_address(
     return list(results)
 
 
-async def get_all_contacts(creds: "AccountCredentials | None" = None) -> list[dict]:
-    """Fetch all contacts from the location using cursor-based pagination."""
+async def get_all_contacts(
+    creds: "AccountCredentials | None" = None,
+    raise_on_error: bool = False,
+) -> list[dict]:
+    """
+    Fetch all contacts from the location using cursor-based pagination.
+    By default a failed page ends the pull with what was fetched so far;
+    with raise_on_error the HTTP error propagates instead, and a pagination
+    loop or missing next-page cursor raises GhlPaginationError, so callers
+    that treat the result as the complete contact list never see a
+    truncated one.
+    """
     loc = _location_id(creds)
     all_contacts: list[dict] = []
     seen_ids: set[str] = set()
@@ -157,53 +217,117 @@ async def get_all_contacts(creds: "AccountCredentials | None" = None) -> list[di
     start_after: str | None = None
     start_after_id: str | None = None
 
-    async with httpx.AsyncClient(timeout=60) as client:
-        while True:
-            params: dict[str, Any] = {"locationId": loc, "limit": limit}
-            if start_after_id:
-                params["startAfterId"] = start_after_id
-            if start_after:
-                params["startAfter"] = start_after
-
-            resp = await _request_with_retry(
-                client, "GET",
-                f"{BASE_URL}/contacts/",
-                headers=_headers(creds),
-                params=params,
-            )
-            if resp.status_code != 200:
-                logger.error(f"Fetch contacts failed: {resp.status_code} {resp.text}")
-                break
+    client = http_pool.get_client(BASE_URL)
+    while True:
+        params: dict[str, Any] = {"locationId": loc, "limit": limit}
+        if start_after_id:
+            params["startAfterId"] = start_after_id
+        if start_after:
+            params["startAfter"] = start_after
 
-            data = resp.json()
-            contacts = data.get("contacts", [])
-            if not contacts:
-                break
+        resp = await _request_with_retry(
+            client, "GET",
+            f"{BASE_URL}/contacts/",
+            creds=creds,
+            params=params,
+            timeout=60,
+        )
+        if resp.status_code != 200:
+            logger.error(f"Fetch contacts failed: {resp.status_code} {resp.text}")
+            if raise_on_error:
+                resp.raise_for_status()
+            break
 
-            new_contacts = [c for c in contacts if c.get("id") and c["id"] not in seen_ids]
-            if not new_contacts:
-                logger.warning("Pagination loop detected, stopping")
+        data = resp.json()
+        contacts = data.get("contacts", [])
+        if not contacts:
+            break
+
+        new_contacts = [c for c in contacts if c.get("id") and c["id"] not in seen_ids]
+        if not new_contacts:
+            logger.warning("Pagination loop detected, stopping")
+            if raise_on_error:
+                raise GhlPaginationError(f"Pagination loop after {len(all_contacts)} contacts")
+            break
+        for c in new_contacts:
+            seen_ids.add(c["id"])
+        all_contacts.extend(new_contacts)
+        logger.info(f"Fetched {len(all_contacts)} contacts so far...")
+
+        if len(contacts) < limit:
+            break
+
+        meta = data.get("meta", {})
+        start_after_id = meta.get("startAfterId") or meta.get("nextPageUrl")
+        start_after = meta.get("startAfter")
+        if not start_after_id and not start_after:
+            start_after_id = contacts[-1].get("id")
+            if not start_after_id:
+                logger.warning("No next-page cursor on a full page, stopping")
+                if raise_on_error:
+                    raise GhlPaginationError(f"No next-page cursor after {len(all_contacts)} contacts")
                 break
-            for c in new_contacts:
-                seen_ids.add(c["id"])
-            all_contacts.extend(new_contacts)
-            logger.info(f"Fetched {len(all_contacts)} contacts so far...")
 
-            if len(contacts) < limit:
-                break
+    logger.info(f"Fetched {len(all_contacts)} total contacts from location {loc}")
+    return all_contacts
 
-            meta = data.get("meta", {})
-            start_after_id = meta.get("startAfterId") or meta.get("nextPageUrl")
-            start_after = meta.get("startAfter")
-            if not start_after_id and not start_after:
-                start_after_id = contacts[-1].get("id")
-                if not start_after_id:
-                    break
 
-            await asyncio.sleep(0.5)
+async def search_contacts_updated_since(
+    since: str,
+    creds: "AccountCredentials | None" = None,
+) -> list[dict]:
+    """
+    Fetch contacts whose dateUpdated is at or after `since` (ISO-8601), oldest first,
+    via the advanced search endpoint. Used by the contact mirror's incremental refresh.
+    Raises on non-2xx so callers can fall back to a full pull.
+    """
+    loc = _location_id(creds)
+    page_limit = 100
+    results: list[dict] = []
+    seen_ids: set[str] = set()
+    search_after: list | None = None
+    page = 1
+
+    client = http_pool.get_client(BASE_URL)
+    while True:
+        body: dict[str, Any] = {
+            "locationId": loc,
+            "pageLimit": page_limit,
+            "filters": [{"field": "dateUpdated", "operator": "range", "value": {"gte": since}}],
+            "sort": [{"field": "dateUpdated", "direction": "asc"}],
+        }
+        if search_after:
+            body["searchAfter"] = search_after
+        else:
+            body["page"] = page
 
-    logger.info(f"Fetched {len(all_contacts)} total contacts from location {loc}")
-    return all_contacts
+        resp = await _request_with_retry(
+            client, "POST",
+            f"{BASE_URL}/contacts/search",
+            creds=creds,
+            json=body,
+            timeout=60,
+        )
+        resp.raise_for_status()
+        contacts = resp.json().get("contacts", [])
+        if not contacts:
+            break
+
+        new_contacts = [c for c in contacts if c.get("id") and c["id"] not in seen_ids]
+        if not new_contacts:
+            logger.warning("Search pagination loop detected, stopping")
+            break
+        for c in new_contacts:
+            seen_ids.add(c["id"])
+        results.extend(new_contacts)
+
+        if len(contacts) < page_limit:
+            break
+        search_after = contacts[-1].get("searchAfter")
+        page += 1
+
+    logger.info(f"Fetched {len(results)} contacts updated since {since} from location {loc}")
+    return results
 
 
 _PRESALE_CHANNELS = {"TYPE_INSTAGRAM", "TYPE_WHATSAPP", "TYPE_FACEBOOK"}
@@ -220,39 +344,40 @@ async def fetch_conversations(
     results: list[dict] = []
     start_after_date: int | None = None
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        while len(results) < max_count:
-            params: dict[str, Any] = {"locationId": loc, "limit": 50}
-            if start_after_date:
-                params["startAfterDate"] = start_after_date
-
-            resp = await _request_with_retry(
-                client, "GET",
-                f"{BASE_URL}/conversations/search",
-                headers=_headers(creds),
-                params=params,
-            )
-            if not resp.is_success:
-                logger.warning(f"Conversations fetch failed: {resp.status_code}")
-                break
+    client = http_pool.get_client(BASE_URL)
+    while len(results) < max_count:
+        params: dict[str, Any] = {"locationId": loc, "limit": 50}
+        if start_after_date:
+            params["startAfterDate"] = start_after_date
 
-            data = resp.json()
-            convs = data.get("conversations", [])
-            if not convs:
-                break
+        resp = await _request_with_retry(
+            client, "GET",
+            f"{BASE_URL}/conversations/search",
+            creds=creds,
+            params=params,
+            timeout=30,
+        )
+        if not resp.is_success:
+            logger.warning(f"Conversations fetch failed: {resp.status_code}")
+            break
 
-            for c in convs:
-                last_msg_ts = c.get("lastMessageDate", 0)
-                if last_msg_ts < cutoff_ms:
+        data = resp.json()
+        convs = data.get("conversations", [])
+        if not convs:
+            break
+
+        for c in convs:
+            last_msg_ts = c.get("lastMessageDate", 0)
+            if last_msg_ts < cutoff_ms:
+                return results
+            if c.get("lastMessageType") in _PRESALE_CHANNELS:
+                results.append(c)
+                if len(results) >= max_count:
                     return results
-                if c.get("lastMessageType") in _PRESALE_CHANNELS:
-                    results.append(c)
-                    if len(results) >= max_count:
-                        return results
 
-            if len(convs) < 50:
-                break
-            start_after_date = convs[-1].get("lastMessageDate")
+        if len(convs) < 50:
+            break
+        start_after_date = convs[-1].get("lastMessageDate")
 
     logger.info(f"Fetched {len(results)} pre-sale conversations (last {days}d, loc={loc})")
     return results
@@ -263,17 +388,17 @@ async def fetch_conversation_messages(
     limit: int = 20,
     creds: "AccountCredentials | None" = None,
 ) -> list[dict]:
-    async with httpx.AsyncClient(timeout=20) as client:
-        resp = await _request_with_retry(
-            client, "GET",
-            f"{BASE_URL}/conversations/{conv_id}/messages",
-            headers=_headers(creds),
-            params={"limit": limit},
-        )
-        if not resp.is_success:
-            return []
-        data = resp.json()
-        msgs = data.get("messages", {})
-        if isinstance(msgs, dict):
-            return msgs.get("messages", [])
-        return msgs if isinstance(msgs, list) else []
+    resp = await _request_with_retry(
+        http_pool.get_client(BASE_URL), "GET",
+        f"{BASE_URL}/conversations/{conv_id}/messages",
+        creds=creds,
+        params={"limit": limit},
+        timeout=20,
+    )
+    if not resp.is_success:
+        return []
+    data = resp.json()
+    msgs = data.get("messages", {})
+    if isinstance(msgs, dict):
+        return msgs.get("messages", [])
+    return msgs if isinstance(msgs, list) else []
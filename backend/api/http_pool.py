@@ -0,0 +1,142 @@
+"""
+Shared, pooled httpx clients for outbound API traffic.
+
+One AsyncClient per (event loop, upstream host) so that TCP/TLS connections to
+GHL and the Graph API are reused across calls instead of re-handshaking on every
+request. Clients are created lazily and closed from the app lifespan (and at the
+end of the scheduler's private event loop).
+
+HTTP/2 is negotiated when the optional `h2` package is installed and
+HTTP2_ENABLED is on; otherwise the pool falls back to HTTP/1.1 keep-alive.
+"""
+import asyncio
+import logging
+import weakref
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+DEFAULT_TIMEOUT = 60.0
+
+# event loop → {host: client}; loops that go away drop their clients with them
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    tcp_connects: int = 0
+    tls_handshakes: int = 0
+    http2_connections: int = 0
+
+    def as_dict(self) -> dict:
+        reused = max(self.requests - self.tcp_connects, 0)
+        return {
+            "requests": self.requests,
+            "tcp_connects": self.tcp_connects,
+            "tls_handshakes": self.tls_handshakes,
+            "http2_connections": self.http2_connections,
+            "reused_requests": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+_stats: dict[str, HostStats] = {}
+
+
+def _http2_enabled() -> bool:
+    return settings.HTTP2_ENABLED and _H2_AVAILABLE
+
+
+def _make_trace(stats: HostStats):
+    async def trace(event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            stats.tcp_connects += 1
+        elif event == "connection.start_tls.complete":
+            stats.tls_handshakes += 1
+        elif event == "http2.send_connection_init.complete":
+            stats.http2_connections += 1
+    return trace
+
+
+def _build_client(host: str) -> httpx.AsyncClient:
+    stats = _stats.setdefault(host, HostStats())
+    trace = _make_trace(stats)
+
+    async def on_request(request: httpx.Request) -> None:
+        stats.requests += 1
+        request.extensions["trace"] = trace
+
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    logger.info(
+        f"Opening pooled HTTP client for {host} "
+        f"(http2={'on' if _http2_enabled() else 'off'}, max_connections={limits.max_connections})"
+    )
+    return httpx.AsyncClient(
+        timeout=DEFAULT_TIMEOUT,
+        limits=limits,
+        http2=_http2_enabled(),
+        event_hooks={"request": [on_request]},
+    )
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """Return the pooled client for the host of `url` on the running event loop.
+
+    Callers must not close or use the client as a context manager — pass a
+    per-request `timeout=` instead of building a new client.
+    """
+    host = urlsplit(url).netloc or url
+    loop = asyncio.get_running_loop()
+    per_loop = _clients.setdefault(loop, {})
+    client = per_loop.get(host)
+    if client is None or client.is_closed:
+        client = _build_client(host)
+        per_loop[host] = client
+    return client
+
+
+async def close_all() -> None:
+    """Close every pooled client owned by the running event loop."""
+    loop = asyncio.get_running_loop()
+    per_loop = _clients.pop(loop, {})
+    for host, client in per_loop.items():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled HTTP client for {host}: {e}")
+
+
+def get_stats() -> dict:
+    """Per-host connection reuse counters since process start."""
+    return {
+        "http2_available": _H2_AVAILABLE,
+        "http2_enabled": _http2_enabled(),
+        "limits": {
+            "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": settings.HTTP_KEEPALIVE_EXPIRY,
+        },
+        "open_clients": sum(
+            1 for per_loop in list(_clients.values())
+            for c in per_loop.values() if not c.is_closed
+        ),
+        "hosts": {host: s.as_dict() for host, s in sorted(_stats.items())},
+    }
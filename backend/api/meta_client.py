@@ -1,10 +1,14 @@
 import asyncio
+import json
 import logging
 import random
-from typing import Any, TYPE_CHECKING
+import time
+from itertools import islice
+from typing import Any, Iterable, Iterator, TYPE_CHECKING
 
 import httpx
 
+from api import rate_limiter
 from config import settings
 
 if TYPE_CHECKING:
@@ -15,7 +19,6 @@ logger = logging.getLogger(__name__)
 BASE_URL = "https://graph.facebook.com/v21.0"
 BATCH_SIZE = 10_000
 MAX_RETRIES = 3
-RETRY_DELAYS = [2, 4, 8]
 
 
 def _token(creds: "AccountCredentials | None") -> str:
@@ -28,29 +31,11 @@ def _ad_account(creds: "AccountCredentials | None") -> str:
 
 
 async def _request(method: str, url: str, **kwargs) -> dict:
-    for attempt in range(MAX_RETRIES):
-        try:
-            async with httpx.AsyncClient(timeout=120) as client:
-                resp = await client.request(method.upper(), url, **kwargs)
-                if resp.status_code == 429:
-                    delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
-                    logger.warning(f"Meta rate limited, retrying in {delay}s (attempt {attempt + 1})")
-                    await asyncio.sleep(delay)
-                    continue
-                if resp.status_code >= 400:
-                    logger.error(f"Meta API error {resp.status_code}: {resp.text}")
-                resp.raise_for_status()
-                return resp.json()
-        except httpx.HTTPStatusError:
-            raise
-        except Exception as e:
-            if attempt < MAX_RETRIES - 1:
-                delay = RETRY_DELAYS[attempt]
-                logger.warning(f"Meta API error: {e}, retrying in {delay}s")
-                await asyncio.sleep(delay)
-            else:
-                raise
-    raise RuntimeError("Max retries exceeded for Meta API request")
+    """Request paced by the token's rate-limit bucket (rate_limiter.meta_request); raises on HTTP errors."""
+    token = (kwargs.get("params") or {}).get("access_token", "")
+    resp = await rate_limiter.meta_request(method, url, token, timeout=120, max_attempts=MAX_RETRIES, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def audience_exists(
@@ -93,42 +78,185 @@ async def create_custom_audience(
     return {"id": audience_id, "name": name}
 
 
-async def upload_users(
+def _encode_upload_body(schema: list[str], batch: list[list[Any]], session: dict) -> bytes:
+    """Serialize one /users batch right before it is sent (compact separators)."""
+    return json.dumps(
+        {"payload": {"schema": schema, "data": batch}, "session": session},
+        separators=(",", ":"),
+    ).encode()
+
+
+def batched(rows: Iterable[list[Any]]) -> Iterator[list[list[Any]]]:
+    """Group a (possibly lazy) row stream into BATCH_SIZE upload batches."""
+    it = iter(rows)
+    while batch := list(islice(it, BATCH_SIZE)):
+        yield batch
+
+
+async def upload_batches(
     audience_id: str,
     schema: list[str],
-    data: list[list[Any]],
+    batches: Iterable[list[list[Any]]],
+    estimated_total: int,
     creds: "AccountCredentials | None" = None,
+    concurrency: int | None = None,
+    endpoint: str = "users",
+    method: str = "post",
 ) -> dict:
-    total_received = 0
-    total_invalid = 0
-    total_batches = max((len(data) + BATCH_SIZE - 1) // BATCH_SIZE, 1)
+    """
+    Send batches to one /users (or /usersreplace, or DELETE /users) session with up to `concurrency` requests in
+    flight. Batches are consumed lazily with one batch of lookahead so the
+    final one is known; it carries last_batch_flag and is only sent after
+    every earlier batch has been acknowledged, as Meta's session contract
+    requires. Each body is JSON-encoded just before its request, so at most
+    `concurrency + 1` batches are held in memory. With no batches at all
+    nothing is sent (Meta rejects empty user payloads) and the stats are
+    zeroed, with stats["batches"] == 0.
+    """
+    concurrency = max(concurrency or settings.META_UPLOAD_CONCURRENCY, 1)
     session_id = random.randint(1, 2**32)
+    url = f"{BASE_URL}/{audience_id}/{endpoint}"
+    slots = asyncio.Semaphore(concurrency)
+    batch_stats: list[dict] = []
+    in_flight: set[asyncio.Task] = set()
 
-    for i in range(0, max(len(data), 1), BATCH_SIZE):
-        batch = data[i:i + BATCH_SIZE]
-        batch_num = (i // BATCH_SIZE) + 1
-        is_last = batch_num == total_batches
-        logger.info(f"Uploading batch {batch_num}/{total_batches} ({len(batch)} contacts)")
-
+    async def send(batch: list[list[Any]], seq: int, is_last: bool) -> dict:
+        body = _encode_upload_body(schema, batch, {
+            "session_id": session_id,
+            "batch_seq": seq,
+            "last_batch_flag": is_last,
+            "estimated_num_total": estimated_total,
+        })
+        logger.info(f"{method.upper()} /{endpoint} batch {seq}{' (last)' if is_last else ''} ({len(batch)} contacts)")
+        t0 = time.perf_counter()
         result = await _request(
-            "post",
-            f"{BASE_URL}/{audience_id}/users",
+            method,
+            url,
             params={"access_token": _token(creds)},
-            json={
-                "payload": {"schema": schema, "data": batch},
-                "session": {
-                    "session_id": session_id,
-                    "batch_seq": batch_num,
-                    "last_batch_flag": is_last,
-                    "estimated_num_total": len(data),
-                },
-            },
+            content=body,
+            headers={"Content-Type": "application/json"},
         )
-        total_received += result.get("num_received", len(batch))
-        total_invalid += result.get("num_invalid_entries", 0)
+        elapsed = time.perf_counter() - t0
+        batch_stats.append({
+            "batch_seq": seq,
+            "rows": len(batch),
+            "bytes": len(body),
+            "latency_seconds": round(elapsed, 3),
+            "rows_per_second": round(len(batch) / elapsed, 1) if elapsed else None,
+            "num_received": result.get("num_received", len(batch)),
+            "num_invalid": result.get("num_invalid_entries", 0),
+        })
+        return result
+
+    async def send_bounded(batch: list[list[Any]], seq: int) -> dict:
+        try:
+            return await send(batch, seq, False)
+        finally:
+            slots.release()
+
+    def raise_failed() -> None:
+        for task in [t for t in in_flight if t.done()]:
+            in_flight.discard(task)
+            task.result()  # re-raises the batch's exception
+
+    started = time.perf_counter()
+    seq = 0
+    pending: list[list[Any]] | None = None
+    try:
+        for batch in batches:
+            if pending is not None:
+                await slots.acquire()
+                raise_failed()
+                seq += 1
+                in_flight.add(asyncio.create_task(send_bounded(pending, seq)))
+            pending = batch
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        # Meta closes the session on last_batch_flag; everything else must be in first
+        if pending is not None:
+            await send(pending, seq + 1, True)
+    except BaseException:
+        for task in in_flight:
+            task.cancel()
+        raise
+
+    elapsed = time.perf_counter() - started
+    if not batch_stats:
+        logger.info(f"/{endpoint} session skipped: no rows to send")
+        return {
+            "num_received": 0,
+            "num_invalid": 0,
+            "stats": {
+                "session_id": session_id, "concurrency": concurrency, "batches": 0, "rows": 0,
+                "elapsed_seconds": round(elapsed, 3), "rows_per_second": None,
+                "batch_latency_p50_seconds": None, "batch_latency_max_seconds": None, "per_batch": [],
+            },
+        }
+    batch_stats.sort(key=lambda b: b["batch_seq"])
+    total_rows = sum(b["rows"] for b in batch_stats)
+    total_received = sum(b["num_received"] for b in batch_stats)
+    total_invalid = sum(b["num_invalid"] for b in batch_stats)
+    latencies = sorted(b["latency_seconds"] for b in batch_stats)
+
+    logger.info(
+        f"/{endpoint} session complete: {total_received} received, {total_invalid} invalid "
+        f"({len(batch_stats)} batches, concurrency {concurrency}, {elapsed:.1f}s)"
+    )
+    return {
+        "num_received": total_received,
+        "num_invalid": total_invalid,
+        "stats": {
+            "session_id": session_id,
+            "concurrency": concurrency,
+            "batches": len(batch_stats),
+            "rows": total_rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(total_rows / elapsed, 1) if elapsed else None,
+            "batch_latency_p50_seconds": latencies[len(latencies) // 2],
+            "batch_latency_max_seconds": latencies[-1],
+            "per_batch": batch_stats,
+        },
+    }
+
 
-    logger.info(f"Upload complete: {total_received} received, {total_invalid} invalid")
-    return {"num_received": total_received, "num_invalid": total_invalid}
+async def upload_users(
+    audience_id: str,
+    schema: list[str],
+    data: list[list[Any]],
+    creds: "AccountCredentials | None" = None,
+    concurrency: int | None = None,
+) -> dict:
+    return await upload_batches(
+        audience_id, schema, batched(data), len(data), creds=creds, concurrency=concurrency,
+    )
+
+
+async def replace_users(
+    audience_id: str,
+    schema: list[str],
+    data: list[list[Any]],
+    creds: "AccountCredentials | None" = None,
+    concurrency: int | None = None,
+) -> dict:
+    """Replace the audience's entire member list (POST /usersreplace session)."""
+    return await upload_batches(
+        audience_id, schema, batched(data), len(data), creds=creds,
+        concurrency=concurrency, endpoint="usersreplace",
+    )
+
+
+async def remove_users(
+    audience_id: str,
+    schema: list[str],
+    data: list[list[Any]],
+    creds: "AccountCredentials | None" = None,
+    concurrency: int | None = None,
+) -> dict:
+    """Remove members from the audience (DELETE /users session)."""
+    return await upload_batches(
+        audience_id, schema, batched(data), len(data), creds=creds,
+        concurrency=concurrency, method="delete",
+    )
 
 
 async def find_lookalike_for_source(
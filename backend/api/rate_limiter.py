@@ -0,0 +1,341 @@
+"""
+Adaptive per-credential rate limiting for GHL and Meta.
+
+Every outbound request first takes a token from its credential's bucket
+(acquire()), and every response is fed back (observe_*()) so the bucket's
+refill rate tracks what the API says is left:
+
+  - GHL sends X-RateLimit-Max / -Interval-Milliseconds / -Remaining (burst
+    window per location) and X-RateLimit-Daily-Remaining. The bucket refills
+    at RATE_LIMIT_HEADROOM × max/interval and never holds more tokens than
+    the server reports remaining; an exhausted window pauses the bucket for
+    one interval.
+  - Meta sends x-app-usage, x-business-use-case-usage and x-ad-account-usage
+    as percentages of the rolling budget. Below META_USAGE_SLOWDOWN_PCT the
+    bucket runs at full rate; above it the rate falls linearly to a trickle
+    at 100%, and estimated_time_to_regain_access (or a throttled response)
+    pauses the bucket.
+
+Buckets are keyed per credential — GHL location id, Meta access-token
+fingerprint — so one busy account never slows another. Pauses are capped
+at MAX_BACKOFF_SECONDS: when the API asks for longer (e.g. a BUC
+estimated_time_to_regain_access of an hour) the bucket fails requests with
+RateLimited until then instead of sleeping inside a job that holds its
+lease. snapshot() exposes the current budget for /api/metrics/rate-limits.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Mapping
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Meta error codes that mean "throttled" (app, user, BUC, ads API, account)
+META_THROTTLE_CODES = {4, 17, 32, 613, 80000, 80001, 80002, 80003, 80004, 80005, 80006, 80008, 80014}
+
+MIN_RATE = 0.05              # requests/second floor while usage is near 100%
+MAX_BACKOFF_SECONDS = 300.0  # longest pause taken in-process, hinted or not
+
+
+class RateLimited(RuntimeError):
+    """The API's budget is exhausted for longer than we are willing to wait."""
+
+
+class TokenBucket:
+    """Token bucket whose rate/capacity are adjusted from response headers."""
+
+    def __init__(self, service: str, key: str, rate: float, capacity: float):
+        self.service = service
+        self.key = key
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.blocked_until = 0.0
+        self.throttle_streak = 0
+        self.requests = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+        self.usage: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _reserve(self) -> float:
+        """Take a token if one is free; otherwise return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                raise RateLimited(
+                    f"{self.service} rate limit ({self.key}): budget exhausted for another "
+                    f"{self.blocked_until - now:.0f}s"
+                )
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.requests += 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while (wait := self._reserve()) > 0:
+            self.waited_seconds += wait
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float, reason: str) -> None:
+        with self._lock:
+            if seconds > MAX_BACKOFF_SECONDS:
+                until = time.monotonic() + seconds
+                if until > self.blocked_until:
+                    self.blocked_until = until
+                    logger.error(
+                        f"{self.service} rate limit ({self.key}): blocked for {seconds:.0f}s — {reason}; "
+                        f"failing requests until then"
+                    )
+                return
+            until = time.monotonic() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                logger.warning(f"{self.service} rate limit ({self.key}): pausing {seconds:.1f}s — {reason}")
+
+    def throttled_response(self, retry_after: float | None, reason: str) -> None:
+        """Record a throttled response and pause for the server's hint, or back off."""
+        self.throttled += 1
+        self.throttle_streak += 1
+        if retry_after is None:
+            retry_after = min(2.0 ** self.throttle_streak, MAX_BACKOFF_SECONDS)
+        self.pause(retry_after, reason)
+
+    def _set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(rate, MIN_RATE)
+
+    # ── GHL ──────────────────────────────────────────────────────────────────
+
+    def observe_ghl(self, status_code: int, headers: Mapping[str, str]) -> None:
+        limit = _int(headers.get("x-ratelimit-max"))
+        interval_ms = _int(headers.get("x-ratelimit-interval-milliseconds"))
+        remaining = _int(headers.get("x-ratelimit-remaining"))
+        daily_remaining = _int(headers.get("x-ratelimit-daily-remaining"))
+        interval = interval_ms / 1000 if interval_ms else 10.0
+
+        if limit and interval_ms:
+            self.capacity = float(limit)
+            self._set_rate(limit / interval * settings.RATE_LIMIT_HEADROOM)
+        if remaining is not None:
+            with self._lock:
+                self.tokens = min(self.tokens, float(remaining))
+            self.usage = {
+                "limit": limit,
+                "interval_seconds": interval,
+                "remaining": remaining,
+                "daily_remaining": daily_remaining,
+            }
+
+        if status_code == 429:
+            self.throttled_response(_retry_after(headers) or interval, "429 Too Many Requests")
+        elif daily_remaining == 0:
+            self.pause(interval, "daily quota exhausted")
+        elif remaining == 0:
+            self.pause(interval, "burst window exhausted")
+        else:
+            self.throttle_streak = 0
+
+    # ── Meta ─────────────────────────────────────────────────────────────────
+
+    def observe_meta(self, status_code: int, headers: Mapping[str, str], error_code: int | None = None) -> None:
+        pct, regain_minutes, usage = _meta_usage(headers)
+        if usage:
+            # Not every response carries usage headers; keep the last known pace otherwise
+            self.usage = usage
+            slow_from = settings.META_USAGE_SLOWDOWN_PCT
+            if pct <= slow_from:
+                self._set_rate(self.base_rate)
+            else:
+                self._set_rate(self.base_rate * max(100 - pct, 0) / max(100 - slow_from, 1))
+
+        if status_code == 429 or error_code in META_THROTTLE_CODES:
+            hint = regain_minutes * 60 if regain_minutes else _retry_after(headers)
+            self.throttled_response(hint, f"throttled (HTTP {status_code}, code {error_code})")
+        elif regain_minutes:
+            self.pause(regain_minutes * 60, "business use case budget exhausted")
+        elif pct >= 100:
+            self.pause(60, f"usage at {pct:.0f}%")
+        else:
+            self.throttle_streak = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rate_per_second": round(self.rate, 3),
+                "capacity": self.capacity,
+                "tokens": round(self.tokens, 2),
+                "paused_for_seconds": round(max(self.paused_until - now, 0), 1),
+                "blocked_for_seconds": round(max(self.blocked_until - now, 0), 1),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited_seconds, 2),
+                "usage": self.usage,
+            }
+
+
+def _int(value: str | None) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(headers: Mapping[str, str]) -> float | None:
+    try:
+        return float(headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _meta_usage(headers: Mapping[str, str]) -> tuple[float, float, dict]:
+    """Highest usage percentage, longest regain time (minutes) and the parsed headers."""
+    pct = 0.0
+    regain = 0.0
+    usage: dict[str, Any] = {}
+
+    app = _json_header(headers, "x-app-usage")
+    if isinstance(app, dict):
+        usage["app"] = app
+        pct = max([pct] + [float(v) for v in app.values() if isinstance(v, (int, float))])
+
+    buc = _json_header(headers, "x-business-use-case-usage")
+    if isinstance(buc, dict):
+        accounts = {}
+        for business_id, entries in buc.items():
+            for entry in entries if isinstance(entries, list) else []:
+                values = [float(entry.get(k) or 0) for k in ("call_count", "total_cputime", "total_time")]
+                pct = max([pct] + values)
+                regain = max(regain, float(entry.get("estimated_time_to_regain_access") or 0))
+                accounts[business_id] = {"type": entry.get("type"), "max_pct": max(values)}
+        usage["business_use_case"] = accounts
+
+    account = _json_header(headers, "x-ad-account-usage")
+    if isinstance(account, dict):
+        usage["ad_account"] = account
+        pct = max(pct, float(account.get("acc_id_util_pct") or 0))
+
+    return pct, regain, usage
+
+
+def _json_header(headers: Mapping[str, str], name: str) -> Any:
+    raw = headers.get(name)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def meta_error_code(body: Any) -> int | None:
+    if isinstance(body, dict) and isinstance(body.get("error"), dict):
+        return body["error"].get("code")
+    return None
+
+
+# ── Registry ─────────────────────────────────────────────────────────────────
+
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+_registry_lock = threading.Lock()
+
+
+def _bucket(service: str, key: str, rate: float, capacity: float) -> TokenBucket:
+    with _registry_lock:
+        bucket = _buckets.get((service, key))
+        if bucket is None:
+            bucket = _buckets[(service, key)] = TokenBucket(service, key, rate, capacity)
+        return bucket
+
+
+def ghl(location_id: str) -> TokenBucket:
+    """Bucket for a GHL location (GHL budgets are per app × location)."""
+    rate = settings.GHL_REQUESTS_PER_SECOND
+    return _bucket("ghl", location_id or "default", rate, max(rate, 1.0))
+
+
+def meta(access_token: str) -> TokenBucket:
+    """Bucket for a Meta access token (keyed by fingerprint, never the token)."""
+    key = hashlib.sha256((access_token or "").encode()).hexdigest()[:12]
+    rate = settings.META_REQUESTS_PER_SECOND
+    return _bucket("meta", key, rate, max(rate, 1.0))
+
+
+# ── Meta requests ────────────────────────────────────────────────────────────
+
+async def meta_request(
+    method: str,
+    url: str,
+    token: str,
+    timeout: float = 60.0,
+    max_attempts: int = 3,
+    **kwargs,
+) -> httpx.Response:
+    """
+    One Graph API request paced by the token's bucket, shared by meta_client
+    and meta_audit. Throttled responses (429 or a throttle error code) are
+    fed to the bucket, which pauses as Meta's headers say, and retried;
+    transport errors retry with exponential backoff. Returns the first
+    non-throttled response, logging HTTP errors; callers decide how to raise.
+    """
+    from api import http_pool
+
+    bucket = meta(token)
+    client = http_pool.get_client(url)
+    for attempt in range(max_attempts):
+        await bucket.acquire()
+        try:
+            resp = await client.request(method.upper(), url, timeout=timeout, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = 2 ** (attempt + 1)
+            logger.warning(f"Meta API transport error: {e!r}, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            continue
+
+        error_code = None
+        if resp.status_code >= 400:
+            try:
+                error_code = meta_error_code(resp.json())
+            except ValueError:
+                pass
+        bucket.observe_meta(resp.status_code, resp.headers, error_code)
+        if resp.status_code == 429 or error_code in META_THROTTLE_CODES:
+            logger.warning(f"Meta rate limited (attempt {attempt + 1}/{max_attempts})")
+            continue
+        if resp.status_code >= 400:
+            logger.error(f"Meta API error {resp.status_code}: {resp.text[:500]}")
+        return resp
+
+    raise RateLimited(f"Meta API: still rate limited after {max_attempts} attempts ({url.split('?')[0]})")
+
+
+def snapshot() -> dict:
+    with _registry_lock:
+        buckets = list(_buckets.values())
+    out: dict[str, dict] = {}
+    for b in buckets:
+        out.setdefault(b.service, {})[b.key] = b.snapshot()
+    return out
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -6,9 +7,11 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
+from api import http_pool
 from config import settings
-from database import init_db
+from database import init_db, run_migrations
 from scheduler import start_scheduler, shutdown_scheduler
+from services import loop_monitor
 
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
@@ -21,36 +24,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def _run_migrations():
-    """Add new columns to existing tables without Alembic."""
-    from sqlalchemy import text
-    from database import engine
-    migrations = [
-        "ALTER TABLE ad_accounts ADD COLUMN IF NOT EXISTS website_url TEXT",
-        "ALTER TABLE ad_accounts ADD COLUMN IF NOT EXISTS business_profile JSONB",
-        # Conversion tracking tables (create_all handles new tables; these catch column additions)
-        "ALTER TABLE stripe_transactions ADD COLUMN IF NOT EXISTS refunded_amount INTEGER DEFAULT 0",
-        "ALTER TABLE stripe_transactions ADD COLUMN IF NOT EXISTS refund_date TIMESTAMP",
-    ]
-    with engine.connect() as conn:
-        for stmt in migrations:
-            try:
-                conn.execute(text(stmt))
-                conn.commit()
-            except Exception as e:
-                logger.warning(f"Migration skipped: {e}")
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting GHL-Meta Audience Sync application")
     init_db()
-    _run_migrations()
+    run_migrations()
     logger.info("Database tables created/verified")
     start_scheduler()
     logger.info("Scheduler started")
+    loop_monitor.start()
+    worker_stop = asyncio.Event()
+    worker_task = None
+    if settings.JOB_WORKER_EMBEDDED:
+        from services import job_queue
+        worker_task = asyncio.create_task(job_queue.run_worker(worker_stop))
     yield
     shutdown_scheduler()
+    if worker_task:
+        worker_stop.set()
+        await worker_task
+    await loop_monitor.stop()
+    await http_pool.close_all()
     logger.info("Application shutdown")
 
 
@@ -64,6 +58,8 @@ from routers.accounts import router as accounts_router
 from routers.audit import router as audit_router
 from routers.conversions import router as conversions_router
 from routers.heatmap import router as heatmap_router
+from routers.jobs import router as jobs_router
+from routers.metrics import router as metrics_router
 
 app.include_router(config_router, prefix="/api")
 app.include_router(sync_router, prefix="/api")
@@ -72,6 +68,8 @@ app.include_router(accounts_router, prefix="/api")
 app.include_router(audit_router, prefix="/api")
 app.include_router(conversions_router, prefix="/api")
 app.include_router(heatmap_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
 
 # Serve frontend static files
 static_dir = os.path.join(os.path.dirname(__file__), "static")
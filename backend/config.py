@@ -68,6 +68,79 @@ class Settings(BaseSettings):
     # Contact matching
     FUZZY_MATCH_THRESHOLD: int = 82
 
+    # GHL contact mirror: full re-pull interval (reconciles deletes) and the
+    # minimum gap between incremental refreshes
+    GHL_MIRROR_FULL_REFRESH_HOURS: int = 24
+    GHL_MIRROR_MIN_REFRESH_SECONDS: int = 60
+    # A full refresh that would delete more than this share of the mirrored
+    # contacts is treated as a short pull and deletes nothing
+    GHL_MIRROR_MAX_DELETE_FRACTION: float = 0.2
+
+    # Outbound HTTP connection pooling (one pool per upstream host)
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP2_ENABLED: bool = True
+
+    # Accounts synced in parallel by the nightly run (accounts sharing a GHL
+    # location or Meta ad account are always serialized)
+    SYNC_MAX_CONCURRENCY: int = 4
+
+    # Job queue (services/job_queue.py). Run `python -m worker` as a separate
+    # process and set JOB_WORKER_EMBEDDED=false to keep batch work out of the
+    # web process; with it true the web app also runs a worker.
+    JOB_WORKER_EMBEDDED: bool = True
+    JOB_WORKER_CONCURRENCY: int = 2
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    # Running jobs without a heartbeat for this long are requeued
+    JOB_STALE_SECONDS: int = 300
+
+    # Adaptive rate limiting (api/rate_limiter.py). Starting pace per credential
+    # until the first usage headers arrive; GHL then paces at RATE_LIMIT_HEADROOM
+    # of its advertised window, Meta slows down linearly once any usage header
+    # passes META_USAGE_SLOWDOWN_PCT.
+    GHL_REQUESTS_PER_SECOND: float = 9.0
+    META_REQUESTS_PER_SECOND: float = 5.0
+    RATE_LIMIT_HEADROOM: float = 0.9
+    META_USAGE_SLOWDOWN_PCT: float = 50.0
+
+    # Run audit insights/breakdown queries as Meta async report jobs (POST
+    # /insights, poll, then page the results) — for accounts whose 90-day
+    # daily pulls time out synchronously
+    META_ASYNC_INSIGHTS: bool = False
+    META_ASYNC_REPORT_TIMEOUT_SECONDS: int = 900
+
+    # Persistent per-day Meta insights cache (services/insights_cache.py). Days
+    # newer than META_INSIGHTS_SETTLE_DAYS are always re-downloaded since
+    # Meta's attribution can still change them.
+    META_INSIGHTS_CACHE: bool = True
+    META_INSIGHTS_SETTLE_DAYS: int = 3
+
+    # Creative metadata for audits: Batch API requests (50 ads each) in flight
+    # at once, and how long fetched creatives are reused
+    # (services/creative_cache.py; 0 disables the cache)
+    META_CREATIVE_BATCH_CONCURRENCY: int = 4
+    META_CREATIVE_CACHE_TTL_HOURS: int = 168
+
+    # Transaction sync only pages Stripe objects newer than its stored cursor,
+    # minus this overlap so payments that succeed late (ACH, 3DS) are caught
+    STRIPE_SYNC_OVERLAP_HOURS: int = 72
+    # Checkout sessions whose line items are fetched concurrently (SDK calls
+    # run in worker threads)
+    STRIPE_LINE_ITEM_CONCURRENCY: int = 8
+
+    # Audit model responses cached by hash(model, system prompt, payload)
+    # (services/analysis_cache.py); 0 disables the cache
+    LLM_ANALYSIS_CACHE_TTL_HOURS: int = 168
+
+    # Concurrent /users batch requests per Custom Audience upload session
+    META_UPLOAD_CONCURRENCY: int = 4
+
+    # Audience syncs upload only added/changed members; every N days (or when
+    # the delta is large) the whole audience is replaced instead
+    AUDIENCE_FULL_REFRESH_DAYS: int = 7
+    AUDIENCE_DELTA_MAX_FRACTION: float = 0.5
+
     # Set to a Meta test event code (e.g. TEST57877) to tag all CAPI events
     # for the Test Events tab. Remove/leave blank in production.
     CAPI_TEST_EVENT_CODE: str = ""
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, pool_size=5)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -13,6 +17,33 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 
+def run_migrations():
+    """Add new columns to existing tables without Alembic."""
+    migrations = [
+        "ALTER TABLE ad_accounts ADD COLUMN IF NOT EXISTS website_url TEXT",
+        "ALTER TABLE ad_accounts ADD COLUMN IF NOT EXISTS business_profile JSONB",
+        "ALTER TABLE sync_runs ADD COLUMN IF NOT EXISTS run_stats JSON",
+        "ALTER TABLE sync_configs ADD COLUMN IF NOT EXISTS last_full_sync_at TIMESTAMP",
+        # Conversion tracking tables (create_all handles new tables; these catch column additions)
+        "ALTER TABLE stripe_transactions ADD COLUMN IF NOT EXISTS refunded_amount INTEGER DEFAULT 0",
+        "ALTER TABLE stripe_transactions ADD COLUMN IF NOT EXISTS refund_date TIMESTAMP",
+        # Name-prefix lookups for the webhook match path (ghl_contacts mirror)
+        "DROP INDEX IF EXISTS ix_ghl_contacts_first_name",
+        "DROP INDEX IF EXISTS ix_ghl_contacts_last_name",
+        "CREATE INDEX IF NOT EXISTS ix_ghl_contacts_first_name_prefix"
+        " ON ghl_contacts (location_id, first_name varchar_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_ghl_contacts_last_name_prefix"
+        " ON ghl_contacts (location_id, last_name varchar_pattern_ops)",
+    ]
+    with engine.connect() as conn:
+        for stmt in migrations:
+            try:
+                conn.execute(text(stmt))
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Migration skipped: {e}")
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, JSON,
-    BigInteger, LargeBinary, UniqueConstraint,
+    BigInteger, LargeBinary, UniqueConstraint, Index, Date, text,
 )
 from database import Base
 
@@ -25,6 +25,7 @@ class SyncConfig(Base):
     meta_audience_id = Column(String, nullable=True)
     meta_lookalike_id = Column(String, nullable=True)
     sync_enabled = Column(Boolean, default=True)
+    last_full_sync_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
                         onupdate=lambda: datetime.now(timezone.utc))
@@ -46,6 +47,7 @@ class SyncRun(Base):
     meta_lookalike_name = Column(String, nullable=True)
     error_message = Column(Text, nullable=True)
     normalization_stats = Column(JSON, nullable=True)
+    run_stats = Column(JSON, nullable=True)
 
 
 class AdAccount(Base):
@@ -286,3 +288,194 @@ class HeatmapSnapshot(Base):
     states_with_paying = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class GhlContact(Base):
+    """
+    Local mirror of GHL contacts for a location. `data` holds the contact dict
+    exactly as the GHL API returned it; the scalar columns are normalized copies
+    used for indexed lookups (email lowercased, phone via normalize_phone).
+    """
+    __tablename__ = "ghl_contacts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    location_id = Column(String(255), nullable=False)
+    ghl_contact_id = Column(String(255), nullable=False)
+    email = Column(String(255), nullable=True, index=True)
+    phone = Column(String(50), nullable=True, index=True)
+    first_name = Column(String(255), nullable=True)
+    last_name = Column(String(255), nullable=True)
+    date_updated = Column(DateTime, nullable=True)
+    data = Column(JSON, nullable=False)
+    synced_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint("location_id", "ghl_contact_id", name="uq_ghl_contacts_location_contact"),
+        # Prefix (LIKE 'jo%') lookups for fuzzy-name candidates
+        Index("ix_ghl_contacts_first_name_prefix", "location_id", "first_name",
+              postgresql_ops={"first_name": "varchar_pattern_ops"}),
+        Index("ix_ghl_contacts_last_name_prefix", "location_id", "last_name",
+              postgresql_ops={"last_name": "varchar_pattern_ops"}),
+    )
+
+
+class GhlContactSyncState(Base):
+    """Per-location refresh bookkeeping for the ghl_contacts mirror."""
+    __tablename__ = "ghl_contact_sync_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    location_id = Column(String(255), nullable=False, unique=True)
+    high_water_mark = Column(DateTime, nullable=True)  # max dateUpdated seen
+    last_full_sync_at = Column(DateTime, nullable=True)
+    last_incremental_sync_at = Column(DateTime, nullable=True)
+    contact_count = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+
+class AudienceMember(Base):
+    """
+    What a Custom Audience was last sent for each GHL contact: the hashed
+    upload row plus fingerprints, so a sync can upload only the delta.
+    `identity_hash` covers the identifier columns only; `fingerprint` covers
+    the whole row including LOOKALIKE_VALUE.
+    """
+    __tablename__ = "audience_members"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    audience_id = Column(String(255), nullable=False, index=True)
+    ghl_contact_id = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    identity_hash = Column(String(64), nullable=False)
+    row = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint("audience_id", "ghl_contact_id", name="uq_audience_members_audience_contact"),
+    )
+
+
+# ── Job queue ────────────────────────────────────────────────────────────────
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """
+    Durable background job (syncs, backfills, audits). Claimed by workers with
+    SELECT ... FOR UPDATE SKIP LOCKED. Payloads carry ids only — never
+    credentials; handlers resolve those when they run.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(16), nullable=False, default=JobStatus.QUEUED)
+    # At most one queued/running job per key (partial unique index below)
+    dedupe_key = Column(String(255), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=1)
+    run_after = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    locked_by = Column(String(255), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index(
+            "uq_jobs_active_dedupe_key", "dedupe_key", unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+# ── Stripe sync cursors ──────────────────────────────────────────────────────
+
+class StripeSyncCursor(Base):
+    """
+    High-water mark of the transaction sync per Stripe account and object
+    type (payment_intent / charge): the newest `created` seen by the last
+    complete listing. Later syncs only page objects created after it, minus
+    STRIPE_SYNC_OVERLAP_HOURS for payments that succeed late.
+    """
+    __tablename__ = "stripe_sync_cursors"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Fingerprint of the secret key, so switching Stripe accounts starts over
+    stripe_account = Column(String(32), nullable=False)
+    object_type = Column(String(32), nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    last_object_id = Column(String(255), nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint("stripe_account", "object_type", name="uq_stripe_sync_cursor"),
+    )
+
+# ── Meta insights cache ──────────────────────────────────────────────────────
+
+class MetaInsightsCache(Base):
+    """
+    One day of Meta insight rows for an (account, level, breakdowns, query)
+    combination. Days older than the settling window never change, so audits
+    and heat maps only re-download the recent ones (services/insights_cache.py).
+    """
+    __tablename__ = "meta_insights_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account_id = Column(String(64), nullable=False)
+    level = Column(String(32), nullable=False)
+    breakdowns = Column(String(128), nullable=False, default="")
+    # Hash of the remaining query params (fields, filtering, ...)
+    fields_hash = Column(String(32), nullable=False)
+    date = Column(Date, nullable=False)
+    rows = Column(JSON, nullable=False, default=list)
+    fetched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint(
+            "account_id", "level", "breakdowns", "fields_hash", "date",
+            name="uq_meta_insights_cache_key",
+        ),
+    )
+
+
+# ── Meta creative cache ──────────────────────────────────────────────────────
+
+class MetaCreativeCache(Base):
+    """
+    Parsed creative metadata per ad (format, copy, CTA, thumbnail). Creatives
+    rarely change, so audits reuse entries younger than
+    META_CREATIVE_CACHE_TTL_HOURS (services/creative_cache.py).
+    """
+    __tablename__ = "meta_creative_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ad_id = Column(String(64), nullable=False, unique=True)
+    creative = Column(JSON, nullable=False)
+    fetched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+# ── LLM analysis cache ───────────────────────────────────────────────────────
+
+class LlmAnalysisCache(Base):
+    """
+    A model's parsed audit analysis, keyed by sha256(model, system prompt,
+    payload) so re-running an unchanged audit reuses the response instead of
+    paying for it again (services/analysis_cache.py).
+    """
+    __tablename__ = "llm_analysis_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache_key = Column(String(64), nullable=False, unique=True)
+    model = Column(String(64), nullable=False)
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
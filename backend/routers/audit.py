@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timezone
 
@@ -8,8 +7,9 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from config import settings
-from database import get_db, SessionLocal
+from database import get_db
 from models import AdAccount, AuditReport
+from services import job_queue
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -31,6 +31,10 @@ class AuditTriggerRequest(BaseModel):
     models: list[str] = ["claude"]
     include_comparison: bool = True
     report_notes: str | None = None
+    # Fetch insights via Meta async report runs (default: META_ASYNC_INSIGHTS)
+    async_insights: bool | None = None
+    # Call the models even if an identical analysis is cached
+    bypass_analysis_cache: bool = False
 
 
 def _report_to_dict(report: AuditReport, include_full: bool = False) -> dict:
@@ -82,41 +86,9 @@ def _resolve_account(account_id: str | None, db: Session):
     return env_id, token, creds
 
 
-async def _run_audit_background(
-    report_id: int,
-    account_id: str,
-    token: str,
-    models_to_run: list[str],
-    business_profile: dict | None = None,
-    website_url: str | None = None,
-    business_notes: str | None = None,
-    report_notes: str | None = None,
-    creds=None,
-):
-    db = SessionLocal()
-    try:
-        from services.meta_audit import run_audit
-        await run_audit(
-            report_id=report_id,
-            account_id=account_id,
-            token=token,
-            db=db,
-            models_to_run=models_to_run,
-            business_profile=business_profile,
-            website_url=website_url,
-            business_notes=business_notes,
-            report_notes=report_notes,
-            creds=creds,
-        )
-    except Exception as e:
-        logger.error(f"Background audit {report_id} failed: {e}", exc_info=True)
-    finally:
-        db.close()
-
-
 @router.post("/audit/trigger")
 async def trigger_audit(payload: AuditTriggerRequest, db: Session = Depends(get_db)):
-    account_id, token, creds = _resolve_account(payload.account_id, db)
+    account_id, token, _ = _resolve_account(payload.account_id, db)
 
     if not token:
         raise HTTPException(status_code=400, detail="No Meta access token configured")
@@ -160,18 +132,16 @@ async def trigger_audit(payload: AuditTriggerRequest, db: Session = Depends(get_
         account_record.last_audit_at = datetime.now(timezone.utc)
         db.commit()
 
-    business_profile = account_record.business_profile if account_record else None
-    website_url = account_record.website_url if account_record else None
-    business_notes = account_record.business_notes if account_record else None
-    formatted_notes = _fmt_contexts(report.audit_contexts)
-    asyncio.create_task(_run_audit_background(
-        report.id, account_id, token, models_to_run,
-        business_profile=business_profile,
-        website_url=website_url,
-        business_notes=business_notes,
-        report_notes=formatted_notes,
-        creds=creds,
-    ))
+    # Ids only — the worker resolves credentials and the account profile itself
+    job_queue.enqueue(db, "audit", {
+        "report_id": report.id,
+        "account_id": account_id,
+        "credentials_account_id": account_id if payload.account_id else None,
+        "models": models_to_run,
+        "report_notes": _fmt_contexts(report.audit_contexts),
+        "async_insights": payload.async_insights,
+        "bypass_analysis_cache": payload.bypass_analysis_cache,
+    }, dedupe_key=f"audit:{report.id}")
 
     return {
         "status": "started",
@@ -394,17 +364,7 @@ def regenerate_pdf(report_id: int, db: Session = Depends(get_db)):
 class ReanalyzeRequest(BaseModel):
     models: list[str] = ["claude"]
     context_text: str | None = None
-
-
-async def _reanalyze_background(report_id: int, models_to_run: list[str]):
-    db = SessionLocal()
-    try:
-        from services.meta_audit import reanalyze_audit
-        await reanalyze_audit(report_id=report_id, db=db, models_to_run=models_to_run)
-    except Exception as e:
-        logger.error(f"Background reanalysis {report_id} failed: {e}", exc_info=True)
-    finally:
-        db.close()
+    bypass_analysis_cache: bool = False
 
 
 @router.post("/audit/reports/{report_id}/reanalyze")
@@ -439,7 +399,11 @@ async def reanalyze_report(
     report.error_message = None
     db.commit()
 
-    asyncio.create_task(_reanalyze_background(report_id, models_to_run))
+    job_queue.enqueue(
+        db, "audit_reanalyze",
+        {"report_id": report_id, "models": models_to_run, "bypass_analysis_cache": payload.bypass_analysis_cache},
+        dedupe_key=f"audit:{report_id}",
+    )
 
     return {
         "status": "started",
@@ -11,7 +11,7 @@ import logging
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from sqlalchemy import desc, func
 from sqlalchemy.orm import Session
@@ -24,8 +24,9 @@ from models import (
     MatchedConversion,
     StripeTransaction,
 )
+from services import job_queue
 from services.conversion_tracker import process_conversion
-from services.transaction_sync import recompute_all_ltv, run_capi_backfill, run_transaction_sync
+from services.transaction_sync import recompute_all_ltv
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -51,6 +52,8 @@ class BackfillRequest(BaseModel):
 class TransactionSyncRequest(BaseModel):
     days_back: Optional[int] = None
     limit: int = 5000
+    # Ignore the stored sync cursor and re-list the whole window / history
+    full_resync: bool = False
 
 
 class ManualMatchRequest(BaseModel):
@@ -100,26 +103,18 @@ async def stripe_conversion_webhook(request: Request, db: Session = Depends(get_
 @router.post("/conversions/backfill")
 async def backfill_conversions(
     body: BackfillRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """Send historical stripe_transactions to Meta CAPI."""
-    background_tasks.add_task(
-        _run_backfill_bg, body.days_back, body.limit, body.dry_run, body.retry_failed
+    job, created = job_queue.enqueue(
+        db, "capi_backfill", body.model_dump(), dedupe_key="capi_backfill",
     )
-    return {"status": "started", "days_back": body.days_back, "dry_run": body.dry_run}
-
-
-async def _run_backfill_bg(days_back: int, limit: int, dry_run: bool, retry_failed: bool):
-    import traceback
-    db = SessionLocal()
-    try:
-        result = await run_capi_backfill(db, days_back, limit, dry_run, retry_failed)
-        logger.info(f"CAPI backfill complete: {result}")
-    except Exception as e:
-        logger.error(f"CAPI backfill error: {e}\n{traceback.format_exc()}")
-    finally:
-        db.close()
+    return {
+        "status": "started" if created else "already_queued",
+        "job_id": job.id,
+        "days_back": body.days_back,
+        "dry_run": body.dry_run,
+    }
 
 
 # ── Transaction sync ─────────────────────────────────────────────────────────
@@ -127,25 +122,19 @@ async def _run_backfill_bg(days_back: int, limit: int, dry_run: bool, retry_fail
 @router.post("/transactions/sync")
 async def sync_stripe_transactions(
     body: TransactionSyncRequest,
-    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
 ):
-    """Pull full Stripe payment history and build the transaction ledger."""
+    """Pull Stripe payments created since the last sync into the transaction ledger."""
     if not settings.STRIPE_SECRET_KEY:
         raise HTTPException(status_code=400, detail="STRIPE_SECRET_KEY not configured")
-    background_tasks.add_task(_run_sync_bg, body.days_back, body.limit)
-    return {"status": "started", "days_back": body.days_back}
-
-
-async def _run_sync_bg(days_back: int | None, limit: int):
-    import traceback
-    db = SessionLocal()
-    try:
-        result = await run_transaction_sync(db, days_back, limit)
-        logger.info(f"Transaction sync complete: {result}")
-    except Exception as e:
-        logger.error(f"Transaction sync error: {e}\n{traceback.format_exc()}")
-    finally:
-        db.close()
+    job, created = job_queue.enqueue(
+        db, "transaction_sync", body.model_dump(), dedupe_key="transaction_sync",
+    )
+    return {
+        "status": "started" if created else "already_queued",
+        "job_id": job.id,
+        "days_back": body.days_back,
+    }
 
 
 @router.post("/transactions/recompute-ltv")
@@ -78,7 +78,7 @@ async def generate_heatmap(
     """
     from services.credential_resolver import resolve
     from services.geographic_breakdown import build_geographic_breakdown
-    from api.ghl_client import get_all_contacts
+    from services.contact_mirror import get_contacts
 
     # Clamp days to a sane range
     days = max(1, min(int(days), 365))
@@ -109,7 +109,7 @@ async def generate_heatmap(
     until = today.isoformat()
 
     try:
-        contacts = await get_all_contacts(creds=creds)
+        contacts = await get_contacts(db, creds=creds)
     except Exception as e:
         logger.error(f"Heat map: GHL contact fetch failed: {e}")
         raise HTTPException(status_code=502, detail=f"Failed to fetch GHL contacts: {e}")
@@ -157,7 +157,7 @@ async def heatmap_pdf(
     from services.credential_resolver import resolve
     from services.geographic_breakdown import build_geographic_breakdown
     from services.heatmap_pdf import generate_heatmap_pdf
-    from api.ghl_client import get_all_contacts
+    from services.contact_mirror import get_contacts
 
     days = max(1, min(int(days), 365))
 
@@ -190,7 +190,7 @@ async def heatmap_pdf(
     until = today.isoformat()
 
     try:
-        contacts = await get_all_contacts(creds=creds)
+        contacts = await get_contacts(db, creds=creds)
     except Exception as e:
         logger.error(f"PDF: GHL contact fetch failed: {e}")
         raise HTTPException(status_code=502, detail=f"Failed to fetch GHL contacts: {e}")
@@ -0,0 +1,34 @@
+"""
+Background job queue: list and inspect queued/running/finished jobs.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import Job
+from services.job_queue import job_to_dict
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+def list_jobs(
+    status: str | None = None,
+    job_type: str | None = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+):
+    q = db.query(Job).order_by(Job.id.desc())
+    if status:
+        q = q.filter(Job.status == status)
+    if job_type:
+        q = q.filter(Job.job_type == job_type)
+    return {"items": [job_to_dict(j) for j in q.limit(min(limit, 500)).all()]}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
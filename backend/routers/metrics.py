@@ -0,0 +1,40 @@
+"""
+Operational metrics: outbound connection reuse, API rate-limit budgets, Meta
+insights cache hit rate, hot-path latency histograms and event-loop lag.
+"""
+from fastapi import APIRouter
+
+from api import http_pool, rate_limiter
+from services import insights_cache, loop_monitor, metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics/http")
+async def http_metrics():
+    """Per-host pooled HTTP client stats: requests, new TCP/TLS handshakes, reuse ratio."""
+    return http_pool.get_stats()
+
+
+@router.get("/metrics/rate-limits")
+async def rate_limit_metrics():
+    """Current GHL (per location) and Meta (per token fingerprint) rate-limit buckets and reported usage."""
+    return rate_limiter.snapshot()
+
+
+@router.get("/metrics/insights-cache")
+async def insights_cache_metrics():
+    """Meta insights cache lookups, days served from cache vs downloaded, and hit rate."""
+    return insights_cache.stats()
+
+
+@router.get("/metrics/latency")
+async def latency_metrics():
+    """Latency histograms (seconds) for instrumented paths, e.g. Stripe webhook handling."""
+    return metrics.latency_snapshot()
+
+
+@router.get("/metrics/event-loop")
+async def event_loop_metrics():
+    """Event-loop lag: how late a periodic timer fires, i.e. how long the loop was blocked."""
+    return loop_monitor.snapshot()
@@ -1,13 +1,12 @@
-import asyncio
 import logging
 from typing import Any
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from database import get_db, SessionLocal
+from database import get_db
 from models import SyncConfig, SyncRun, SyncContact, SyncStatus
-from services import sync_service
+from services import job_lease, job_queue, sync_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -32,52 +31,67 @@ def _run_to_dict(run: SyncRun) -> dict[str, Any]:
         "meta_lookalike_name": run.meta_lookalike_name,
         "error_message": run.error_message,
         "normalization_stats": run.normalization_stats,
+        "run_stats": run.run_stats,
         "duration_seconds": duration,
     }
 
 
-async def _run_sync_background(config_id: int):
-    """Run sync in background with its own DB session."""
-    db = SessionLocal()
-    try:
-        await sync_service.run_sync(config_id, db)
-    finally:
-        db.close()
-
-
 @router.post("/sync/trigger")
 async def trigger_sync(account_id: str | None = None, db: Session = Depends(get_db)):
-    if sync_service.is_sync_running():
-        raise HTTPException(status_code=409, detail="A sync is already running")
-
     q = db.query(SyncConfig).order_by(SyncConfig.id.desc())
     if account_id:
         q = q.filter(SyncConfig.meta_ad_account_id == account_id)
     config = q.first()
     if not config:
         raise HTTPException(status_code=400, detail="No sync configuration found. Please configure first.")
+    if sync_service.is_sync_running(config.id) or job_lease.is_held("sync", config.id):
+        raise HTTPException(status_code=409, detail="A sync is already running for this account")
 
-    asyncio.create_task(_run_sync_background(config.id))
-    return {"message": "Sync triggered", "config_id": config.id}
+    job, created = job_queue.enqueue(db, "sync", {"config_id": config.id}, dedupe_key=f"sync:{config.id}")
+    if not created:
+        raise HTTPException(status_code=409, detail="A sync is already queued for this account")
+    return {"message": "Sync triggered", "config_id": config.id, "job_id": job.id}
 
 
 @router.get("/sync/status")
 def get_sync_status(account_id: str | None = None, db: Session = Depends(get_db)):
-    running_id = sync_service.get_running_sync_id()
+    running = sync_service.running_syncs()
+    # Syncs leased by other workers/replicas (run id only known locally)
+    for config_id in job_lease.held_keys("sync"):
+        running.setdefault(config_id, None)
 
+    configs_q = db.query(SyncConfig).order_by(SyncConfig.id.desc())
     q = db.query(SyncRun).order_by(SyncRun.id.desc())
     if account_id:
-        config_ids = [
-            c.id for c in db.query(SyncConfig.id)
-            .filter(SyncConfig.meta_ad_account_id == account_id).all()
-        ]
+        configs_q = configs_q.filter(SyncConfig.meta_ad_account_id == account_id)
+        config_ids = [c.id for c in configs_q.all()]
         q = q.filter(SyncRun.config_id.in_(config_ids))
+        running = {cid: rid for cid, rid in running.items() if cid in config_ids}
     last_run = q.first()
 
+    accounts = []
+    for config in configs_q.all():
+        account_last = (
+            db.query(SyncRun).filter(SyncRun.config_id == config.id).order_by(SyncRun.id.desc()).first()
+        )
+        accounts.append({
+            "config_id": config.id,
+            "account_id": config.meta_ad_account_id,
+            "sync_enabled": config.sync_enabled,
+            "is_running": config.id in running,
+            "running_sync_id": running.get(config.id) or (
+                account_last.id
+                if config.id in running and account_last and account_last.status == SyncStatus.RUNNING
+                else None
+            ),
+            "last_run": _run_to_dict(account_last) if account_last else None,
+        })
+
     return {
-        "is_running": running_id is not None,
-        "running_sync_id": running_id,
+        "is_running": bool(running),
+        "running_sync_id": next((rid for rid in running.values() if rid is not None), None),
         "last_run": _run_to_dict(last_run) if last_run else None,
+        "accounts": accounts,
     }
 
 
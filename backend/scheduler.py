@@ -1,4 +1,3 @@
-import asyncio
 import logging
 
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -7,12 +6,14 @@ from apscheduler.triggers.cron import CronTrigger
 from config import settings
 from database import SessionLocal
 from models import SyncConfig
-from services import sync_service
+from services import job_lease, sync_service
 from services.transaction_sync import run_capi_backfill, run_transaction_sync
 
 logger = logging.getLogger(__name__)
 
 _scheduler: BackgroundScheduler | None = None
+# Held for the life of the process by whichever worker/replica runs scheduled jobs
+_leader_lease: job_lease.Lease | None = None
 
 
 def _parse_cron(cron_str: str) -> dict:
@@ -30,63 +31,76 @@ def _parse_cron(cron_str: str) -> dict:
 
 
 
-def _scheduled_daily_run():
+def _is_scheduler_leader() -> bool:
     """
-    Combined daily job: GHL→Meta audience sync + Stripe→CAPI conversion sync.
-    Sends one email with results from both.
+    Every process starts a BackgroundScheduler, but only the one holding the
+    scheduler lease runs jobs. The lease is kept until shutdown (or until the
+    process dies), so a later-firing replica can't re-run the same job.
+    """
+    global _leader_lease
+    if _leader_lease is not None and _leader_lease.alive():
+        return True
+    try:
+        _leader_lease = job_lease.try_acquire("scheduler")
+        logger.info("This process is now the scheduler leader")
+        return True
+    except job_lease.LeaseUnavailable:
+        _leader_lease = None
+        return False
+    except Exception as e:
+        logger.error(f"Could not acquire scheduler lease: {e}")
+        _leader_lease = None
+        return False
+
+
+async def run_daily_jobs(db) -> dict:
+    """
+    Combined daily job: GHL→Meta audience sync for every enabled account (in
+    parallel, see sync_service.run_syncs) + Stripe→CAPI conversion sync.
+    The newest config's result goes out in one combined email with the
+    conversion results; other accounts get their usual per-sync emails.
+    Runs on a job worker (job type "daily_run").
     """
     from services import email_service
+    from models import SyncRun
 
-    db = SessionLocal()
     sync_run = None
     conversion_stats = None
 
     try:
-        config = db.query(SyncConfig).order_by(SyncConfig.id.desc()).first()
-        if not config:
-            logger.warning("Daily run skipped: no sync configuration found")
-            return
-        if not config.sync_enabled:
-            logger.info("Daily run skipped: sync is disabled")
-            return
-        if sync_service.is_sync_running():
-            logger.warning("Daily run skipped: a sync is already running")
-            return
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            async def _run():
-                nonlocal sync_run, conversion_stats
-
-                # Part 1: GHL → Meta audience sync (email suppressed)
-                logger.info("Daily run: starting GHL-Meta sync...")
-                await sync_service.run_sync(config.id, db, skip_email=True)
-                sync_run = db.query(SyncConfig).get(config.id)  # refresh
-                from models import SyncRun
-                sync_run = (
-                    db.query(SyncRun)
-                    .filter_by(config_id=config.id)
-                    .order_by(SyncRun.id.desc())
-                    .first()
-                )
-
-                # Part 2: Stripe → CAPI conversion sync
-                if settings.STRIPE_SECRET_KEY:
-                    logger.info("Daily run: starting conversion sync...")
-                    result = await run_transaction_sync(db, days_back=7)
-                    new_txns = result.get("new", 0)
-                    if new_txns > 0:
-                        logger.info(f"Daily run: {new_txns} new transactions, sending to CAPI...")
-                        capi_result = await run_capi_backfill(db, days_back=7, retry_failed=False)
-                        result.update(capi_result)
-                    conversion_stats = result
-                else:
-                    conversion_stats = {"status": "skipped"}
-
-            loop.run_until_complete(_run())
-        finally:
-            loop.close()
+        configs = (
+            db.query(SyncConfig)
+            .filter(SyncConfig.sync_enabled.is_(True))
+            .order_by(SyncConfig.id.desc())
+            .all()
+        )
+        if not configs:
+            logger.warning("Daily run skipped: no enabled sync configuration found")
+            return {"status": "skipped", "reason": "no enabled sync configuration"}
+        primary = configs[0]
+
+        # Part 1: GHL → Meta audience syncs (primary account's email suppressed)
+        logger.info(f"Daily run: starting GHL-Meta sync for {len(configs)} account(s)...")
+        run_ids = await sync_service.run_syncs(
+            [c.id for c in configs],
+            SessionLocal,
+            skip_email_for={primary.id},
+        )
+        if run_ids.get(primary.id):
+            sync_run = db.query(SyncRun).get(run_ids[primary.id])
+
+        # Part 2: Stripe → CAPI conversion sync
+        if settings.STRIPE_SECRET_KEY:
+            logger.info("Daily run: starting conversion sync...")
+            result = await run_transaction_sync(db, days_back=7)
+            new_txns = result.get("new", 0)
+            if new_txns > 0:
+                logger.info(f"Daily run: {new_txns} new transactions, sending to CAPI...")
+                capi_result = await run_capi_backfill(db, days_back=7, retry_failed=False)
+                result.update(capi_result)
+            conversion_stats = result
+        else:
+            conversion_stats = {"status": "skipped"}
 
         # Send one combined email
         if sync_run:
@@ -95,14 +109,33 @@ def _scheduled_daily_run():
             except Exception as e:
                 logger.error(f"Failed to send combined sync email: {e}")
 
+        return {"sync_runs": run_ids, "conversions": conversion_stats}
+
     except Exception as e:
         logger.error(f"Daily run failed: {e}", exc_info=True)
         if sync_run:
             try:
-                from services import email_service
                 email_service.send_failure_email(sync_run, str(e))
             except Exception:
                 pass
+        raise
+
+
+def _scheduled_daily_run():
+    """Cron entry point: queue the daily run for the job workers."""
+    from services import job_queue
+
+    if not _is_scheduler_leader():
+        logger.info("Daily run skipped: another worker holds the scheduler lease")
+        return
+
+    db = SessionLocal()
+    try:
+        job, created = job_queue.enqueue(db, "daily_run", dedupe_key="daily_run")
+        if not created:
+            logger.info(f"Daily run skipped: job {job.id} is still {job.status}")
+    except Exception as e:
+        logger.error(f"Could not queue daily run: {e}", exc_info=True)
     finally:
         db.close()
 
@@ -123,7 +156,10 @@ def start_scheduler():
 
 
 def shutdown_scheduler():
-    global _scheduler
+    global _scheduler, _leader_lease
     if _scheduler:
         _scheduler.shutdown(wait=False)
         logger.info("Scheduler stopped")
+    if _leader_lease:
+        _leader_lease.release()
+        _leader_lease = None
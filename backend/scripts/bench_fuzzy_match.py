@@ -0,0 +1,152 @@
+"""
+bench_fuzzy_match.py — compare the linear fuzzy name scorer with the blocked,
+vectorized FuzzyNameMatcher on a synthetic contact set.
+
+Run from backend/ (no database or API credentials needed):
+    python scripts/bench_fuzzy_match.py [--contacts 50000] [--queries 200]
+
+The legacy scorer is O(contacts) Python calls per query, so it is timed on a
+sample of queries and extrapolated. Reports per-query latency for both engines
+and how often they agree on the best match and the top-3 candidates.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for _var, _val in (("CLAUDE_API_KEY", "bench"), ("POSTGRES_HOST", "localhost"),
+                   ("POSTGRES_USER", "bench"), ("POSTGRES_PASSWORD", "bench")):
+    os.environ.setdefault(_var, _val)
+
+from services.fuzzy_matcher import FuzzyNameMatcher  # noqa: E402
+from services.identity_resolver import _fuzzy_name_score  # noqa: E402
+
+FIRST = [
+    "james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda", "william",
+    "elizabeth", "david", "barbara", "richard", "susan", "joseph", "jessica", "thomas", "sarah",
+    "charles", "karen", "christopher", "nancy", "daniel", "lisa", "matthew", "betty", "anthony",
+    "margaret", "mark", "sandra", "donald", "ashley", "steven", "kimberly", "paul", "emily",
+    "andrew", "donna", "joshua", "michelle", "kenneth", "dorothy", "kevin", "carol", "brian",
+    "amanda", "george", "melissa", "timothy", "deborah", "priya", "wei", "mohammed", "sofia",
+]
+LAST = [
+    "smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez",
+    "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson", "thomas", "taylor",
+    "moore", "jackson", "martin", "lee", "perez", "thompson", "white", "harris", "sanchez",
+    "clark", "ramirez", "lewis", "robinson", "walker", "young", "allen", "king", "wright",
+    "scott", "torres", "nguyen", "hill", "flores", "green", "adams", "nelson", "baker", "hall",
+    "rivera", "campbell", "mitchell", "carter", "roberts", "patel", "kowalski", "okafor",
+]
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    op = rng.choice(("swap", "drop", "dup"))
+    if op == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if op == "drop":
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i] + word[i:]
+
+
+def make_contacts(n: int, rng: random.Random) -> list[dict]:
+    contacts = []
+    for i in range(n):
+        first = rng.choice(FIRST).title()
+        last = rng.choice(LAST).title() + (str(rng.randrange(10)) if rng.random() < 0.3 else "")
+        c = {"id": f"c{i}", "firstName": first, "lastName": last}
+        if rng.random() < 0.1:
+            c["contactName"] = f"{first} {last}"
+        contacts.append(c)
+    return contacts
+
+
+def make_queries(contacts: list[dict], n: int, rng: random.Random) -> list[str]:
+    queries = []
+    for _ in range(n):
+        c = rng.choice(contacts)
+        first, last = c["firstName"], c["lastName"]
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(f"{first} {last}")
+        elif kind < 0.7:
+            queries.append(f"{_typo(rng, first)} {_typo(rng, last)}")
+        elif kind < 0.85:
+            queries.append(f"{last}, {first}")
+        else:
+            queries.append(f"{rng.choice(FIRST)} {rng.choice(LAST)}")
+    return queries
+
+
+def legacy_match(name: str, contacts: list[dict], threshold: int):
+    candidates = []
+    for c in contacts:
+        first = (c.get("firstName") or "").strip()
+        last = (c.get("lastName") or "").strip()
+        full = f"{first} {last}".strip()
+        name_field = (c.get("contactName") or c.get("name") or "").strip()
+        score = max(
+            _fuzzy_name_score(name, full) if full else 0,
+            _fuzzy_name_score(name, name_field) if name_field else 0,
+        )
+        if score >= 50:
+            candidates.append({"contact": c, "score": score, "ghl_name": full or name_field})
+    candidates.sort(key=lambda x: x["score"], reverse=True)
+    top_3 = [{"id": c["contact"]["id"], "name": c["ghl_name"], "score": c["score"]}
+             for c in candidates[:3]]
+    if candidates and candidates[0]["score"] >= threshold:
+        return candidates[0]["contact"], candidates[0]["score"], top_3
+    return None, 0, top_3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-sample", type=int, default=20)
+    parser.add_argument("--threshold", type=int, default=82)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    contacts = make_contacts(args.contacts, rng)
+    queries = make_queries(contacts, args.queries, rng)
+
+    t0 = time.perf_counter()
+    matcher = FuzzyNameMatcher(contacts)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    blocked = [matcher.match(q, args.threshold) for q in queries]
+    blocked_s = time.perf_counter() - t0
+
+    sample = queries[:args.legacy_sample]
+    t0 = time.perf_counter()
+    legacy = [legacy_match(q, contacts, args.threshold) for q in sample]
+    legacy_s = time.perf_counter() - t0
+
+    best_agree = sum(
+        (a[0] or {}).get("id") == (b[0] or {}).get("id") and a[1] == b[1]
+        for a, b in zip(legacy, blocked)
+    )
+    top3_agree = sum(a[2] == b[2] for a, b in zip(legacy, blocked))
+    legacy_per_q = legacy_s / max(len(sample), 1)
+
+    print(f"contacts:             {len(contacts):,} ({len(matcher):,} name strings)")
+    print(f"index build:          {build_s * 1000:.0f} ms")
+    print(f"legacy scorer:        {legacy_per_q * 1000:.1f} ms/query "
+          f"(~{legacy_per_q * len(queries):.1f} s for {len(queries)} queries)")
+    print(f"blocked match():      {blocked_s / len(queries) * 1000:.2f} ms/query ({blocked_s:.2f} s total)")
+    print(f"speedup (match):      {legacy_per_q * len(queries) / blocked_s:.0f}x")
+    print(f"best-match agreement: {best_agree}/{len(sample)}")
+    print(f"top-3 agreement:      {top3_agree}/{len(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Content-addressed cache of audit model responses (llm_analysis_cache table).
+
+An analysis is a pure function of the model, the system prompt and the
+payload JSON, so the parsed response is stored under sha256 of the three and
+returned for byte-identical requests within LLM_ANALYSIS_CACHE_TTL_HOURS —
+e.g. a re-analysis after a context edit that did not change the payload.
+Error responses are never cached. Callers can bypass the lookup to force a
+fresh call, whose result then replaces the cached one. The cache is best
+effort both ways: lookups and writes run in a worker thread so they never
+block the event loop, and a database error just means the model is called.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import settings
+from database import SessionLocal
+from models import LlmAnalysisCache
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, system_prompt: str, payload_str: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, system_prompt, payload_str):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _load(key: str) -> dict | None:
+    """Best effort: a failed lookup is treated as a miss."""
+    db = SessionLocal()
+    try:
+        entry = db.query(LlmAnalysisCache).filter(LlmAnalysisCache.cache_key == key).first()
+        if entry is None:
+            return None
+        created = entry.created_at
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        if created < datetime.now(timezone.utc) - timedelta(hours=settings.LLM_ANALYSIS_CACHE_TTL_HOURS):
+            return None
+        return entry.response
+    except SQLAlchemyError as e:
+        logger.warning(f"Analysis cache lookup failed ({key[:12]}): {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _store(key: str, model: str, response: dict) -> None:
+    """Best effort: a failed write only means the next identical request calls the model."""
+    db = SessionLocal()
+    try:
+        db.query(LlmAnalysisCache).filter(LlmAnalysisCache.cache_key == key).delete(synchronize_session=False)
+        db.add(LlmAnalysisCache(cache_key=key, model=model, response=response))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"Analysis cache write failed ({model}): {e}")
+    finally:
+        db.close()
+
+
+async def cached_analysis(
+    model: str,
+    system_prompt: str,
+    payload_str: str,
+    analyze: Callable[[], Awaitable[dict]],
+    bypass: bool = False,
+) -> dict:
+    """Return the cached response for this exact request, or call `analyze()` and cache it."""
+    if settings.LLM_ANALYSIS_CACHE_TTL_HOURS <= 0:
+        return await analyze()
+
+    key = cache_key(model, system_prompt, payload_str)
+    if not bypass:
+        cached = await asyncio.to_thread(_load, key)
+        if cached is not None:
+            logger.info(f"Analysis cache hit for {model} ({key[:12]})")
+            return cached
+
+    result = await analyze()
+    if isinstance(result, dict) and "error" not in result:
+        await asyncio.to_thread(_store, key, model, result)
+    return result
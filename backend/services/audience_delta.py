@@ -0,0 +1,227 @@
+"""
+Delta planning for Custom Audience syncs, backed by the audience_members table.
+
+Each sync prepares the hashed upload rows as before, then compares them with
+what the audience was last sent (per GHL contact id):
+  - new contacts and contacts whose row changed are re-uploaded via POST /users;
+  - contacts that left the list are removed via DELETE /users, as are the old
+    identifiers of contacts whose email/phone/name/address hashes changed;
+  - unchanged contacts are not sent at all.
+
+Everything here works on streams: rows are classified a chunk at a time
+against the stored fingerprints, departed members are found with an
+anti-join against the ghl_contacts mirror, and store writes happen chunk by
+chunk as rows are handed to the uploader. Nothing is committed here — the
+caller commits once Meta has acknowledged the requests, so a failed sync is
+rolled back and simply retried in full on the next run.
+"""
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import AudienceMember, GhlContact, SyncConfig
+from services import contact_mirror
+
+logger = logging.getLogger(__name__)
+
+VALUE_COLUMN = "LOOKALIKE_VALUE"
+CHUNK_SIZE = 1000
+
+
+def _digest(values: list) -> str:
+    return hashlib.sha256(json.dumps(values, separators=(",", ":")).encode()).hexdigest()
+
+
+def _chunks(items: Iterable, size: int = CHUNK_SIZE) -> Iterator[list]:
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def identity_schema(schema: list[str]) -> list[str]:
+    """Upload schema without the value column — the schema used for removals."""
+    return [col for col in schema if col != VALUE_COLUMN]
+
+
+def identity_row(schema: list[str], row: list) -> list:
+    return [v for col, v in zip(schema, row) if col != VALUE_COLUMN]
+
+
+@dataclass
+class DeltaPlan:
+    # Contacts to POST /users (new or changed rows)
+    upsert_ids: list[str] = field(default_factory=list)
+    # Old identity rows of contacts whose identifiers changed (DELETE /users)
+    reidentified: list[list] = field(default_factory=list)
+    # Members no longer in the identifiable contact list (DELETE /users)
+    departed: int = 0
+    # Filled in while removal_rows() is consumed
+    departed_ids: list[str] = field(default_factory=list)
+    added: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    stored: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.upsert_ids) + len(self.reidentified) + self.departed
+
+    def summary(self) -> dict:
+        return {
+            "stored": self.stored,
+            "added": self.added,
+            "changed": self.changed,
+            "removed": self.departed,
+            "unchanged": self.unchanged,
+        }
+
+
+def stored_count(db: Session, audience_id: str) -> int:
+    return db.query(AudienceMember).filter(AudienceMember.audience_id == audience_id).count()
+
+
+def _departed_query(db: Session, audience_id: str, location_id: str):
+    present = (
+        db.query(GhlContact.id)
+        .filter(
+            GhlContact.location_id == location_id,
+            GhlContact.ghl_contact_id == AudienceMember.ghl_contact_id,
+            contact_mirror.identifiable(),
+        )
+        .exists()
+    )
+    return db.query(AudienceMember).filter(AudienceMember.audience_id == audience_id, ~present)
+
+
+def plan_delta(
+    db: Session,
+    audience_id: str,
+    location_id: str,
+    schema: list[str],
+    keyed_rows: Iterable[tuple[str, list]],
+) -> DeltaPlan:
+    """
+    Classify prepared (ghl_contact_id, row) pairs against the stored members,
+    one chunk at a time. Holds only the ids to re-upload and the superseded
+    identity rows, never the full row set.
+    """
+    plan = DeltaPlan(stored=stored_count(db, audience_id))
+    for chunk in _chunks(keyed_rows):
+        ids = [cid for cid, _ in chunk if cid]
+        stored = {
+            cid: (fp, ih, row)
+            for cid, fp, ih, row in db.query(
+                AudienceMember.ghl_contact_id, AudienceMember.fingerprint,
+                AudienceMember.identity_hash, AudienceMember.row,
+            ).filter(AudienceMember.audience_id == audience_id, AudienceMember.ghl_contact_id.in_(ids))
+        }
+        for cid, row in chunk:
+            if not cid:
+                continue
+            prev = stored.get(cid)
+            if prev and prev[0] == _digest(row):
+                plan.unchanged += 1
+                continue
+            plan.upsert_ids.append(cid)
+            if prev is None:
+                plan.added += 1
+            else:
+                plan.changed += 1
+                if prev[1] != _digest(identity_row(schema, row)):
+                    plan.reidentified.append(identity_row(schema, prev[2]))
+    plan.departed = _departed_query(db, audience_id, location_id).count()
+    return plan
+
+
+def removal_rows(
+    db: Session,
+    audience_id: str,
+    location_id: str,
+    schema: list[str],
+    plan: DeltaPlan,
+) -> Iterator[list]:
+    """Identity rows to DELETE: superseded identifiers, then departed members (streamed)."""
+    yield from plan.reidentified
+    departed = _departed_query(db, audience_id, location_id).with_entities(
+        AudienceMember.ghl_contact_id, AudienceMember.row,
+    )
+    for cid, row in departed.yield_per(CHUNK_SIZE):
+        plan.departed_ids.append(cid)
+        yield identity_row(schema, row)
+
+
+def full_refresh_reason(
+    config: SyncConfig,
+    stored: int,
+    total_rows: int,
+    plan: DeltaPlan | None = None,
+) -> str | None:
+    """Why this sync should replace the whole audience instead of sending a delta (None = delta)."""
+    if not stored:
+        return "no stored members for audience"
+    last_full = config.last_full_sync_at
+    if last_full is not None and last_full.tzinfo is None:
+        last_full = last_full.replace(tzinfo=timezone.utc)
+    if last_full is None or datetime.now(timezone.utc) - last_full >= timedelta(
+        days=settings.AUDIENCE_FULL_REFRESH_DAYS
+    ):
+        return "periodic full refresh"
+    if plan is not None and plan.size > settings.AUDIENCE_DELTA_MAX_FRACTION * max(total_rows, 1):
+        return f"delta of {plan.size} rows exceeds {settings.AUDIENCE_DELTA_MAX_FRACTION:.0%} of audience"
+    return None
+
+
+def record_members(
+    db: Session,
+    audience_id: str,
+    schema: list[str],
+    keyed_rows: Iterable[tuple[str, list]],
+) -> Iterator[list]:
+    """
+    Pass-through used while uploading: upserts each chunk of rows into the
+    store (uncommitted) and yields the bare rows on to the uploader.
+    """
+    for chunk in _chunks(keyed_rows):
+        now = datetime.now(timezone.utc)
+        values = {}
+        for cid, row in chunk:
+            if cid:
+                values[cid] = {
+                    "audience_id": audience_id,
+                    "ghl_contact_id": cid,
+                    "fingerprint": _digest(row),
+                    "identity_hash": _digest(identity_row(schema, row)),
+                    "row": row,
+                    "updated_at": now,
+                }
+        if values:
+            stmt = pg_insert(AudienceMember).values(list(values.values()))
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_audience_members_audience_contact",
+                set_={col: stmt.excluded[col] for col in ("fingerprint", "identity_hash", "row", "updated_at")},
+            )
+            db.execute(stmt)
+        for _, row in chunk:
+            yield row
+
+
+def delete_members(db: Session, audience_id: str, contact_ids: list[str] | None = None) -> None:
+    """Drop stored members (all of them when `contact_ids` is None). Uncommitted."""
+    if contact_ids is None:
+        db.query(AudienceMember).filter(AudienceMember.audience_id == audience_id).delete(
+            synchronize_session=False
+        )
+        return
+    for chunk in _chunks(contact_ids):
+        db.query(AudienceMember).filter(
+            AudienceMember.audience_id == audience_id,
+            AudienceMember.ghl_contact_id.in_(chunk),
+        ).delete(synchronize_session=False)
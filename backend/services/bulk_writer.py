@@ -0,0 +1,115 @@
+"""
+Bulk writes of per-run sync_contacts rows.
+
+Rows are added as the sync pipeline produces them and written in fixed-size
+chunks — one COPY ... FROM STDIN (CSV) per chunk on Postgres, a Core
+executemany insert on any other dialect — so memory stays bounded by
+CHUNK_SIZE regardless of how many contacts a run has, and no ORM objects are
+built.
+"""
+import io
+import logging
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from models import SyncContact
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+SYNC_CONTACT_COLUMNS = (
+    "sync_run_id", "ghl_contact_id", "email", "phone", "first_name", "last_name",
+    "raw_ltv", "normalized_value", "meta_matched", "created_at",
+)
+
+
+def _csv_field(value: Any) -> str:
+    """COPY CSV encoding: unquoted empty = NULL, strings always quoted."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_chunk(cursor, table: str, columns: tuple[str, ...], chunk: list[tuple]) -> None:
+    buf = io.StringIO()
+    for row in chunk:
+        buf.write(",".join(_csv_field(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+class SyncContactWriter:
+    """
+    add() sync_contacts rows for a run as they are produced — dicts with the
+    SyncContact column names (minus sync_run_id/created_at) — and close() to
+    flush the tail. Does not commit. Timing covers only the database writes.
+    """
+
+    def __init__(self, db: Session, sync_run_id: int):
+        self.db = db
+        self.sync_run_id = sync_run_id
+        self.created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.use_copy = db.get_bind().dialect.name == "postgresql"
+        self.rows = 0
+        self.seconds = 0.0
+        self._chunk: list[tuple] = []
+
+    def add(self, contact: dict) -> None:
+        self._chunk.append((
+            self.sync_run_id,
+            contact["ghl_contact_id"],
+            contact.get("email"),
+            contact.get("phone"),
+            contact.get("first_name"),
+            contact.get("last_name"),
+            contact.get("raw_ltv", 0),
+            contact.get("normalized_value", 0),
+            contact.get("meta_matched", False),
+            self.created_at,
+        ))
+        if len(self._chunk) >= CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._chunk:
+            return
+        start = time.perf_counter()
+        if self.use_copy:
+            cursor = self.db.connection().connection.cursor()
+            try:
+                _copy_chunk(cursor, SyncContact.__tablename__, SYNC_CONTACT_COLUMNS, self._chunk)
+            finally:
+                cursor.close()
+        else:
+            self.db.execute(
+                SyncContact.__table__.insert(),
+                [dict(zip(SYNC_CONTACT_COLUMNS, r)) for r in self._chunk],
+            )
+        self.seconds += time.perf_counter() - start
+        self.rows += len(self._chunk)
+        self._chunk = []
+
+    def close(self) -> dict:
+        """Flush remaining rows; returns {"rows", "seconds", "rows_per_second", "method"}."""
+        self._flush()
+        rate = round(self.rows / self.seconds, 1) if self.seconds else None
+        logger.info(f"Wrote {self.rows} sync_contacts rows in {self.seconds:.2f}s ({rate} rows/s)")
+        return {
+            "rows": self.rows,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": rate,
+            "method": "copy" if self.use_copy else "insert",
+        }
+
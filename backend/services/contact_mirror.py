@@ -0,0 +1,350 @@
+"""
+Local Postgres mirror of GHL contacts (ghl_contacts table).
+
+The first refresh for a location pages the whole contact list once; after that
+only contacts whose dateUpdated is past the stored high-water mark are pulled
+from the search endpoint and upserted. A periodic full pull reconciles deletes.
+
+Downstream callers use get_contacts(), which returns contact dicts in the same
+shape as ghl_client.get_all_contacts but reads them from Postgres, or
+ensure_fresh() + iter_contacts() to stream them without loading the location.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Iterator, TYPE_CHECKING
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from api import ghl_client
+from config import settings
+from models import GhlContact, GhlContactSyncState
+from services.identity_resolver import normalize_phone
+
+if TYPE_CHECKING:
+    from services.credential_resolver import AccountCredentials
+
+logger = logging.getLogger(__name__)
+
+UPSERT_CHUNK_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+# Re-read a small window before the high-water mark so contacts updated in the
+# same second as the last refresh (or with slight clock skew) aren't missed.
+HIGH_WATER_OVERLAP = timedelta(minutes=5)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_ghl_date(value: Any) -> datetime | None:
+    """Parse a GHL ISO timestamp into a naive UTC datetime."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _contact_row(location_id: str, contact: dict, synced_at: datetime) -> dict:
+    return {
+        "location_id": location_id,
+        "ghl_contact_id": contact["id"],
+        "email": (contact.get("email") or "").lower().strip() or None,
+        "phone": normalize_phone(contact.get("phone") or "") or None,
+        "first_name": (contact.get("firstName") or "").lower().strip() or None,
+        "last_name": (contact.get("lastName") or "").lower().strip() or None,
+        "date_updated": _parse_ghl_date(contact.get("dateUpdated")),
+        "data": contact,
+        "synced_at": synced_at,
+    }
+
+
+def upsert_contacts(db: Session, location_id: str, contacts: list[dict]) -> int:
+    """Insert or update contacts in the mirror. Returns the number of rows written."""
+    synced_at = _utcnow()
+    rows = [_contact_row(location_id, c, synced_at) for c in contacts if c.get("id")]
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[i:i + UPSERT_CHUNK_SIZE]
+        stmt = pg_insert(GhlContact).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_ghl_contacts_location_contact",
+            set_={
+                col: stmt.excluded[col]
+                for col in ("email", "phone", "first_name", "last_name", "date_updated", "data", "synced_at")
+            },
+        )
+        db.execute(stmt)
+    db.commit()
+    return len(rows)
+
+
+def _max_date_updated(contacts: list[dict], current: datetime | None) -> datetime | None:
+    hwm = current
+    for c in contacts:
+        dt = _parse_ghl_date(c.get("dateUpdated"))
+        if dt and (hwm is None or dt > hwm):
+            hwm = dt
+    return hwm
+
+
+def _get_state(db: Session, location_id: str) -> GhlContactSyncState:
+    state = db.query(GhlContactSyncState).filter_by(location_id=location_id).first()
+    if not state:
+        state = GhlContactSyncState(location_id=location_id)
+        db.add(state)
+        db.commit()
+    return state
+
+
+async def refresh_contacts(
+    db: Session,
+    creds: "AccountCredentials | None" = None,
+    full: bool = False,
+) -> dict:
+    """
+    Bring the mirror up to date for the credential's location.
+
+    Runs a full pull on first use, when `full` is set, or when the last full
+    pull is older than GHL_MIRROR_FULL_REFRESH_HOURS; otherwise fetches only
+    contacts changed since the high-water mark. Returns refresh stats.
+    """
+    location_id = ghl_client._location_id(creds)
+    state = _get_state(db, location_id)
+    now = _utcnow()
+
+    full_due = (
+        state.last_full_sync_at is None
+        or state.high_water_mark is None
+        or now - state.last_full_sync_at >= timedelta(hours=settings.GHL_MIRROR_FULL_REFRESH_HOURS)
+    )
+
+    if not (full or full_due):
+        last = state.last_incremental_sync_at or state.last_full_sync_at
+        if last and (now - last).total_seconds() < settings.GHL_MIRROR_MIN_REFRESH_SECONDS:
+            return {"mode": "fresh", "fetched": 0, "location_id": location_id}
+
+        since = (state.high_water_mark - HIGH_WATER_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        try:
+            changed = await ghl_client.search_contacts_updated_since(since, creds=creds)
+        except Exception as e:
+            logger.warning(f"Incremental contact refresh failed for {location_id}, falling back to full pull: {e}")
+        else:
+            written = upsert_contacts(db, location_id, changed)
+            state = _get_state(db, location_id)
+            state.high_water_mark = _max_date_updated(changed, state.high_water_mark)
+            state.last_incremental_sync_at = now
+            state.contact_count = db.query(GhlContact).filter_by(location_id=location_id).count()
+            db.commit()
+            logger.info(f"Contact mirror incremental refresh ({location_id}): {written} changed since {since}")
+            return {"mode": "incremental", "fetched": written, "location_id": location_id}
+
+    previous_count = state.contact_count or 0
+    contacts = await ghl_client.get_all_contacts(creds=creds, raise_on_error=True)
+    written = upsert_contacts(db, location_id, contacts)
+    # Anything not touched by this pull no longer exists in GHL, unless the
+    # pull removed an implausible share of the mirror: then keep the rows
+    # (a short pull must never turn into Meta audience removals).
+    stale = db.query(GhlContact).filter(GhlContact.location_id == location_id, GhlContact.synced_at < now)
+    stale_count = stale.count()
+    delete_skipped = 0
+    if previous_count and stale_count > previous_count * settings.GHL_MIRROR_MAX_DELETE_FRACTION:
+        logger.error(
+            f"Contact mirror full refresh ({location_id}) would remove {stale_count} of {previous_count} "
+            f"contacts (limit {settings.GHL_MIRROR_MAX_DELETE_FRACTION:.0%}); keeping them"
+        )
+        deleted = 0
+        delete_skipped = stale_count
+    else:
+        deleted = stale.delete(synchronize_session=False)
+    state = _get_state(db, location_id)
+    state.high_water_mark = _max_date_updated(contacts, state.high_water_mark if delete_skipped else None) or now
+    state.last_full_sync_at = now
+    state.last_incremental_sync_at = now
+    state.contact_count = written + delete_skipped
+    db.commit()
+    logger.info(f"Contact mirror full refresh ({location_id}): {written} contacts, {deleted} removed")
+    return {
+        "mode": "full", "fetched": written, "deleted": deleted, "delete_skipped": delete_skipped,
+        "location_id": location_id,
+    }
+
+
+def identifiable():
+    """SQL form of the sync filter `c.get("email") or c.get("phone")` over the raw contact."""
+    return or_(
+        func.coalesce(GhlContact.data["email"].as_string(), "") != "",
+        func.coalesce(GhlContact.data["phone"].as_string(), "") != "",
+    )
+
+
+def count_contacts(db: Session, location_id: str, identifiable_only: bool = False) -> int:
+    q = db.query(func.count(GhlContact.id)).filter(GhlContact.location_id == location_id)
+    if identifiable_only:
+        q = q.filter(identifiable())
+    return q.scalar() or 0
+
+
+def iter_contacts(
+    db: Session,
+    location_id: str,
+    identifiable_only: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[dict]:
+    """Stream mirrored contacts in first-seen order, `batch_size` rows at a time."""
+    q = db.query(GhlContact.data).filter(GhlContact.location_id == location_id)
+    if identifiable_only:
+        q = q.filter(identifiable())
+    for (data,) in q.order_by(GhlContact.id).yield_per(batch_size):
+        yield data
+
+
+def iter_contacts_by_ids(
+    db: Session,
+    location_id: str,
+    contact_ids: Iterable[str],
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[dict]:
+    """Stream the mirrored contacts for the given GHL ids (unknown ids are skipped)."""
+    ids = list(contact_ids)
+    for i in range(0, len(ids), batch_size):
+        rows = (
+            db.query(GhlContact.data)
+            .filter(GhlContact.location_id == location_id, GhlContact.ghl_contact_id.in_(ids[i:i + batch_size]))
+            .order_by(GhlContact.id)
+        )
+        for (data,) in rows:
+            yield data
+
+
+def load_contacts(db: Session, location_id: str) -> list[dict]:
+    """Read every mirrored contact for a location, in first-seen order."""
+    rows = (
+        db.query(GhlContact.data)
+        .filter(GhlContact.location_id == location_id)
+        .order_by(GhlContact.id)
+        .all()
+    )
+    return [r.data for r in rows]
+
+
+# ── Indexed lookups (single-contact paths, e.g. the Stripe webhook) ─────────
+
+def get_contact(db: Session, location_id: str, ghl_contact_id: str) -> dict | None:
+    row = (
+        db.query(GhlContact.data)
+        .filter(GhlContact.location_id == location_id, GhlContact.ghl_contact_id == ghl_contact_id)
+        .first()
+    )
+    return row.data if row else None
+
+
+def find_by_email(db: Session, location_id: str, email: str) -> dict | None:
+    target = (email or "").lower().strip()
+    if not target:
+        return None
+    row = (
+        db.query(GhlContact.data)
+        .filter(GhlContact.location_id == location_id, GhlContact.email == target)
+        .order_by(GhlContact.id)
+        .first()
+    )
+    return row.data if row else None
+
+
+def find_by_phone(db: Session, location_id: str, phone: str) -> dict | None:
+    target = normalize_phone(phone or "")
+    if not target:
+        return None
+    row = (
+        db.query(GhlContact.data)
+        .filter(GhlContact.location_id == location_id, GhlContact.phone == target)
+        .order_by(GhlContact.id)
+        .first()
+    )
+    return row.data if row else None
+
+
+# ── Name candidates for fuzzy matching (webhook path) ───────────────────────
+
+NAME_PREFIX_LEN = 2
+# At most this many contacts are fuzzy-scored per lookup (<= FULL_SCAN_LIMIT,
+# so the matcher scores all of them)
+NAME_CANDIDATE_LIMIT = 2000
+
+
+def find_name_candidates(
+    db: Session,
+    location_id: str,
+    name: str,
+    limit: int = NAME_CANDIDATE_LIMIT,
+) -> list[dict]:
+    """
+    Mirrored contacts worth fuzzy-scoring against `name`: first or last name
+    starting with the first NAME_PREFIX_LEN letters of any of its tokens,
+    served by the (location_id, name varchar_pattern_ops) indexes. That keeps
+    typos past the prefix ("Jon" / "John"), reordered names and multi-word
+    first names in the block. Contacts sharing a whole token sort first, so
+    if more than `limit` qualify the closest ones are kept (and it is logged).
+    """
+    tokens = sorted({t for t in (name or "").lower().split() if len(t) >= NAME_PREFIX_LEN})
+    if not tokens:
+        return []
+    prefixes = sorted({t[:NAME_PREFIX_LEN] for t in tokens})
+    shared_tokens = (
+        case((GhlContact.first_name.in_(tokens), 1), else_=0)
+        + case((GhlContact.last_name.in_(tokens), 1), else_=0)
+    )
+    rows = (
+        db.query(GhlContact.data)
+        .filter(
+            GhlContact.location_id == location_id,
+            or_(*[
+                column.startswith(prefix, autoescape=True)
+                for prefix in prefixes
+                for column in (GhlContact.first_name, GhlContact.last_name)
+            ]),
+        )
+        .order_by(shared_tokens.desc(), GhlContact.id)
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) > limit:
+        logger.warning(f"Name candidates for a {len(tokens)}-token name capped at {limit} ({location_id})")
+        rows = rows[:limit]
+    return [r.data for r in rows]
+
+
+async def ensure_fresh(
+    db: Session,
+    creds: "AccountCredentials | None" = None,
+) -> str:
+    """
+    Refresh the mirror, falling back to the existing copy if GHL can't be
+    reached; raises only when there is nothing mirrored yet. Returns the
+    location id, for use with iter_contacts().
+    """
+    location_id = ghl_client._location_id(creds)
+    try:
+        await refresh_contacts(db, creds=creds)
+    except Exception as e:
+        db.rollback()
+        cached = count_contacts(db, location_id)
+        if not cached:
+            raise
+        logger.warning(f"Contact mirror refresh failed for {location_id}, serving {cached} cached contacts: {e}")
+    return location_id
+
+
+async def get_contacts(
+    db: Session,
+    creds: "AccountCredentials | None" = None,
+) -> list[dict]:
+    """Drop-in replacement for ghl_client.get_all_contacts backed by the mirror."""
+    location_id = await ensure_fresh(db, creds=creds)
+    return load_contacts(db, location_id)
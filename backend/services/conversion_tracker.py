@@ -12,13 +12,13 @@ from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 from urllib.parse import parse_qs, urlparse
 
-import httpx
 from sqlalchemy.orm import Session
 
-from api.ghl_client import get_all_contacts
+from api import http_pool
 from config import settings
 from models import MatchedConversion
-from services.identity_resolver import match_stripe_to_ghl, normalize_phone
+from services import metrics
+from services.identity_resolver import match_stripe_to_ghl_indexed, normalize_phone
 
 if TYPE_CHECKING:
     from services.credential_resolver import AccountCredentials
@@ -167,12 +167,11 @@ async def send_to_meta_capi(event: dict, dataset_id: str, access_token: str) ->
     if settings.CAPI_TEST_EVENT_CODE:
         payload["test_event_code"] = settings.CAPI_TEST_EVENT_CODE
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(url, json=payload)
-        result = resp.json()
-        if resp.status_code != 200:
-            raise Exception(f"CAPI error {resp.status_code}: {result}")
-        return result
+    resp = await http_pool.get_client(url).post(url, json=payload, timeout=30)
+    result = resp.json()
+    if resp.status_code != 200:
+        raise Exception(f"CAPI error {resp.status_code}: {result}")
+    return result
 
 
 # ── Full pipeline ────────────────────────────────────────────────────────────
@@ -187,6 +186,16 @@ async def process_conversion(
     Full pipeline: extract → match GHL → build CAPI event → send → store.
     Safe to call without Stripe/CAPI credentials — stores record regardless.
     """
+    with metrics.histogram(f"conversion.{source}.total").time():
+        return await _process_conversion(stripe_session, db, source, creds)
+
+
+async def _process_conversion(
+    stripe_session: dict,
+    db: Session,
+    source: str,
+    creds: "AccountCredentials | None",
+) -> dict:
     session_id = stripe_session.get("id") or stripe_session.get("session_id", "")
 
     # Deduplication
@@ -198,9 +207,9 @@ async def process_conversion(
     # Extract Stripe fields
     stripe_data = _extract_stripe_data(stripe_session)
 
-    # Fetch GHL contacts and run match cascade
-    contacts = await get_all_contacts(creds=creds)
-    match_result = await match_stripe_to_ghl(stripe_data, contacts, db)
+    # Indexed match cascade — never pages the whole GHL location
+    with metrics.histogram(f"conversion.{source}.match").time():
+        match_result = await match_stripe_to_ghl_indexed(stripe_data, db, creds=creds)
     ghl_contact = match_result["ghl_contact"]
 
     ghl_attribution: dict = {}
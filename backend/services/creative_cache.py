@@ -0,0 +1,64 @@
+"""
+Per-ad cache of parsed creative metadata (meta_creative_cache table).
+
+Audits describe every ad with spend in the last 30 days, and most of those
+creatives are unchanged since the previous audit, so entries younger than
+META_CREATIVE_CACHE_TTL_HOURS are reused and only the rest are fetched from
+the Batch API. Like the insights cache it opens its own short sessions.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import settings
+from database import SessionLocal
+from models import MetaCreativeCache
+
+logger = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return settings.META_CREATIVE_CACHE_TTL_HOURS > 0
+
+
+def load(ad_ids: list[str]) -> dict[str, dict]:
+    """Cached creatives for the given ads that are still fresh."""
+    if not ad_ids or not enabled():
+        return {}
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.META_CREATIVE_CACHE_TTL_HOURS)
+    db = SessionLocal()
+    try:
+        out = {}
+        for ad_id, creative, fetched_at in db.query(
+            MetaCreativeCache.ad_id, MetaCreativeCache.creative, MetaCreativeCache.fetched_at,
+        ).filter(MetaCreativeCache.ad_id.in_(ad_ids)):
+            if fetched_at.tzinfo is None:
+                fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+            if fetched_at >= cutoff:
+                out[ad_id] = creative
+        return out
+    finally:
+        db.close()
+
+
+def store(creatives: dict[str, dict]) -> None:
+    """Replace the cached entries for these ads. Best effort, like the insights cache."""
+    if not creatives or not enabled():
+        return
+    db = SessionLocal()
+    try:
+        db.query(MetaCreativeCache).filter(
+            MetaCreativeCache.ad_id.in_(list(creatives)),
+        ).delete(synchronize_session=False)
+        now = datetime.now(timezone.utc)
+        db.bulk_insert_mappings(MetaCreativeCache, [
+            {"ad_id": ad_id, "creative": creative, "fetched_at": now}
+            for ad_id, creative in creatives.items()
+        ])
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"Creative cache write failed: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,186 @@
+"""
+Blocked, vectorized fuzzy name matching for the Stripe → GHL match cascade.
+
+Scores exactly like identity_resolver._fuzzy_name_score (max of ratio,
+token_sort, token_set and partial ratios, 100 on an exact match, 85 when the
+first tokens agree) but:
+  - restricts each query to a candidate block — contacts sharing a name token,
+    a Soundex key, the first token, or at least two character trigrams — so a
+    query touches hundreds of names instead of the whole location;
+  - scores the block with rapidfuzz.process.cdist over precomputed name
+    strings instead of four Python-level scorer calls per contact.
+
+Small contact lists (<= FULL_SCAN_LIMIT names) skip blocking and score every
+name, which makes results identical to the linear scorer.
+"""
+from collections import defaultdict
+
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from thefuzz.utils import full_process
+
+CANDIDATE_MIN_SCORE = 50
+FULL_SCAN_LIMIT = 2000
+MIN_SHARED_NGRAMS = 2
+NGRAM = 3
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def soundex(token: str) -> str:
+    """American Soundex key for a lowercase alphabetic token ('' if none)."""
+    letters = [ch for ch in token if "a" <= ch <= "z"]
+    if not letters:
+        return ""
+    first = letters[0]
+    key = [first.upper()]
+    prev = _SOUNDEX_CODES.get(first, "")
+    for ch in letters[1:]:
+        code = _SOUNDEX_CODES.get(ch, "")
+        if code and code != prev:
+            key.append(code)
+            if len(key) == 4:
+                break
+        if ch not in "hw":
+            prev = code
+    return "".join(key).ljust(4, "0")
+
+
+def _ngrams(text: str) -> set[str]:
+    padded = f" {text} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class FuzzyNameMatcher:
+    """Precomputed name matrix + blocking index over a contact list."""
+
+    def __init__(self, contacts: list[dict]):
+        self.contacts = contacts
+        self.labels: list[str] = []
+
+        raw: list[str] = []
+        owners: list[int] = []
+        for i, c in enumerate(contacts):
+            first = (c.get("firstName") or "").strip()
+            last = (c.get("lastName") or "").strip()
+            full = f"{first} {last}".strip()
+            name_field = (c.get("contactName") or c.get("name") or "").strip()
+            self.labels.append(full or name_field)
+            for variant in (full, name_field):
+                if variant:
+                    raw.append(variant.lower().strip())
+                    owners.append(i)
+
+        self._raw = raw
+        self._processed = [full_process(n, force_ascii=True) for n in raw]
+        self._first = np.array([n.split()[0] if n.split() else "" for n in raw], dtype=object)
+        self._owner = np.array(owners, dtype=np.int64)
+
+        blocks: dict[str, list[int]] = defaultdict(list)
+        grams: dict[str, list[int]] = defaultdict(list)
+        for j, (name, proc) in enumerate(zip(raw, self._processed)):
+            for key in self._block_keys(name, proc):
+                blocks[key].append(j)
+            for gram in _ngrams(proc):
+                grams[gram].append(j)
+        self._blocks = {k: np.array(v, dtype=np.int64) for k, v in blocks.items()}
+        self._grams = {k: np.array(v, dtype=np.int64) for k, v in grams.items()}
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    @staticmethod
+    def _block_keys(name: str, processed: str) -> set[str]:
+        keys: set[str] = set()
+        parts = name.split()
+        if parts:
+            keys.add(f"f:{parts[0]}")
+        for tok in processed.split():
+            if len(tok) < 2:
+                continue
+            keys.add(f"t:{tok}")
+            sx = soundex(tok)
+            if sx:
+                keys.add(f"s:{sx}")
+        return keys
+
+    def candidates(self, name: str) -> np.ndarray:
+        """Indices into the name matrix worth scoring for `name`."""
+        if len(self._raw) <= FULL_SCAN_LIMIT:
+            return np.arange(len(self._raw), dtype=np.int64)
+
+        query = name.lower().strip()
+        processed = full_process(query, force_ascii=True)
+        postings = [self._blocks[k] for k in self._block_keys(query, processed) if k in self._blocks]
+
+        gram_postings = [self._grams[g] for g in _ngrams(processed) if g in self._grams]
+        if gram_postings:
+            shared = np.bincount(np.concatenate(gram_postings), minlength=len(self._raw))
+            postings.append(np.flatnonzero(shared >= MIN_SHARED_NGRAMS))
+
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(postings))
+
+    def _score(self, queries: list[str], idx: np.ndarray) -> np.ndarray:
+        """Score matrix (len(queries) × len(idx)) identical to _fuzzy_name_score."""
+        q_raw = [q.lower().strip() for q in queries]
+        q_proc = [full_process(q, force_ascii=True) for q in q_raw]
+        c_raw = [self._raw[j] for j in idx]
+        c_proc = [self._processed[j] for j in idx]
+
+        opts = {"dtype": np.float64}
+        scores = cdist(q_raw, c_raw, scorer=fuzz.ratio, **opts)
+        np.maximum(scores, cdist(q_raw, c_raw, scorer=fuzz.partial_ratio, **opts), out=scores)
+        np.maximum(scores, cdist(q_proc, c_proc, scorer=fuzz.token_sort_ratio, **opts), out=scores)
+        np.maximum(scores, cdist(q_proc, c_proc, scorer=fuzz.token_set_ratio, **opts), out=scores)
+        scores = np.rint(scores)  # thefuzz rounds half-to-even, like np.rint
+
+        c_first = self._first[idx]
+        c_raw_arr = np.array(c_raw, dtype=object)
+        for qi, q in enumerate(q_raw):
+            parts = q.split()
+            if parts:
+                bonus = (c_first == parts[0]) & (c_first != "")
+                scores[qi, bonus] = np.maximum(scores[qi, bonus], 85)
+            scores[qi, c_raw_arr == q] = 100
+        return scores.astype(np.int64)
+
+    def _rank(self, idx: np.ndarray, row: np.ndarray, threshold: int) -> tuple[dict | None, int, list[dict]]:
+        owners = self._owner[idx]
+        # Best score per contact across its name variants
+        order = np.lexsort((-row, owners))
+        owners, row = owners[order], row[order]
+        first = np.ones(len(owners), dtype=bool)
+        first[1:] = owners[1:] != owners[:-1]
+        owners, row = owners[first], row[first]
+
+        keep = row >= CANDIDATE_MIN_SCORE
+        owners, row = owners[keep], row[keep]
+        # Highest score first; ties keep contact list order (stable like the linear scan)
+        ranked = np.lexsort((owners, -row))[:3]
+        top_3 = [
+            {"id": self.contacts[o]["id"], "name": self.labels[o], "score": int(sc)}
+            for o, sc in zip(owners[ranked].tolist(), row[ranked].tolist())
+        ]
+        if len(ranked) and row[ranked[0]] >= threshold:
+            return self.contacts[int(owners[ranked[0]])], int(row[ranked[0]]), top_3
+        return None, 0, top_3
+
+    def match(self, name: str, threshold: int = 82) -> tuple[dict | None, int, list[dict]]:
+        """Returns (best_contact, score, top_3_candidates) — same contract as match_by_name_fuzzy."""
+        if not name or not self._raw:
+            return None, 0, []
+        idx = self.candidates(name)
+        if not len(idx):
+            return None, 0, []
+        return self._rank(idx, self._score([name], idx)[0], threshold)
+
@@ -14,9 +14,10 @@ import logging
 from datetime import datetime, timezone, timedelta
 from typing import Any, TYPE_CHECKING
 
-import httpx
 from sqlalchemy.orm import Session
 
+from api import http_pool, rate_limiter
+from config import settings
 from services.geo_helpers import normalize_state, state_display_name
 from services.area_code_state import state_from_phone
 
@@ -34,33 +35,70 @@ async def _fetch_meta_region_breakdown(
     since: str,
     until: str,
 ) -> list[dict]:
-    """Fetch Meta insights broken down by region (US states + others)."""
-    rows: list[dict] = []
-    url = f"{BASE_URL}/{account_id}/insights"
+    """Fetch Meta insights broken down by region (US states + others).
+
+    With META_INSIGHTS_CACHE on, rows are per day and settled days come from
+    the insights cache; the state aggregation sums either shape.
+    """
     params = {
-        "access_token": token,
         "level": "account",
         "fields": "spend,impressions,clicks,actions,action_values",
-        "time_range": json.dumps({"since": since, "until": until}),
         "breakdowns": "region",
         "filtering": json.dumps([{"field": "country", "operator": "IN", "value": ["US"]}]),
         "limit": 500,
     }
+    if settings.META_INSIGHTS_CACHE:
+        from services import insights_cache
+
+        async def fetch(range_since: str, range_until: str) -> list[dict]:
+            return await _fetch_region_rows(account_id, token, {
+                **params,
+                "time_range": json.dumps({"since": range_since, "until": range_until}),
+                "time_increment": "1",
+            }, raise_on_error=True)
+
+        try:
+            return await insights_cache.daily_rows(account_id, "account", params, since, until, fetch)
+        except Exception as e:
+            # Never cache a partial pull as empty days
+            logger.warning(f"Meta region breakdown failed: {e}")
+            return []
 
-    async with httpx.AsyncClient(timeout=60) as client:
-        while url:
-            resp = await client.get(url, params=params)
-            if resp.status_code != 200:
-                logger.warning(f"Meta region breakdown failed: {resp.status_code} {resp.text[:200]}")
-                break
-            data = resp.json()
-            rows.extend(data.get("data", []))
-            paging = data.get("paging", {}).get("next")
-            if paging:
-                url = paging
-                params = {}  # next URL has params encoded
-            else:
-                break
+    return await _fetch_region_rows(account_id, token, {
+        **params,
+        "time_range": json.dumps({"since": since, "until": until}),
+    })
+
+
+async def _fetch_region_rows(
+    account_id: str,
+    token: str,
+    params: dict,
+    raise_on_error: bool = False,
+) -> list[dict]:
+    rows: list[dict] = []
+    url = f"{BASE_URL}/{account_id}/insights"
+    params = {**params, "access_token": token}
+
+    client = http_pool.get_client(BASE_URL)
+    bucket = rate_limiter.meta(token)
+    while url:
+        await bucket.acquire()
+        resp = await client.get(url, params=params, timeout=60)
+        bucket.observe_meta(resp.status_code, resp.headers)
+        if resp.status_code != 200:
+            if raise_on_error:
+                resp.raise_for_status()
+            logger.warning(f"Meta region breakdown failed: {resp.status_code} {resp.text[:200]}")
+            break
+        data = resp.json()
+        rows.extend(data.get("data", []))
+        paging = data.get("paging", {}).get("next")
+        if paging:
+            url = paging
+            params = {}  # next URL has params encoded
+        else:
+            break
 
     return rows
 
@@ -5,12 +5,17 @@ and identity map cache to skip re-matching on repeat purchases.
 import logging
 import re
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
 from sqlalchemy.orm import Session
 from thefuzz import fuzz
 
 from config import settings
 from models import ContactIdentityMap
+from services.fuzzy_matcher import FuzzyNameMatcher
+
+if TYPE_CHECKING:
+    from services.credential_resolver import AccountCredentials
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +31,7 @@ def normalize_phone(phone: str) -> str:
 
 
 def _fuzzy_name_score(a: str, b: str) -> int:
+    """Scalar reference scorer; FuzzyNameMatcher reproduces it over whole blocks at once."""
     if not a or not b:
         return 0
     a, b = a.lower().strip(), b.lower().strip()
@@ -69,6 +75,55 @@ def match_by_phone(phone: str, contacts: list[dict]) -> dict | None:
     return None
 
 
+class ContactIndex:
+    """
+    Hash indexes over a contact list, built once per run and shared by every
+    step of the match cascade: by id, by normalized primary/additional email
+    and by normalized primary/additional phone. Each key maps to the first
+    contact (in list order) carrying it — the same contact a linear scan returns.
+    """
+
+    def __init__(self, contacts: list[dict]):
+        self.contacts = contacts
+        self.by_id: dict[str, dict] = {}
+        self.by_email: dict[str, dict] = {}
+        self.by_phone: dict[str, dict] = {}
+        self._fuzzy: FuzzyNameMatcher | None = None
+
+        for c in contacts:
+            cid = c.get("id")
+            if cid:
+                self.by_id.setdefault(cid, c)
+            for e in [c.get("email")] + list(c.get("additionalEmails") or []):
+                key = (e or "").lower().strip()
+                if key:
+                    self.by_email.setdefault(key, c)
+            for p in [c.get("phone")] + list(c.get("additionalPhones") or []):
+                key = normalize_phone(p or "")
+                if key:
+                    self.by_phone.setdefault(key, c)
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def get(self, contact_id: str | None) -> dict | None:
+        return self.by_id.get(contact_id) if contact_id else None
+
+    def match_email(self, email: str) -> dict | None:
+        target = (email or "").lower().strip()
+        return self.by_email.get(target) if target else None
+
+    def match_phone(self, phone: str) -> dict | None:
+        target = normalize_phone(phone or "")
+        return self.by_phone.get(target) if target else None
+
+    def match_name(self, name: str, threshold: int = 82) -> tuple[dict | None, int, list[dict]]:
+        """Fuzzy name match via a blocking index built on first use."""
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyNameMatcher(self.contacts)
+        return self._fuzzy.match(name, threshold)
+
+
 def match_by_name_fuzzy(
     name: str,
     contacts: list[dict],
@@ -77,28 +132,7 @@ def match_by_name_fuzzy(
     """Returns (best_contact, score, top_3_candidates)."""
     if not name:
         return None, 0, []
-
-    candidates = []
-    for c in contacts:
-        first = (c.get("firstName") or "").strip()
-        last = (c.get("lastName") or "").strip()
-        full = f"{first} {last}".strip()
-        name_field = (c.get("contactName") or c.get("name") or "").strip()
-
-        score = max(
-            _fuzzy_name_score(name, full) if full else 0,
-            _fuzzy_name_score(name, name_field) if name_field else 0,
-        )
-        if score >= 50:
-            candidates.append({"contact": c, "score": score, "ghl_name": full or name_field})
-
-    candidates.sort(key=lambda x: x["score"], reverse=True)
-    top_3 = [{"id": c["contact"]["id"], "name": c["ghl_name"], "score": c["score"]}
-             for c in candidates[:3]]
-
-    if candidates and candidates[0]["score"] >= threshold:
-        return candidates[0]["contact"], candidates[0]["score"], top_3
-    return None, 0, top_3
+    return FuzzyNameMatcher(contacts).match(name, threshold)
 
 
 # ── Identity map (DB cache) ──────────────────────────────────────────────────
@@ -177,15 +211,18 @@ def save_identity_map(
 
 # ── Full match cascade ───────────────────────────────────────────────────────
 
-async def match_stripe_to_ghl(
+def match_stripe_to_ghl(
     stripe_data: dict,
-    contacts: list[dict],
+    contacts: "list[dict] | ContactIndex",
     db: Session,
 ) -> dict:
     """
     Run: identity_map → email_exact → phone_exact → name_fuzzy.
     Returns dict with ghl_contact, match_method, match_score, match_candidates.
+    Pass a prebuilt ContactIndex when matching many payments against the same contacts.
+    Blocking (DB lookups, fuzzy scoring): bulk callers run it in a worker thread.
     """
+    index = contacts if isinstance(contacts, ContactIndex) else ContactIndex(contacts)
     result: dict = {
         "ghl_contact": None,
         "match_method": "none",
@@ -201,7 +238,7 @@ async def match_stripe_to_ghl(
     # Step 0: identity map cache
     cached_ghl_id = check_identity_map(db, cid, email)
     if cached_ghl_id:
-        contact = next((c for c in contacts if c.get("id") == cached_ghl_id), None)
+        contact = index.get(cached_ghl_id)
         if contact:
             result["ghl_contact"] = contact
             result["match_method"] = "identity_map"
@@ -209,7 +246,7 @@ async def match_stripe_to_ghl(
 
     # Step 1: exact email
     if email:
-        contact = match_by_email(email, contacts)
+        contact = index.match_email(email)
         if contact:
             result.update(ghl_contact=contact, match_method="email_exact")
             save_identity_map(db, cid, email, contact["id"], "email_exact")
@@ -217,7 +254,7 @@ async def match_stripe_to_ghl(
 
     # Step 2: exact phone
     if phone:
-        contact = match_by_phone(phone, contacts)
+        contact = index.match_phone(phone)
         if contact:
             result.update(ghl_contact=contact, match_method="phone_exact")
             save_identity_map(db, cid, email, contact["id"], "phone_exact")
@@ -226,7 +263,100 @@ async def match_stripe_to_ghl(
     # Step 3: fuzzy name
     if name:
         threshold = settings.FUZZY_MATCH_THRESHOLD
-        contact, score, candidates = match_by_name_fuzzy(name, contacts, threshold)
+        contact, score, candidates = index.match_name(name, threshold)
+        result["match_candidates"] = candidates
+        if contact:
+            result.update(ghl_contact=contact, match_method="name_fuzzy", match_score=score)
+            save_identity_map(db, cid, email, contact["id"], "name_fuzzy", score)
+            return result
+
+    return result
+
+
+async def match_stripe_to_ghl_indexed(
+    stripe_data: dict,
+    db: Session,
+    creds: "AccountCredentials | None" = None,
+) -> dict:
+    """
+    Single-payment cascade that never loads the whole location (webhook path):
+    identity_map → mirror email/phone index → targeted GHL lookup → fuzzy name
+    over a bounded, indexed block of mirror contacts whose first or last name
+    shares a prefix with the payer's name. Same return shape as
+    match_stripe_to_ghl.
+    """
+    from api import ghl_client
+    from services import contact_mirror
+
+    result: dict = {
+        "ghl_contact": None,
+        "match_method": "none",
+        "match_score": None,
+        "match_candidates": [],
+    }
+
+    location_id = ghl_client._location_id(creds)
+    cid = stripe_data.get("customer_id")
+    email = stripe_data.get("email", "")
+    phone = stripe_data.get("phone", "")
+    name = stripe_data.get("name", "")
+
+    # Step 0: identity map cache → mirror (or GHL detail if the mirror hasn't seen it yet)
+    cached_ghl_id = check_identity_map(db, cid, email)
+    if cached_ghl_id:
+        contact = contact_mirror.get_contact(db, location_id, cached_ghl_id)
+        if contact is None:
+            try:
+                contact = await ghl_client.get_contact_detail(cached_ghl_id, creds=creds)
+            except Exception as e:
+                logger.warning(f"Identity map contact {cached_ghl_id} lookup failed: {e}")
+            if contact:
+                contact_mirror.upsert_contacts(db, location_id, [contact])
+        if contact:
+            result["ghl_contact"] = contact
+            result["match_method"] = "identity_map"
+            return result
+
+    # Step 1: exact email against the mirror's indexed column
+    if email:
+        contact = contact_mirror.find_by_email(db, location_id, email)
+        if contact:
+            result.update(ghl_contact=contact, match_method="email_exact")
+            save_identity_map(db, cid, email, contact["id"], "email_exact")
+            return result
+
+    # Step 2: exact phone against the mirror's indexed column
+    if phone:
+        contact = contact_mirror.find_by_phone(db, location_id, phone)
+        if contact:
+            result.update(ghl_contact=contact, match_method="phone_exact")
+            save_identity_map(db, cid, email, contact["id"], "phone_exact")
+            return result
+
+    # Step 3: targeted GHL lookup — catches contacts newer than the mirror and
+    # matches on additional emails/phones, which the mirror doesn't index
+    lookups = []
+    if email:
+        lookups.append(("email_exact", {"email": email}))
+    if phone:
+        lookups.append(("phone_exact", {"phone": f"+1{phone}" if len(phone) == 10 else phone}))
+    for method, kwargs in lookups:
+        try:
+            contact = await ghl_client.find_duplicate_contact(creds=creds, **kwargs)
+        except Exception as e:
+            logger.warning(f"GHL contact search ({method}) failed: {e}")
+            continue
+        if contact and contact.get("id"):
+            contact_mirror.upsert_contacts(db, location_id, [contact])
+            result.update(ghl_contact=contact, match_method=method)
+            save_identity_map(db, cid, email, contact["id"], method)
+            return result
+
+    # Step 4: fuzzy name, scored against mirror contacts sharing a name prefix
+    if name:
+        threshold = settings.FUZZY_MATCH_THRESHOLD
+        block = contact_mirror.find_name_candidates(db, location_id, name)
+        contact, score, candidates = match_by_name_fuzzy(name, block, threshold)
         result["match_candidates"] = candidates
         if contact:
             result.update(ghl_contact=contact, match_method="name_fuzzy", match_score=score)
@@ -0,0 +1,167 @@
+"""
+Persistent per-day cache of Meta insight rows (meta_insights_cache table).
+
+Historical insights stop changing once Meta's attribution has settled, so
+each day is stored once per (account, level, breakdowns, query hash) and
+served from Postgres afterwards. A fetch only goes to Meta for the days that
+are missing or still inside META_INSIGHTS_SETTLE_DAYS, one request per
+contiguous gap, always with time_increment=1 — callers get daily rows and
+aggregate them as they already do for daily pulls.
+
+The cache opens its own short sessions so it can be used from concurrently
+gathered fetches without touching the caller's transaction.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import settings
+from database import SessionLocal
+from models import MetaInsightsCache
+
+logger = logging.getLogger(__name__)
+
+# Params that describe the date range / paging rather than the query itself
+_RANGE_PARAMS = {"time_range", "time_increment", "limit", "access_token"}
+
+FetchDaily = Callable[[str, str], Awaitable[list[dict]]]
+
+_stats = {"lookups": 0, "days_hit": 0, "days_fetched": 0, "api_requests": 0, "write_errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(**deltas: int) -> None:
+    with _stats_lock:
+        for key, n in deltas.items():
+            _stats[key] += n
+
+
+def stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    requested = out["days_hit"] + out["days_fetched"]
+    out["hit_rate"] = round(out["days_hit"] / requested, 4) if requested else None
+    return out
+
+
+def query_hash(params: dict) -> str:
+    """Stable hash of the query params that shape the rows (fields, filtering, ...)."""
+    relevant = {k: v for k, v in params.items() if k not in _RANGE_PARAMS and k != "breakdowns"}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _days(since: date, until: date) -> list[date]:
+    return [since + timedelta(days=i) for i in range((until - since).days + 1)]
+
+
+def _gaps(days: list[date]) -> list[tuple[date, date]]:
+    """Collapse sorted days into contiguous (since, until) ranges."""
+    ranges: list[tuple[date, date]] = []
+    for d in days:
+        if ranges and d == ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], d)
+        else:
+            ranges.append((d, d))
+    return ranges
+
+
+def _load(account_id: str, level: str, breakdowns: str, qhash: str, since: date, until: date) -> dict[date, list]:
+    db = SessionLocal()
+    try:
+        return {
+            d: rows
+            for d, rows in db.query(MetaInsightsCache.date, MetaInsightsCache.rows).filter(
+                MetaInsightsCache.account_id == account_id,
+                MetaInsightsCache.level == level,
+                MetaInsightsCache.breakdowns == breakdowns,
+                MetaInsightsCache.fields_hash == qhash,
+                MetaInsightsCache.date >= since,
+                MetaInsightsCache.date <= until,
+            )
+        }
+    finally:
+        db.close()
+
+
+def _store(account_id: str, level: str, breakdowns: str, qhash: str, by_day: dict[date, list]) -> None:
+    """Replace the cached rows for these days. Best effort: a failed write only costs a refetch."""
+    db = SessionLocal()
+    try:
+        db.query(MetaInsightsCache).filter(
+            MetaInsightsCache.account_id == account_id,
+            MetaInsightsCache.level == level,
+            MetaInsightsCache.breakdowns == breakdowns,
+            MetaInsightsCache.fields_hash == qhash,
+            MetaInsightsCache.date.in_(list(by_day)),
+        ).delete(synchronize_session=False)
+        now = datetime.now(timezone.utc)
+        db.bulk_insert_mappings(MetaInsightsCache, [
+            {
+                "account_id": account_id, "level": level, "breakdowns": breakdowns,
+                "fields_hash": qhash, "date": d, "rows": rows, "fetched_at": now,
+            }
+            for d, rows in by_day.items()
+        ])
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        _count(write_errors=1)
+        logger.warning(f"Insights cache write failed ({account_id} {level}): {e}")
+    finally:
+        db.close()
+
+
+async def daily_rows(
+    account_id: str,
+    level: str,
+    params: dict,
+    since: str,
+    until: str,
+    fetch: FetchDaily,
+) -> list[dict]:
+    """
+    Daily insight rows for [since, until] (YYYY-MM-DD). `fetch(since, until)`
+    must return time_increment=1 rows for that range; it is only called for
+    days that are missing from the cache or not yet settled.
+    """
+    breakdowns = params.get("breakdowns", "") or ""
+    qhash = query_hash(params)
+    start, end = date.fromisoformat(since), date.fromisoformat(until)
+    settled_before = date.today() - timedelta(days=settings.META_INSIGHTS_SETTLE_DAYS)
+
+    cached = _load(account_id, level, breakdowns, qhash, start, end)
+    wanted = _days(start, end)
+    missing = [d for d in wanted if d not in cached or d >= settled_before]
+
+    fetched: dict[date, list] = {}
+    if missing:
+        gaps = _gaps(missing)
+        results = await asyncio.gather(*[fetch(s.isoformat(), u.isoformat()) for s, u in gaps])
+        for (s, u), rows in zip(gaps, results):
+            for d in _days(s, u):
+                fetched[d] = []
+            for row in rows:
+                day = row.get("date_start", "")
+                try:
+                    fetched.setdefault(date.fromisoformat(day), []).append(row)
+                except ValueError:
+                    continue
+        _store(account_id, level, breakdowns, qhash, fetched)
+        _count(api_requests=len(gaps))
+
+    _count(lookups=1, days_hit=len(wanted) - len(missing), days_fetched=len(missing))
+    logger.debug(
+        f"Insights cache {account_id} {level} {breakdowns or '-'}: "
+        f"{len(wanted) - len(missing)}/{len(wanted)} days cached"
+    )
+
+    out: list[dict] = []
+    for d in wanted:
+        out.extend(fetched[d] if d in fetched else cached.get(d, []))
+    return out
@@ -0,0 +1,141 @@
+"""
+Cluster-wide job leases on Postgres advisory locks.
+
+A lease is a session-level pg_try_advisory_lock(namespace, key) taken on a
+dedicated pooled connection and held for the life of the job. It is
+released explicitly when the job ends; if the process dies, Postgres drops
+the connection and the lock with it, so no heartbeat or expiry is needed.
+Any number of web workers / replicas can run the same code — only the one
+holding the lease does the work.
+
+    with job_lease.lease("transaction_sync"):
+        ...
+
+Keys are an int (used as-is, e.g. a config or report id) or a string
+(hashed into the int4 key space). Acquisition never blocks: a held lease
+raises LeaseUnavailable.
+"""
+import logging
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock namespaces (first int of the two-int lock key)
+NAMESPACES = {
+    "sync": 1001,
+    "transaction_sync": 1002,
+    "capi_backfill": 1003,
+    "audit": 1004,
+    "scheduler": 1005,
+}
+
+
+class LeaseUnavailable(RuntimeError):
+    pass
+
+
+def _lock_key(job: str, key: int | str) -> tuple[int, int]:
+    if isinstance(key, str):
+        key = zlib.crc32(key.encode())
+    return NAMESPACES[job], key & 0x7FFFFFFF
+
+
+class Lease:
+    """A held advisory lock and the connection it lives on."""
+
+    def __init__(self, job: str, key: int | str):
+        self.job = job
+        self.key = key
+        self.ns, self.lock_key = _lock_key(job, key)
+        self._conn = None
+
+    def acquire(self) -> "Lease":
+        conn = engine.connect()
+        try:
+            got = conn.execute(
+                text("SELECT pg_try_advisory_lock(:ns, :key)"), {"ns": self.ns, "key": self.lock_key},
+            ).scalar()
+            # Session-level lock: survives the commit, which keeps the
+            # connection from sitting idle-in-transaction for the whole job
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not got:
+            conn.close()
+            raise LeaseUnavailable(f"{self.job} lease {self.key!r} is held by another worker")
+        self._conn = conn
+        logger.debug(f"Acquired {self.job} lease {self.key!r}")
+        return self
+
+    def alive(self) -> bool:
+        """Whether the lease's connection (and so the lock) is still up."""
+        if self._conn is None:
+            return False
+        try:
+            self._conn.execute(text("SELECT 1"))
+            self._conn.commit()
+            return True
+        except Exception:
+            self._drop()
+            return False
+
+    def release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                text("SELECT pg_advisory_unlock(:ns, :key)"), {"ns": self.ns, "key": self.lock_key},
+            )
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+        except Exception as e:
+            # Never hand a connection that may still hold the lock back to the pool
+            logger.warning(f"Could not release {self.job} lease {self.key!r} cleanly: {e}")
+            self._drop()
+
+    def _drop(self) -> None:
+        try:
+            self._conn.invalidate()
+        except Exception:
+            pass
+        self._conn = None
+
+
+def try_acquire(job: str, key: int | str = "global") -> Lease:
+    """Take the lease or raise LeaseUnavailable. Caller must release()."""
+    return Lease(job, key).acquire()
+
+
+@contextmanager
+def lease(job: str, key: int | str = "global") -> Iterator[Lease]:
+    held = try_acquire(job, key)
+    try:
+        yield held
+    finally:
+        held.release()
+
+
+def held_keys(job: str) -> set[int]:
+    """Int keys of `job` leases currently held by any worker in the cluster."""
+    ns = NAMESPACES[job]
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT objid::bigint FROM pg_locks "
+                "WHERE locktype = 'advisory' AND classid = :ns AND objsubid = 2 AND granted"
+            ),
+            {"ns": ns},
+        ).scalars().all()
+    return set(rows)
+
+
+def is_held(job: str, key: int | str = "global") -> bool:
+    return _lock_key(job, key)[1] in held_keys(job)
@@ -0,0 +1,409 @@
+"""
+Postgres-backed job queue for heavy work (audience syncs, Stripe transaction
+sync, CAPI backfills, audits, the nightly run).
+
+API routes enqueue() a row in `jobs` and return immediately; workers — the
+standalone `python -m worker` process, or the worker embedded in the web app
+when JOB_WORKER_EMBEDDED is set — claim queued rows with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can poll the same
+table without double-claiming. Running jobs heartbeat from a background
+thread; a job whose worker stops heartbeating for JOB_STALE_SECONDS is
+requeued (or failed once out of attempts). Heartbeats and outcomes are only
+written while the worker still owns that attempt, so a run that was
+requeued under it cannot overwrite its successor. Jobs that must not
+overlap additionally take their job leases (services.job_lease) inside the
+handlers.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 30
+RETRY_BACKOFF_SECONDS = [30, 120, 600]
+
+Handler = Callable[[Session, dict], Awaitable[dict | None]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ── Producer side ────────────────────────────────────────────────────────────
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    payload: dict | None = None,
+    dedupe_key: str | None = None,
+    max_attempts: int = 1,
+    run_after: datetime | None = None,
+) -> tuple[Job, bool]:
+    """
+    Queue a job. Returns (job, created). With a dedupe_key, an already queued
+    or running job with the same key is returned instead (created=False).
+    """
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    values = {
+        "job_type": job_type,
+        "payload": payload or {},
+        "status": JobStatus.QUEUED.value,
+        "dedupe_key": dedupe_key,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_after": run_after or _now(),
+        "created_at": _now(),
+    }
+    stmt = pg_insert(Job).values(**values).returning(Job.id)
+    if dedupe_key:
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=["dedupe_key"],
+            index_where=text("status IN ('queued', 'running')"),
+        )
+    job_id = db.execute(stmt).scalar()
+    db.commit()
+    if job_id is None:
+        existing = (
+            db.query(Job)
+            .filter(Job.dedupe_key == dedupe_key, Job.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]))
+            .first()
+        )
+        if existing:
+            return existing, False
+        # The conflicting job finished in between; try once more
+        return enqueue(db, job_type, payload, dedupe_key, max_attempts, run_after)
+    logger.info(f"Enqueued job {job_id} ({job_type}{f', {dedupe_key}' if dedupe_key else ''})")
+    return db.get(Job, job_id), True
+
+
+def job_to_dict(job: Job) -> dict[str, Any]:
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "payload": job.payload,
+        "status": job.status,
+        "dedupe_key": job.dedupe_key,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "locked_by": job.locked_by,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+
+def claim(db: Session, worker_id: str) -> Job | None:
+    """Atomically take the oldest runnable queued job, or None."""
+    job = (
+        db.query(Job)
+        .filter(Job.status == JobStatus.QUEUED.value, Job.run_after <= _now())
+        .order_by(Job.id)
+        .with_for_update(skip_locked=True)
+        .limit(1)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+    now = _now()
+    job.status = JobStatus.RUNNING.value
+    job.locked_by = worker_id
+    job.attempts += 1
+    job.started_at = now
+    job.heartbeat_at = now
+    job.error = None
+    db.commit()
+    return job
+
+
+def _owned(db: Session, job_id: int, worker_id: str, attempt: int):
+    """The job row, if `worker_id` is still running attempt `attempt` of it."""
+    return db.query(Job).filter(
+        Job.id == job_id,
+        Job.locked_by == worker_id,
+        Job.attempts == attempt,
+        Job.status == JobStatus.RUNNING.value,
+    )
+
+
+def _finish(
+    db: Session,
+    job_id: int,
+    worker_id: str,
+    attempt: int,
+    result: dict | None = None,
+    error: str | None = None,
+) -> bool:
+    """
+    Record the outcome of one attempt. Dropped (returns False) when the job
+    was requeued or failed as stale in the meantime and no longer belongs to
+    this worker and attempt.
+    """
+    job = db.get(Job, job_id)
+    if job is None:
+        return False
+    values: dict = {Job.heartbeat_at: None, Job.locked_by: None}
+    delay = None
+    if error is None:
+        values.update({Job.status: JobStatus.SUCCEEDED.value, Job.result: result, Job.finished_at: _now()})
+    elif attempt < job.max_attempts:
+        delay = RETRY_BACKOFF_SECONDS[min(attempt - 1, len(RETRY_BACKOFF_SECONDS) - 1)]
+        values.update({
+            Job.status: JobStatus.QUEUED.value,
+            Job.run_after: _now() + timedelta(seconds=delay),
+            Job.error: error,
+        })
+    else:
+        values.update({Job.status: JobStatus.FAILED.value, Job.error: error, Job.finished_at: _now()})
+    owned = _owned(db, job_id, worker_id, attempt).update(values, synchronize_session=False)
+    db.commit()
+    if not owned:
+        logger.warning(f"Job {job_id} attempt {attempt} is no longer owned by {worker_id}; outcome dropped")
+        return False
+    if delay is not None:
+        logger.warning(f"Job {job_id} failed (attempt {attempt}/{job.max_attempts}), retrying in {delay}s")
+    return True
+
+
+def heartbeat(db: Session, job_id: int, worker_id: str, attempt: int) -> bool:
+    """Refresh a running job's heartbeat; False if the attempt is no longer ours."""
+    owned = _owned(db, job_id, worker_id, attempt).update({Job.heartbeat_at: _now()}, synchronize_session=False)
+    db.commit()
+    return bool(owned)
+
+
+class _Heartbeat:
+    """
+    Heartbeats one running job from a background thread, so a handler that
+    blocks the event loop (sync SQLAlchemy, CPU-bound matching) for longer
+    than JOB_STALE_SECONDS is not mistaken for a dead worker.
+    """
+
+    def __init__(self, job_id: int, worker_id: str, attempt: int, interval: float | None = None):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.interval = interval or HEARTBEAT_SECONDS
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job_id}-heartbeat", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if not _in_session(lambda db: heartbeat(db, self.job_id, self.worker_id, self.attempt)):
+                    logger.warning(f"Job {self.job_id} attempt {self.attempt} was taken over; heartbeat stopped")
+                    return
+            except Exception as e:
+                logger.warning(f"Job {self.job_id} heartbeat failed: {e}")
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def requeue_stale(db: Session) -> int:
+    """Recover jobs whose worker died mid-run (no heartbeat for JOB_STALE_SECONDS)."""
+    cutoff = _now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale = (
+        db.query(Job)
+        .filter(Job.status == JobStatus.RUNNING.value, Job.heartbeat_at < cutoff)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in stale:
+        logger.warning(f"Job {job.id} ({job.job_type}) lost its worker {job.locked_by}")
+        job.locked_by = None
+        job.heartbeat_at = None
+        if job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED.value
+            job.run_after = _now()
+        else:
+            job.status = JobStatus.FAILED.value
+            job.error = "Worker stopped responding"
+            job.finished_at = _now()
+    db.commit()
+    return len(stale)
+
+
+async def execute(job_id: int, worker_id: str) -> None:
+    """Run one claimed job with its own session and record the outcome."""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        attempt = job.attempts
+        handler = HANDLERS.get(job.job_type)
+        logger.info(f"Job {job_id} ({job.job_type}) started, attempt {attempt}")
+        with _Heartbeat(job_id, worker_id, attempt):
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for job type {job.job_type}")
+                result = await handler(db, dict(job.payload or {}))
+            except Exception as e:
+                logger.error(f"Job {job_id} ({job.job_type}) failed: {e}", exc_info=True)
+                db.rollback()
+                _finish(db, job_id, worker_id, attempt, error=f"{e}\n{traceback.format_exc()}"[:10000])
+            else:
+                if _finish(db, job_id, worker_id, attempt, result=result):
+                    logger.info(f"Job {job_id} ({job.job_type}) succeeded")
+    finally:
+        db.close()
+
+
+def _in_session(fn: Callable[[Session], Any]) -> Any:
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+async def run_worker(
+    stop: asyncio.Event,
+    concurrency: int | None = None,
+    worker_id: str | None = None,
+) -> None:
+    """
+    Poll for jobs until `stop` is set, running up to `concurrency` at once.
+    In-flight jobs are awaited before returning.
+    """
+    concurrency = max(concurrency or settings.JOB_WORKER_CONCURRENCY, 1)
+    worker_id = worker_id or default_worker_id()
+    active: dict[int, asyncio.Task] = {}
+    last_maintenance = 0.0  # stale-job recovery; heartbeats run per job (_Heartbeat)
+    loop = asyncio.get_running_loop()
+    logger.info(f"Job worker {worker_id} started (concurrency {concurrency})")
+
+    while not stop.is_set():
+        try:
+            if loop.time() - last_maintenance >= HEARTBEAT_SECONDS:
+                last_maintenance = loop.time()
+                _in_session(requeue_stale)
+
+            claimed = None
+            if len(active) < concurrency:
+                claimed = _in_session(lambda db: claim(db, worker_id))
+            if claimed is not None:
+                task = asyncio.create_task(execute(claimed.id, worker_id))
+                active[claimed.id] = task
+                task.add_done_callback(lambda _t, jid=claimed.id: active.pop(jid, None))
+                continue
+        except Exception as e:
+            logger.error(f"Job worker poll failed: {e}")
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    if active:
+        logger.info(f"Job worker {worker_id} stopping, waiting for {len(active)} running job(s)")
+        await asyncio.gather(*active.values(), return_exceptions=True)
+    logger.info(f"Job worker {worker_id} stopped")
+
+
+# ── Handlers ─────────────────────────────────────────────────────────────────
+
+async def _handle_sync(db: Session, payload: dict) -> dict:
+    from services import sync_service
+    try:
+        run_id = await sync_service.run_sync(payload["config_id"], db)
+    except sync_service.SyncAlreadyRunning as e:
+        return {"status": "skipped", "reason": str(e)}
+    return {"sync_run_id": run_id}
+
+
+async def _handle_transaction_sync(db: Session, payload: dict) -> dict:
+    from services.transaction_sync import run_transaction_sync
+    return await run_transaction_sync(
+        db, payload.get("days_back"), payload.get("limit", 5000), payload.get("full_resync", False),
+    )
+
+
+async def _handle_capi_backfill(db: Session, payload: dict) -> dict:
+    from services.transaction_sync import run_capi_backfill
+    return await run_capi_backfill(
+        db,
+        payload.get("days_back", 90),
+        payload.get("limit", 500),
+        payload.get("dry_run", False),
+        payload.get("retry_failed", False),
+    )
+
+
+async def _handle_audit(db: Session, payload: dict) -> dict:
+    from models import AdAccount
+    from services.credential_resolver import resolve
+    from services.meta_audit import run_audit
+
+    account_id = payload["account_id"]
+    creds = resolve(payload.get("credentials_account_id"), db)
+    account = db.query(AdAccount).filter(AdAccount.account_id == account_id).first()
+    await run_audit(
+        report_id=payload["report_id"],
+        account_id=account_id,
+        token=creds.meta_access_token or settings.META_ACCESS_TOKEN,
+        db=db,
+        models_to_run=payload["models"],
+        business_profile=account.business_profile if account else None,
+        website_url=account.website_url if account else None,
+        business_notes=account.business_notes if account else None,
+        report_notes=payload.get("report_notes"),
+        creds=creds,
+        async_insights=payload.get("async_insights"),
+        bypass_analysis_cache=payload.get("bypass_analysis_cache", False),
+    )
+    return {"report_id": payload["report_id"]}
+
+
+async def _handle_audit_reanalyze(db: Session, payload: dict) -> dict:
+    from services.meta_audit import reanalyze_audit
+    await reanalyze_audit(
+        report_id=payload["report_id"],
+        db=db,
+        models_to_run=payload["models"],
+        bypass_analysis_cache=payload.get("bypass_analysis_cache", False),
+    )
+    return {"report_id": payload["report_id"]}
+
+
+async def _handle_daily_run(db: Session, payload: dict) -> dict:
+    from scheduler import run_daily_jobs
+    return await run_daily_jobs(db)
+
+
+HANDLERS: dict[str, Handler] = {
+    "sync": _handle_sync,
+    "transaction_sync": _handle_transaction_sync,
+    "capi_backfill": _handle_capi_backfill,
+    "audit": _handle_audit,
+    "audit_reanalyze": _handle_audit_reanalyze,
+    "daily_run": _handle_daily_run,
+}
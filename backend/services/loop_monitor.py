@@ -0,0 +1,78 @@
+"""
+Event-loop lag sampler.
+
+A background task sleeps SAMPLE_INTERVAL at a time and records how late it
+wakes up: that delay is how long some coroutine held the loop without
+yielding (a blocking SDK call, a large json.dumps, ...), i.e. how long every
+other request had to wait. Samples feed the "event_loop_lag" histogram in
+services.metrics and a short recent window, exposed read-only via
+GET /api/metrics/event-loop. Long jobs report the worst lag seen while they
+ran (max_lag_since) so they can be checked for starving the web server.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.25
+RECENT_SAMPLES = 2400  # ~10 minutes at SAMPLE_INTERVAL
+
+_recent: deque[tuple[float, float]] = deque(maxlen=RECENT_SAMPLES)  # (monotonic time, lag seconds)
+_task: asyncio.Task | None = None
+
+
+async def _sample(interval: float) -> None:
+    hist = metrics.histogram("event_loop_lag")
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        hist.observe(lag)
+        _recent.append((time.monotonic(), lag))
+
+
+def start(interval: float = SAMPLE_INTERVAL) -> None:
+    """Start sampling on the running loop (no-op if already running)."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_sample(interval))
+        logger.info(f"Event-loop lag monitor started (every {interval}s)")
+
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _task
+    _task = None
+
+
+def running() -> bool:
+    return _task is not None and not _task.done()
+
+
+def max_lag_since(since: float) -> float | None:
+    """Worst lag (seconds) sampled since the given time.monotonic(), None if not sampling."""
+    if not running():
+        return None
+    return max((lag for at, lag in _recent if at >= since), default=0.0)
+
+
+def snapshot() -> dict:
+    now = time.monotonic()
+    last_minute = [lag for at, lag in _recent if at >= now - 60]
+    return {
+        "running": running(),
+        "interval_seconds": SAMPLE_INTERVAL,
+        "last_lag_ms": round(_recent[-1][1] * 1000, 1) if _recent else None,
+        "max_lag_ms_1m": round(max(last_minute) * 1000, 1) if last_minute else None,
+        "max_lag_ms_window": round(max(lag for _, lag in _recent) * 1000, 1) if _recent else None,
+        "histogram": metrics.histogram("event_loop_lag").snapshot(),
+    }
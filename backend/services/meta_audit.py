@@ -15,8 +15,10 @@ import httpx
 
 from typing import TYPE_CHECKING
 
+from api import rate_limiter
 from config import settings
 from models import AuditReport
+from services import job_lease
 
 if TYPE_CHECKING:
     from services.credential_resolver import AccountCredentials
@@ -28,8 +30,8 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 BASE_URL = "https://graph.facebook.com/v21.0"
+GRAPH_ROOT_URL = "https://graph.facebook.com/"  # Batch API endpoint
 MAX_RETRIES = 3
-RETRY_DELAYS_429 = [10, 30, 60]
 
 OBJECTIVE_TO_PRIMARY_ACTION = {
     "OUTCOME_LEADS": "lead",
@@ -84,6 +86,7 @@ INSIGHT_FIELDS = (
 AUDIT_SYSTEM_PROMPT = """You are a senior paid-media strategist auditing a Meta (Facebook/Instagram) ad account. This account may run any combination of campaign objectives — lead gen, e-commerce/purchase, traffic, awareness, engagement, app installs, video views, or messaging. Analyze whatever is present.
 
 You will receive structured performance data for 7-day, 30-day, 60-day, and 90-day windows at campaign, ad set, and ad levels, plus platform/placement breakdowns, demographic breakdowns, creative metadata, and audience information.
+Where a window lists a level under "reach_approximate", that level's reach was summed from daily rows (people reached on several days are counted more than once): treat its reach as an upper bound and its frequency as a lower bound.
 
 IMPORTANT — Business Context:
 The payload may contain a "business_context" key with the following enrichment data. USE THIS to make grounded, specific assessments:
@@ -256,55 +259,42 @@ async def _api_get(
     params: dict | None = None,
     timeout: float = 60.0,
 ) -> dict:
-    """GET request to Meta Graph API with retry on 429. Raises on other errors."""
+    """GET request to Meta Graph API, paced per token; retries when throttled. Raises on other errors."""
     request_params = dict(params or {})
     request_params["access_token"] = token
+    resp = await rate_limiter.meta_request(
+        "GET", url, token, timeout=timeout, max_attempts=MAX_RETRIES, params=request_params,
+    )
 
-    for attempt in range(MAX_RETRIES):
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            resp = await client.get(url, params=request_params)
-
-            if resp.status_code == 429:
-                delay = RETRY_DELAYS_429[min(attempt, len(RETRY_DELAYS_429) - 1)]
-                logger.warning(
-                    f"Meta rate limited (429), retrying in {delay}s (attempt {attempt + 1}/{MAX_RETRIES})"
+    # Check for expired token in JSON body before raising HTTP error
+    if resp.status_code >= 400:
+        try:
+            body = resp.json()
+            error = body.get("error", {})
+            if error.get("code") == 190:
+                raise ValueError(
+                    f"Meta access token is expired or invalid (error code 190). "
+                    f"Please regenerate your META_ACCESS_TOKEN. Details: {error.get('message', '')}"
                 )
-                await asyncio.sleep(delay)
-                continue
-
-            # Check for expired token in JSON body before raising HTTP error
-            if resp.status_code >= 400:
-                try:
-                    body = resp.json()
-                    error = body.get("error", {})
-                    if error.get("code") == 190:
-                        raise ValueError(
-                            f"Meta access token is expired or invalid (error code 190). "
-                            f"Please regenerate your META_ACCESS_TOKEN. Details: {error.get('message', '')}"
-                        )
-                except (json.JSONDecodeError, AttributeError):
-                    pass
-                resp.raise_for_status()
+        except (json.JSONDecodeError, AttributeError):
+            pass
+        resp.raise_for_status()
 
-            return resp.json()
+    return resp.json()
 
-    raise RuntimeError(f"Meta API: max retries ({MAX_RETRIES}) exceeded for {url}")
 
-
-async def _api_get_paginated(
+async def _api_iter_pages(
     url: str,
     token: str,
     params: dict | None = None,
-) -> list[dict]:
-    """GET all pages following paging.next until exhausted."""
-    all_items: list[dict] = []
+):
+    """Yield each page's `data` list, following paging.next until exhausted."""
     current_url = url
     current_params = dict(params or {})
 
     while True:
         data = await _api_get(current_url, token, params=current_params)
-        items = data.get("data", [])
-        all_items.extend(items)
+        yield data.get("data", [])
 
         paging = data.get("paging", {})
         next_url = paging.get("next")
@@ -315,9 +305,99 @@ async def _api_get_paginated(
         current_url = next_url
         current_params = {}  # params are embedded in the next URL
 
+
+async def _api_get_paginated(
+    url: str,
+    token: str,
+    params: dict | None = None,
+) -> list[dict]:
+    """GET all pages following paging.next until exhausted."""
+    all_items: list[dict] = []
+    async for items in _api_iter_pages(url, token, params):
+        all_items.extend(items)
     return all_items
 
 
+async def _api_post(url: str, token: str, params: dict | None = None, timeout: float = 60.0) -> dict:
+    """POST to the Graph API (form params), paced per token like _api_get."""
+    request_params = dict(params or {})
+    request_params["access_token"] = token
+    resp = await rate_limiter.meta_request(
+        "POST", url, token, timeout=timeout, max_attempts=MAX_RETRIES, data=request_params,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+# ---------------------------------------------------------------------------
+# Async insights report runs
+# ---------------------------------------------------------------------------
+#
+# For large accounts a synchronous /insights query (90 days × daily × adset)
+# can time out or burn through the insights rate limit. Meta's async report
+# runs do the aggregation server-side: POST the same query to /insights, poll
+# the returned report_run_id, then page through /{report_run_id}/insights.
+
+ASYNC_REPORT_POLL_SECONDS = (2, 3, 5, 8, 13)
+ASYNC_REPORT_DONE = "Job Completed"
+ASYNC_REPORT_FAILED = {"Job Failed", "Job Skipped"}
+
+
+class AsyncReportFailed(RuntimeError):
+    pass
+
+
+async def _run_async_report(account_id: str, token: str, params: dict) -> str:
+    """Submit an async insights report and wait for it; returns the report_run_id."""
+    submitted = await _api_post(f"{BASE_URL}/{account_id}/insights", token, params=params)
+    report_id = submitted.get("report_run_id")
+    if not report_id:
+        raise AsyncReportFailed(f"No report_run_id in response: {submitted}")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.META_ASYNC_REPORT_TIMEOUT_SECONDS
+    polls = 0
+    while True:
+        status = await _api_get(
+            f"{BASE_URL}/{report_id}",
+            token,
+            params={"fields": "async_status,async_percent_completion"},
+        )
+        state = status.get("async_status")
+        if state == ASYNC_REPORT_DONE:
+            return report_id
+        if state in ASYNC_REPORT_FAILED:
+            raise AsyncReportFailed(f"Report {report_id} ended with status {state!r}")
+        if loop.time() >= deadline:
+            raise AsyncReportFailed(
+                f"Report {report_id} still {state!r} ({status.get('async_percent_completion')}%) "
+                f"after {settings.META_ASYNC_REPORT_TIMEOUT_SECONDS}s"
+            )
+        await asyncio.sleep(ASYNC_REPORT_POLL_SECONDS[min(polls, len(ASYNC_REPORT_POLL_SECONDS) - 1)])
+        polls += 1
+
+
+async def _iter_insight_pages(account_id: str, token: str, params: dict, use_async: bool):
+    """
+    Yield insight rows page by page — from an async report run when
+    `use_async`, falling back to the synchronous endpoint if the run fails.
+    """
+    if use_async:
+        try:
+            report_id = await _run_async_report(account_id, token, params)
+        except (AsyncReportFailed, httpx.HTTPStatusError) as e:
+            logger.warning(f"Async insights report failed, falling back to synchronous query: {e}")
+        else:
+            async for page in _api_iter_pages(
+                f"{BASE_URL}/{report_id}/insights", token, params={"limit": params.get("limit", 500)},
+            ):
+                yield page
+            return
+
+    async for page in _api_iter_pages(f"{BASE_URL}/{account_id}/insights", token, params=params):
+        yield page
+
+
 # ---------------------------------------------------------------------------
 # Date helpers
 # ---------------------------------------------------------------------------
@@ -334,6 +414,29 @@ def _window_dates(days: int) -> tuple[str, str]:
     return since.strftime("%Y-%m-%d"), until.strftime("%Y-%m-%d")
 
 
+# Levels whose shorter windows are sliced out of a single 90d daily pull
+DAILY_DERIVED_LEVELS = ("campaign", "adset")
+
+
+def derive_window_rows(
+    daily_rows: list[dict],
+    windows: dict[str, tuple[str, str]],
+) -> dict[str, list[dict]]:
+    """Split daily insight rows (time_increment=1) into each (since, until) window.
+
+    Everything additive (spend, impressions, clicks, actions) aggregates
+    exactly; reach does not, since a person reached on two days appears in
+    both rows — summaries built from these rows flag reach as approximate.
+    """
+    out: dict[str, list[dict]] = {key: [] for key in windows}
+    for row in daily_rows:
+        day = row.get("date_start", "")
+        for key, (since, until) in windows.items():
+            if since <= day <= until:
+                out[key].append(row)
+    return out
+
+
 # ---------------------------------------------------------------------------
 # Data fetching
 # ---------------------------------------------------------------------------
@@ -348,6 +451,34 @@ async def fetch_account_info(account_id: str, token: str) -> dict:
     )
 
 
+async def _insight_rows(account_id: str, token: str, params: dict, use_async: bool) -> list[dict]:
+    rows: list[dict] = []
+    async for page in _iter_insight_pages(account_id, token, params, use_async):
+        rows.extend(page)
+    return rows
+
+
+async def _cached_daily_insight_rows(
+    account_id: str,
+    token: str,
+    params: dict,
+    since: str,
+    until: str,
+    use_async: bool,
+) -> list[dict]:
+    """Daily rows for the range, served from meta_insights_cache where settled."""
+    from services import insights_cache
+
+    async def fetch(range_since: str, range_until: str) -> list[dict]:
+        return await _insight_rows(account_id, token, {
+            **params,
+            "time_range": json.dumps({"since": range_since, "until": range_until}),
+            "time_increment": "1",
+        }, use_async)
+
+    return await insights_cache.daily_rows(account_id, params["level"], params, since, until, fetch)
+
+
 async def fetch_insights(
     account_id: str,
     token: str,
@@ -355,109 +486,155 @@ async def fetch_insights(
     since: str,
     until: str,
     time_increment: str,
+    use_async: bool = False,
 ) -> list[dict]:
     """Fetch all insight rows for a given level/window.
 
     Filters rows where impressions > 0. Paginates until exhausted.
     level: 'campaign' | 'adset' | 'ad'
     time_increment: '1' (daily) or 'all_days'
+    use_async: run as a Meta async report job instead of a synchronous query
+
+    Daily pulls go through the insights cache when META_INSIGHTS_CACHE is on.
     """
-    rows = await _api_get_paginated(
-        f"{BASE_URL}/{account_id}/insights",
-        token,
-        params={
-            "level": level,
-            "fields": INSIGHT_FIELDS,
+    params = {
+        "level": level,
+        "fields": INSIGHT_FIELDS,
+        "limit": 500,
+    }
+    if time_increment == "1" and settings.META_INSIGHTS_CACHE:
+        rows = await _cached_daily_insight_rows(account_id, token, params, since, until, use_async)
+    else:
+        rows = await _insight_rows(account_id, token, {
+            **params,
             "time_range": json.dumps({"since": since, "until": until}),
             "time_increment": time_increment,
-            "limit": 500,
-        },
-    )
+        }, use_async)
     return [r for r in rows if int(r.get("impressions", 0)) > 0]
 
 
-async def fetch_creative_metadata(ad_ids: list[str], token: str) -> dict[str, dict]:
-    """Fetch creative metadata for up to N ads using Meta Batch API (50 per batch).
+CREATIVE_BATCH_SIZE = 50
+CREATIVE_FETCH_ROUNDS = 3
+CREATIVE_FIELDS = (
+    "creative{id,thumbnail_url,body,title,call_to_action_type,"
+    "object_type,image_url,link_url}"
+)
+CREATIVE_FORMATS = {
+    "VIDEO": "VIDEO",
+    "PHOTO": "PHOTO",
+    "SHARE": "LINK",
+    "STATUS": "STATUS",
+    "OFFER": "OFFER",
+    "EVENT": "EVENT",
+}
 
-    Returns dict mapping ad_id -> {format, headline, body, call_to_action, thumbnail_url, link_url}.
-    If a fetch fails for an ad, maps it to None.
-    """
-    if not ad_ids:
-        return {}
 
-    creative_fields = (
-        "creative{id,thumbnail_url,body,title,call_to_action_type,"
-        "object_type,image_url,link_url}"
-    )
+def _parse_creative(body: str) -> dict:
+    creative = json.loads(body).get("creative", {})
+    object_type = creative.get("object_type", "")
+    return {
+        "format": CREATIVE_FORMATS.get(object_type, object_type or "UNKNOWN"),
+        "headline": creative.get("title", ""),
+        "body": creative.get("body", ""),
+        "call_to_action": creative.get("call_to_action_type", ""),
+        "thumbnail_url": creative.get("thumbnail_url") or creative.get("image_url", ""),
+        "link_url": creative.get("link_url", ""),
+    }
 
-    result: dict[str, dict | None] = {}
-    batch_size = 50
 
-    for i in range(0, len(ad_ids), batch_size):
-        batch_ids = ad_ids[i : i + batch_size]
-        batch_items = [
-            {
-                "method": "GET",
-                "relative_url": f"v21.0/{ad_id}?fields={creative_fields}",
-            }
-            for ad_id in batch_ids
-        ]
+async def _fetch_creative_batch(ad_ids: list[str], token: str) -> tuple[dict[str, dict | None], list[str]]:
+    """One Batch API request. Returns (creative per ad, ad ids worth retrying).
 
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                resp = await client.post(
-                    "https://graph.facebook.com/",
-                    params={"access_token": token},
-                    json={"batch": batch_items},
-                )
-                resp.raise_for_status()
-                batch_results = resp.json()
-        except Exception as e:
-            logger.warning(f"Creative metadata batch failed for batch starting at index {i}: {e}")
-            for ad_id in batch_ids:
-                result[ad_id] = None
-            if i + batch_size < len(ad_ids):
-                await asyncio.sleep(1)
-            continue
+    Throttled, 5xx and timed-out sub-requests are returned for retry and their
+    usage headers are fed to the token's rate limiter; other errors map to None.
+    """
+    batch_items = [
+        {"method": "GET", "relative_url": f"v21.0/{ad_id}?fields={CREATIVE_FIELDS}"}
+        for ad_id in ad_ids
+    ]
+    try:
+        batch_results = await _api_post(GRAPH_ROOT_URL, token, params={"batch": json.dumps(batch_items)})
+    except Exception as e:
+        logger.warning(f"Creative metadata batch of {len(ad_ids)} ads failed: {e}")
+        return {}, list(ad_ids)
+    if not isinstance(batch_results, list):
+        batch_results = []
 
-        for ad_id, item in zip(batch_ids, batch_results):
+    bucket = rate_limiter.meta(token)
+    result: dict[str, dict | None] = {}
+    retry: list[str] = list(ad_ids[len(batch_results):])
+    for ad_id, item in zip(ad_ids, batch_results):
+        if not isinstance(item, dict):
+            # null: the sub-request timed out on Meta's side
+            retry.append(ad_id)
+            continue
+        code = item.get("code") or 0
+        if code == 200:
             try:
-                if not isinstance(item, dict) or item.get("code") != 200:
-                    logger.warning(
-                        f"Creative fetch failed for ad {ad_id}: code={item.get('code') if isinstance(item, dict) else 'N/A'}"
-                    )
-                    result[ad_id] = None
-                    continue
-
-                body = json.loads(item["body"])
-                creative = body.get("creative", {})
-                object_type = creative.get("object_type", "")
-
-                fmt_map = {
-                    "VIDEO": "VIDEO",
-                    "PHOTO": "PHOTO",
-                    "SHARE": "LINK",
-                    "STATUS": "STATUS",
-                    "OFFER": "OFFER",
-                    "EVENT": "EVENT",
-                }
-                fmt = fmt_map.get(object_type, object_type or "UNKNOWN")
-
-                result[ad_id] = {
-                    "format": fmt,
-                    "headline": creative.get("title", ""),
-                    "body": creative.get("body", ""),
-                    "call_to_action": creative.get("call_to_action_type", ""),
-                    "thumbnail_url": creative.get("thumbnail_url") or creative.get("image_url", ""),
-                    "link_url": creative.get("link_url", ""),
-                }
+                result[ad_id] = _parse_creative(item["body"])
             except Exception as e:
                 logger.warning(f"Failed to parse creative for ad {ad_id}: {e}")
                 result[ad_id] = None
+            continue
+
+        headers = {h.get("name", "").lower(): h.get("value", "") for h in item.get("headers") or []}
+        try:
+            error_code = rate_limiter.meta_error_code(json.loads(item.get("body") or "{}"))
+        except ValueError:
+            error_code = None
+        bucket.observe_meta(code, headers, error_code)
+        if code == 429 or code >= 500 or error_code in rate_limiter.META_THROTTLE_CODES:
+            retry.append(ad_id)
+        else:
+            logger.warning(f"Creative fetch failed for ad {ad_id}: code={code}")
+            result[ad_id] = None
+    return result, retry
+
+
+async def fetch_creative_metadata(ad_ids: list[str], token: str) -> dict[str, dict]:
+    """Fetch creative metadata for up to N ads using Meta Batch API (50 per batch).
 
-        if i + batch_size < len(ad_ids):
-            await asyncio.sleep(1)
+    Returns dict mapping ad_id -> {format, headline, body, call_to_action, thumbnail_url, link_url}.
+    If a fetch fails for an ad, maps it to None.
 
+    Cached creatives are reused; the rest go out as META_CREATIVE_BATCH_CONCURRENCY
+    concurrent batches paced by the token's rate limiter, and only the failed
+    sub-requests are retried (up to CREATIVE_FETCH_ROUNDS rounds).
+    """
+    from services import creative_cache
+
+    if not ad_ids:
+        return {}
+
+    result: dict[str, dict | None] = dict(creative_cache.load(ad_ids))
+    pending = [ad_id for ad_id in ad_ids if ad_id not in result]
+    cached = len(result)
+    semaphore = asyncio.Semaphore(max(settings.META_CREATIVE_BATCH_CONCURRENCY, 1))
+
+    async def run(batch_ids: list[str]) -> tuple[dict[str, dict | None], list[str]]:
+        async with semaphore:
+            return await _fetch_creative_batch(batch_ids, token)
+
+    fetched: dict[str, dict | None] = {}
+    for round_no in range(CREATIVE_FETCH_ROUNDS):
+        if not pending:
+            break
+        if round_no:
+            logger.info(f"Retrying creative metadata for {len(pending)} ads (round {round_no + 1})")
+        batches = [pending[i : i + CREATIVE_BATCH_SIZE] for i in range(0, len(pending), CREATIVE_BATCH_SIZE)]
+        pending = []
+        for got, retry in await asyncio.gather(*[run(b) for b in batches]):
+            fetched.update(got)
+            pending.extend(retry)
+
+    if pending:
+        logger.warning(f"Creative metadata unavailable for {len(pending)} ads after {CREATIVE_FETCH_ROUNDS} attempts")
+    for ad_id in pending:
+        fetched[ad_id] = None
+
+    creative_cache.store({ad_id: c for ad_id, c in fetched.items() if c is not None})
+    result.update(fetched)
+    logger.info(f"Creative metadata: {cached} cached, {len(fetched)} fetched, {len(pending)} failed")
     return result
 
 
@@ -482,20 +659,27 @@ async def fetch_breakdown(
     breakdowns: str,
     since: str,
     until: str,
+    use_async: bool = False,
 ) -> list[dict]:
-    """Fetch breakdown insights (adset level, all_days, 30d window)."""
-    return await _api_get_paginated(
-        f"{BASE_URL}/{account_id}/insights",
-        token,
-        params={
-            "level": "adset",
-            "fields": "adset_name,adset_id,spend,impressions,clicks,ctr,cpc,cpm,actions,action_values",
-            "time_range": json.dumps({"since": since, "until": until}),
-            "time_increment": "all_days",
-            "breakdowns": breakdowns,
-            "limit": 500,
-        },
-    )
+    """Fetch breakdown insights (adset level, 30d window).
+
+    One all_days row per adset × breakdown value — or, with META_INSIGHTS_CACHE
+    on, one per day (served from the cache where settled). The breakdown
+    summaries aggregate either shape the same way.
+    """
+    params = {
+        "level": "adset",
+        "fields": "adset_name,adset_id,spend,impressions,clicks,ctr,cpc,cpm,actions,action_values",
+        "breakdowns": breakdowns,
+        "limit": 500,
+    }
+    if settings.META_INSIGHTS_CACHE:
+        return await _cached_daily_insight_rows(account_id, token, params, since, until, use_async)
+    return await _insight_rows(account_id, token, {
+        **params,
+        "time_range": json.dumps({"since": since, "until": until}),
+        "time_increment": "all_days",
+    }, use_async)
 
 
 # ---------------------------------------------------------------------------
@@ -701,17 +885,19 @@ def get_primary_action(objective: str, all_actions: dict) -> str:
     return best_action or mapped or "link_click"
 
 
-def _merge_actions(base: dict, addition: dict) -> dict:
-    """Merge two all_actions dicts by summing counts and values."""
-    merged = {k: dict(v) for k, v in base.items()}
+def _merge_actions(base: dict, addition: dict) -> None:
+    """Merge an all_actions dict into `base` in place by summing counts and values.
+
+    The first row reporting an action type keeps its "cost"; callers that need
+    a group-level cost recompute it from the totals.
+    """
     for atype, metrics in addition.items():
-        if atype in merged:
-            merged[atype]["count"] = merged[atype].get("count", 0) + metrics.get("count", 0)
-            merged[atype]["value"] = merged[atype].get("value", 0) + metrics.get("value", 0)
-            # cost will be recomputed from totals later
+        merged = base.get(atype)
+        if merged is None:
+            base[atype] = dict(metrics)
         else:
-            merged[atype] = dict(metrics)
-    return merged
+            merged["count"] = merged.get("count", 0) + metrics.get("count", 0)
+            merged["value"] = merged.get("value", 0) + metrics.get("value", 0)
 
 
 def summarize_entities(
@@ -732,14 +918,14 @@ def summarize_entities(
 
     for row in rows:
         entity_id = row.get(id_field, "")
-        entity_name = row.get(name_field, "")
         if not entity_id:
             continue
 
-        if entity_id not in grouped:
-            entry: dict[str, Any] = {
+        entry = grouped.get(entity_id)
+        if entry is None:
+            entry = grouped[entity_id] = {
                 "id": entity_id,
-                "name": entity_name,
+                "name": row.get(name_field, ""),
                 "objective": row.get("objective", ""),
                 "spend": 0.0,
                 "impressions": 0,
@@ -750,14 +936,12 @@ def summarize_entities(
             }
             for pf in parent_fields:
                 entry[pf] = row.get(pf, "")
-            grouped[entity_id] = entry
 
-        entry = grouped[entity_id]
         entry["spend"] += float(row.get("spend", 0))
         entry["impressions"] += int(row.get("impressions", 0))
         entry["reach"] += int(row.get("reach", 0))
         entry["clicks"] += int(row.get("clicks", 0))
-        entry["all_actions"] = _merge_actions(entry["all_actions"], extract_all_actions(row))
+        _merge_actions(entry["all_actions"], extract_all_actions(row))
 
         if daily:
             entry["_daily_rows"].append(
@@ -841,37 +1025,27 @@ def summarize_entities(
     return summaries
 
 
-def summarize_placement_breakdown(rows: list[dict], total_spend: float) -> list[dict]:
-    """Group by publisher_platform + platform_position. Sort by spend desc."""
-    grouped: dict[str, dict] = {}
+def _summarize_breakdown(rows: list[dict], total_spend: float, dims: tuple[str, ...]) -> list[dict]:
+    """Group breakdown rows by the `dims` values, aggregate, sort by spend desc."""
+    grouped: dict[tuple, dict] = {}
     for row in rows:
-        platform = row.get("publisher_platform", "unknown")
-        position = row.get("platform_position", "unknown")
-        key = f"{platform}|{position}"
-        if key not in grouped:
-            grouped[key] = {
-                "publisher_platform": platform,
-                "platform_position": position,
-                "spend": 0.0,
-                "impressions": 0,
-                "clicks": 0,
-                "all_actions": {},
-            }
-        g = grouped[key]
+        key = tuple(row.get(d, "unknown") for d in dims)
+        g = grouped.get(key)
+        if g is None:
+            g = grouped[key] = {"spend": 0.0, "impressions": 0, "clicks": 0, "all_actions": {}}
         g["spend"] += float(row.get("spend", 0))
         g["impressions"] += int(row.get("impressions", 0))
         g["clicks"] += int(row.get("clicks", 0))
-        g["all_actions"] = _merge_actions(g["all_actions"], extract_all_actions(row))
+        _merge_actions(g["all_actions"], extract_all_actions(row))
 
     results = []
-    for g in grouped.values():
+    for key, g in grouped.items():
         spend = g["spend"]
         impressions = g["impressions"]
         clicks = g["clicks"]
         results.append(
             {
-                "publisher_platform": g["publisher_platform"],
-                "platform_position": g["platform_position"],
+                **dict(zip(dims, key)),
                 "spend": round(spend, 2),
                 "impressions": impressions,
                 "clicks": clicks,
@@ -887,50 +1061,14 @@ def summarize_placement_breakdown(rows: list[dict], total_spend: float) -> list[
     return results
 
 
-def summarize_demographic_breakdown(rows: list[dict], total_spend: float) -> list[dict]:
-    """Group by age + gender. Sort by spend desc."""
-    grouped: dict[str, dict] = {}
-    for row in rows:
-        age = row.get("age", "unknown")
-        gender = row.get("gender", "unknown")
-        key = f"{age}|{gender}"
-        if key not in grouped:
-            grouped[key] = {
-                "age": age,
-                "gender": gender,
-                "spend": 0.0,
-                "impressions": 0,
-                "clicks": 0,
-                "all_actions": {},
-            }
-        g = grouped[key]
-        g["spend"] += float(row.get("spend", 0))
-        g["impressions"] += int(row.get("impressions", 0))
-        g["clicks"] += int(row.get("clicks", 0))
-        g["all_actions"] = _merge_actions(g["all_actions"], extract_all_actions(row))
+def summarize_placement_breakdown(rows: list[dict], total_spend: float) -> list[dict]:
+    """Group by publisher_platform + platform_position. Sort by spend desc."""
+    return _summarize_breakdown(rows, total_spend, ("publisher_platform", "platform_position"))
 
-    results = []
-    for g in grouped.values():
-        spend = g["spend"]
-        impressions = g["impressions"]
-        clicks = g["clicks"]
-        results.append(
-            {
-                "age": g["age"],
-                "gender": g["gender"],
-                "spend": round(spend, 2),
-                "impressions": impressions,
-                "clicks": clicks,
-                "ctr": round(clicks / impressions * 100, 4) if impressions > 0 else 0.0,
-                "cpc": round(spend / clicks, 4) if clicks > 0 else 0.0,
-                "cpm": round(spend / impressions * 1000, 4) if impressions > 0 else 0.0,
-                "all_actions": g["all_actions"],
-                "pct_of_total_spend": round(spend / total_spend * 100, 2) if total_spend > 0 else 0.0,
-            }
-        )
 
-    results.sort(key=lambda x: x["spend"], reverse=True)
-    return results
+def summarize_demographic_breakdown(rows: list[dict], total_spend: float) -> list[dict]:
+    """Group by age + gender. Sort by spend desc."""
+    return _summarize_breakdown(rows, total_spend, ("age", "gender"))
 
 
 # ---------------------------------------------------------------------------
@@ -952,6 +1090,11 @@ def _strip_markdown_fences(text: str) -> str:
     return text
 
 
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+CLAUDE_OPUS_MODEL = "claude-opus-4-7"
+OPENAI_MODEL = "gpt-4o"
+
+
 async def analyze_with_claude(payload_str: str, api_key: str) -> dict:
     """POST to Anthropic API (claude-sonnet-4-20250514). Returns parsed JSON or {"error": ...}."""
     try:
@@ -964,7 +1107,7 @@ async def analyze_with_claude(payload_str: str, api_key: str) -> dict:
                     "content-type": "application/json",
                 },
                 json={
-                    "model": "claude-sonnet-4-20250514",
+                    "model": CLAUDE_MODEL,
                     "max_tokens": 12000,
                     "system": AUDIT_SYSTEM_PROMPT,
                     "messages": [{"role": "user", "content": payload_str}],
@@ -992,7 +1135,7 @@ async def analyze_with_claude_opus(payload_str: str, api_key: str) -> dict:
                     "content-type": "application/json",
                 },
                 json={
-                    "model": "claude-opus-4-7",
+                    "model": CLAUDE_OPUS_MODEL,
                     "max_tokens": 16000,
                     "system": AUDIT_SYSTEM_PROMPT,
                     "messages": [{"role": "user", "content": payload_str}],
@@ -1019,7 +1162,7 @@ async def analyze_with_openai(payload_str: str, api_key: str) -> dict:
                     "content-type": "application/json",
                 },
                 json={
-                    "model": "gpt-4o",
+                    "model": OPENAI_MODEL,
                     "max_tokens": 12000,
                     "messages": [
                         {"role": "system", "content": AUDIT_SYSTEM_PROMPT},
@@ -1037,42 +1180,136 @@ async def analyze_with_openai(payload_str: str, api_key: str) -> dict:
         return {"error": str(e)}
 
 
+async def run_analyses(
+    payload_str: str,
+    models_to_run: list[str],
+    log_prefix: str,
+    bypass_cache: bool = False,
+) -> dict[str, Any]:
+    """Run the selected models concurrently on the payload, through the analysis cache.
+
+    Returns {label: parsed analysis or {"error": ...}}.
+    """
+    from services.analysis_cache import cached_analysis
+
+    openai_key = getattr(settings, "OPENAI_API_KEY", "")
+    runners = {
+        "claude": (CLAUDE_MODEL, lambda: analyze_with_claude(payload_str, settings.CLAUDE_API_KEY)),
+        "claude_opus": (CLAUDE_OPUS_MODEL, lambda: analyze_with_claude_opus(payload_str, settings.CLAUDE_API_KEY)),
+        "openai": (OPENAI_MODEL, lambda: analyze_with_openai(payload_str, openai_key)),
+    }
+    analysis_labels = [label for label in runners if label in models_to_run]
+    analysis_tasks = [
+        cached_analysis(runners[label][0], AUDIT_SYSTEM_PROMPT, payload_str, runners[label][1], bypass=bypass_cache)
+        for label in analysis_labels
+    ]
+    analysis_results_raw = await asyncio.gather(*analysis_tasks, return_exceptions=True)
+
+    analyses: dict[str, Any] = {}
+    for label, result in zip(analysis_labels, analysis_results_raw):
+        if isinstance(result, Exception):
+            logger.error(f"{log_prefix}: {label} analysis raised exception: {result}")
+            analyses[label] = {"error": str(result)}
+        else:
+            analyses[label] = result
+    return analyses
+
+
 # ---------------------------------------------------------------------------
 # Payload truncation
 # ---------------------------------------------------------------------------
 
 
-def _truncate_payload(payload: dict) -> dict:
-    """If JSON string of payload > 120,000 chars, truncate in priority order."""
-    truncation_notes: list[str] = []
+PAYLOAD_MAX_CHARS = 120_000
+
+
+def _object_len(fragments: dict[str, int]) -> int:
+    """len(json.dumps(obj)) for a dict, given len(json.dumps(value)) per key."""
+    if not fragments:
+        return 2
+    return 2 + sum(len(json.dumps(k)) + 2 + n for k, n in fragments.items()) + 2 * (len(fragments) - 1)
+
+
+def _object_text(fragments: dict[str, str]) -> str:
+    return "{" + ", ".join(f"{json.dumps(k)}: {v}" for k, v in fragments.items()) + "}"
 
-    def _size() -> int:
-        return len(json.dumps(payload))
+
+class _SerializedPayload:
+    """
+    The payload's JSON kept as one fragment per top-level key and per
+    windows[window][key]. After a truncation step only the edited sections are
+    re-serialized; size() is computed from fragment lengths and text() joins
+    the fragments into exactly what json.dumps(payload) would return.
+    """
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.windows = {
+            w: {k: json.dumps(v) for k, v in data.items()}
+            for w, data in payload.get("windows", {}).items()
+        }
+        self.top = {k: json.dumps(v) for k, v in payload.items() if k != "windows"}
+
+    def refresh(self, window: str, key: str) -> None:
+        data = self.payload["windows"][window]
+        if key in data:
+            self.windows[window][key] = json.dumps(data[key])
+        else:
+            self.windows[window].pop(key, None)
+
+    def set(self, key: str, value: Any) -> None:
+        self.payload[key] = value
+        self.top[key] = json.dumps(value)
+
+    def size(self) -> int:
+        fragments = {k: len(v) for k, v in self.top.items()}
+        if "windows" in self.payload:
+            fragments["windows"] = _object_len({
+                w: _object_len({k: len(v) for k, v in parts.items()}) for w, parts in self.windows.items()
+            })
+        return _object_len(fragments)
+
+    def text(self) -> str:
+        windows = _object_text({w: _object_text(parts) for w, parts in self.windows.items()})
+        return _object_text({k: windows if k == "windows" else self.top[k] for k in self.payload})
+
+
+def _truncate_payload(payload: dict) -> tuple[dict, str]:
+    """If JSON string of payload > 120,000 chars, truncate in priority order.
+
+    Returns the payload and its JSON string (serialized once, section by section).
+    """
+    truncation_notes: list[str] = []
+    doc = _SerializedPayload(payload)
+    windows = payload.get("windows", {})
 
     # 1. Remove 90d ad-level data
-    if _size() > 120_000:
-        if "windows" in payload and "90d" in payload["windows"]:
-            payload["windows"]["90d"].pop("ads", None)
+    if doc.size() > PAYLOAD_MAX_CHARS:
+        if "90d" in windows:
+            windows["90d"].pop("ads", None)
+            doc.refresh("90d", "ads")
             truncation_notes.append("90d ad-level data removed")
 
     # 2. Remove 60d ad-level data
-    if _size() > 120_000:
-        if "windows" in payload and "60d" in payload["windows"]:
-            payload["windows"]["60d"].pop("ads", None)
+    if doc.size() > PAYLOAD_MAX_CHARS:
+        if "60d" in windows:
+            windows["60d"].pop("ads", None)
+            doc.refresh("60d", "ads")
             truncation_notes.append("60d ad-level data removed")
 
     # 3. Remove 90d adset-level data
-    if _size() > 120_000:
-        if "windows" in payload and "90d" in payload["windows"]:
-            payload["windows"]["90d"].pop("adsets", None)
+    if doc.size() > PAYLOAD_MAX_CHARS:
+        if "90d" in windows:
+            windows["90d"].pop("adsets", None)
+            doc.refresh("90d", "adsets")
             truncation_notes.append("90d adset-level data removed")
 
     # 4. Truncate all_actions to top 5 by count per entity in all windows
-    if _size() > 120_000:
-        for window_key, window_data in payload.get("windows", {}).items():
+    if doc.size() > PAYLOAD_MAX_CHARS:
+        for window_key, window_data in windows.items():
             for level_key in ("campaigns", "adsets", "ads"):
-                entities = window_data.get(level_key, [])
-                for entity in entities:
+                changed = False
+                for entity in window_data.get(level_key, []):
                     all_actions = entity.get("all_actions", {})
                     if len(all_actions) > 5:
                         top5 = sorted(
@@ -1081,22 +1318,29 @@ def _truncate_payload(payload: dict) -> dict:
                             reverse=True,
                         )[:5]
                         entity["all_actions"] = dict(top5)
+                        changed = True
+                if changed:
+                    doc.refresh(window_key, level_key)
         truncation_notes.append("all_actions truncated to top 5 per entity in all windows")
 
     # 5. Remove creative.body and creative.headline
-    if _size() > 120_000:
-        for window_key, window_data in payload.get("windows", {}).items():
+    if doc.size() > PAYLOAD_MAX_CHARS:
+        for window_key, window_data in windows.items():
+            changed = False
             for entity in window_data.get("ads", []):
                 creative = entity.get("creative")
-                if isinstance(creative, dict):
+                if isinstance(creative, dict) and ("body" in creative or "headline" in creative):
                     creative.pop("body", None)
                     creative.pop("headline", None)
+                    changed = True
+            if changed:
+                doc.refresh(window_key, "ads")
         truncation_notes.append("creative.body and creative.headline removed")
 
     if truncation_notes:
-        payload["_truncation_note"] = truncation_notes
+        doc.set("_truncation_note", truncation_notes)
 
-    return payload
+    return payload, doc.text()
 
 
 # ---------------------------------------------------------------------------
@@ -1145,8 +1389,6 @@ async def fetch_conversation_insights(
         for conv, msgs in zip(batch, results):
             if msgs:
                 all_threads.append((conv, msgs))
-        if i + batch_size < len(conversations):
-            await asyncio.sleep(0.3)
 
     # Build anonymized corpus — strip names, keep message content only
     corpus_parts: list[str] = []
@@ -1337,8 +1579,14 @@ async def build_audit_payload(
     report_notes: str | None = None,
     creds: "AccountCredentials | None" = None,
     db: Any = None,
-) -> dict:
-    """Fetch all Meta data and return the structured audit payload."""
+    async_insights: bool | None = None,
+) -> tuple[dict, str]:
+    """Fetch all Meta data and return the structured audit payload and its JSON.
+
+    async_insights: submit the insights/breakdown queries as Meta async report
+    runs (polled concurrently); defaults to settings.META_ASYNC_INSIGHTS.
+    """
+    use_async = settings.META_ASYNC_INSIGHTS if async_insights is None else async_insights
 
     # Pre-compute date windows
     windows_config = {
@@ -1357,21 +1605,22 @@ async def build_audit_payload(
     tasks.append(fetch_account_info(account_id, token))
     task_labels.append("account_info")
 
-    # 12 insight fetch calls: 4 windows × 3 levels
-    # time_increment rules per spec:
-    #   campaign: daily (1) for all windows — needed for frequency trending
-    #   adset:    daily for 7d/30d, all_days for 60d/90d
-    #   ad:       all_days for all windows — creative analysis doesn't need daily
-    for window_key, (since, until) in windows_config.items():
-        for level in ("campaign", "adset", "ad"):
-            if level == "campaign":
-                time_increment = "1"
-            elif level == "adset":
-                time_increment = "1" if window_key in ("7d", "30d") else "all_days"
-            else:  # ad
-                time_increment = "all_days"
-            tasks.append(fetch_insights(account_id, token, level, since, until, time_increment))
-            task_labels.append(f"insights_{window_key}_{level}")
+    # Insight fetch calls:
+    #   campaign, adset: one 90d daily (time_increment=1) pull per level; the
+    #     7d/30d/60d windows are sliced out of it locally (derive_window_rows)
+    #   ad: all_days per window — creative analysis doesn't need daily, and
+    #     90d of daily ad rows would dwarf everything else
+    #   With the insights cache on, ad level is a cached daily pull as well:
+    #     only unsettled days are downloaded, so its size stops mattering
+    derived_levels = ("campaign", "adset", "ad") if settings.META_INSIGHTS_CACHE else DAILY_DERIVED_LEVELS
+    since_90d, until_90d = windows_config["90d"]
+    for level in derived_levels:
+        tasks.append(fetch_insights(account_id, token, level, since_90d, until_90d, "1", use_async))
+        task_labels.append(f"insights_daily_{level}")
+    if "ad" not in derived_levels:
+        for window_key, (since, until) in windows_config.items():
+            tasks.append(fetch_insights(account_id, token, "ad", since, until, "all_days", use_async))
+            task_labels.append(f"insights_{window_key}_ad")
 
     # Audiences
     tasks.append(fetch_audiences(account_id, token))
@@ -1379,12 +1628,14 @@ async def build_audit_payload(
 
     # Placement breakdown (30d)
     tasks.append(
-        fetch_breakdown(account_id, token, "publisher_platform,platform_position", since_30d, until_30d)
+        fetch_breakdown(
+            account_id, token, "publisher_platform,platform_position", since_30d, until_30d, use_async,
+        )
     )
     task_labels.append("breakdown_placement")
 
     # Demographic breakdown (30d)
-    tasks.append(fetch_breakdown(account_id, token, "age,gender", since_30d, until_30d))
+    tasks.append(fetch_breakdown(account_id, token, "age,gender", since_30d, until_30d, use_async))
     task_labels.append("breakdown_demographic")
 
     # Run all in parallel
@@ -1402,11 +1653,15 @@ async def build_audit_payload(
     account_info = result_map["account_info"]
 
     # Organize insight rows into a nested dict
-    raw_insights: dict[str, dict[str, list[dict]]] = {}
-    for window_key in windows_config:
-        raw_insights[window_key] = {}
-        for level in ("campaign", "adset", "ad"):
-            raw_insights[window_key][level] = result_map.get(f"insights_{window_key}_{level}", [])
+    raw_insights: dict[str, dict[str, list[dict]]] = {window_key: {} for window_key in windows_config}
+    for level in derived_levels:
+        derived = derive_window_rows(result_map.get(f"insights_daily_{level}", []), windows_config)
+        for window_key, rows in derived.items():
+            raw_insights[window_key][level] = rows
+    if "ad" not in derived_levels:
+        for window_key in windows_config:
+            raw_insights[window_key]["ad"] = result_map.get(f"insights_{window_key}_ad", [])
+    reach_approximate = [f"{level}s" for level in derived_levels]
 
     audiences = result_map.get("audiences", [])
     placement_rows = result_map.get("breakdown_placement", [])
@@ -1454,6 +1709,8 @@ async def build_audit_payload(
             "campaigns": campaigns,
             "adsets": adsets,
             "ads": ads,
+            # Reach summed over daily rows (not deduplicated across days)
+            "reach_approximate": reach_approximate,
         }
 
     # Compute breakdowns
@@ -1502,8 +1759,12 @@ async def build_audit_payload(
     if ghl_ok:
         # Fetch contacts once and feed both LTV and geographic enrichments
         try:
-            from api.ghl_client import get_all_contacts
-            ghl_contacts = await get_all_contacts(creds=creds)
+            if db is not None:
+                from services.contact_mirror import get_contacts
+                ghl_contacts = await get_contacts(db, creds=creds)
+            else:
+                from api.ghl_client import get_all_contacts
+                ghl_contacts = await get_all_contacts(creds=creds)
         except Exception as e:
             logger.warning(f"Could not pre-fetch GHL contacts for enrichment: {e}")
             ghl_contacts = []
@@ -1561,8 +1822,7 @@ async def build_audit_payload(
         if report_notes:
             payload["business_context"]["report_context"] = report_notes
 
-    payload = _truncate_payload(payload)
-    return payload
+    return _truncate_payload(payload)
 
 
 async def run_audit(
@@ -1576,12 +1836,46 @@ async def run_audit(
     business_notes: str | None = None,
     report_notes: str | None = None,
     creds: "AccountCredentials | None" = None,
+    async_insights: bool | None = None,
+    bypass_analysis_cache: bool = False,
+) -> None:
+    """Full audit workflow. Updates AuditReport row when done.
+    No-op if another worker already holds this report's audit lease.
+    bypass_analysis_cache: call the models even if an identical analysis is cached."""
+    try:
+        with job_lease.lease("audit", report_id):
+            await _run_audit(
+                report_id, account_id, token, db, models_to_run,
+                business_profile=business_profile,
+                website_url=website_url,
+                business_notes=business_notes,
+                report_notes=report_notes,
+                creds=creds,
+                async_insights=async_insights,
+                bypass_analysis_cache=bypass_analysis_cache,
+            )
+    except job_lease.LeaseUnavailable:
+        logger.warning(f"Audit {report_id} skipped: already running on another worker")
+
+
+async def _run_audit(
+    report_id: int,
+    account_id: str,
+    token: str,
+    db: Any,
+    models_to_run: list[str],
+    business_profile: dict | None = None,
+    website_url: str | None = None,
+    business_notes: str | None = None,
+    report_notes: str | None = None,
+    creds: "AccountCredentials | None" = None,
+    async_insights: bool | None = None,
+    bypass_analysis_cache: bool = False,
 ) -> None:
-    """Full audit workflow. Updates AuditReport row when done."""
     try:
         # 1. Fetch all Meta data + enrichment
         logger.info(f"Audit {report_id}: building payload for account {account_id}")
-        payload = await build_audit_payload(
+        payload, payload_str = await build_audit_payload(
             account_id, token,
             business_profile=business_profile,
             website_url=website_url,
@@ -1589,41 +1883,17 @@ async def run_audit(
             report_notes=report_notes,
             creds=creds,
             db=db,
+            async_insights=async_insights,
         )
 
-        # 2. Serialize payload
-        payload_str = json.dumps(payload)
+        # 2. Payload JSON (serialized once while truncating, shared by every model)
         logger.info(
             f"Audit {report_id}: payload built ({len(payload_str):,} chars), "
             f"running AI analysis with models: {models_to_run}"
         )
 
         # 3. Run AI analyses concurrently
-        analysis_tasks: list[Any] = []
-        analysis_labels: list[str] = []
-
-        if "claude" in models_to_run:
-            analysis_tasks.append(analyze_with_claude(payload_str, settings.CLAUDE_API_KEY))
-            analysis_labels.append("claude")
-
-        if "claude_opus" in models_to_run:
-            analysis_tasks.append(analyze_with_claude_opus(payload_str, settings.CLAUDE_API_KEY))
-            analysis_labels.append("claude_opus")
-
-        if "openai" in models_to_run:
-            openai_key = getattr(settings, "OPENAI_API_KEY", "")
-            analysis_tasks.append(analyze_with_openai(payload_str, openai_key))
-            analysis_labels.append("openai")
-
-        analysis_results_raw = await asyncio.gather(*analysis_tasks, return_exceptions=True)
-
-        analyses: dict[str, Any] = {}
-        for label, result in zip(analysis_labels, analysis_results_raw):
-            if isinstance(result, Exception):
-                logger.error(f"Audit {report_id}: {label} analysis raised exception: {result}")
-                analyses[label] = {"error": str(result)}
-            else:
-                analyses[label] = result
+        analyses = await run_analyses(payload_str, models_to_run, f"Audit {report_id}", bypass_analysis_cache)
 
         # 4. Query previous completed report for the same account (for PDF comparison)
         prev_report = (
@@ -1764,8 +2034,27 @@ async def reanalyze_audit(
     models_to_run: list[str],
     business_profile: dict | None = None,
     business_notes: str | None = None,
+    bypass_analysis_cache: bool = False,
+) -> None:
+    """Re-run AI analysis on existing stored raw_metrics. No Meta API calls.
+    No-op if another worker already holds this report's audit lease."""
+    try:
+        with job_lease.lease("audit", report_id):
+            await _reanalyze_audit(
+                report_id, db, models_to_run, business_profile, business_notes, bypass_analysis_cache,
+            )
+    except job_lease.LeaseUnavailable:
+        logger.warning(f"Re-analysis of audit {report_id} skipped: already running on another worker")
+
+
+async def _reanalyze_audit(
+    report_id: int,
+    db: Any,
+    models_to_run: list[str],
+    business_profile: dict | None = None,
+    business_notes: str | None = None,
+    bypass_analysis_cache: bool = False,
 ) -> None:
-    """Re-run AI analysis on existing stored raw_metrics. No Meta API calls."""
     report = db.query(AuditReport).filter(AuditReport.id == report_id).first()
     old_analyses = dict(report.analyses or {}) if report else {}
 
@@ -1810,31 +2099,7 @@ async def reanalyze_audit(
             f"Reanalysis {report_id}: payload={len(payload_str):,} chars, models={models_to_run}"
         )
 
-        analysis_tasks: list[Any] = []
-        analysis_labels: list[str] = []
-
-        if "claude" in models_to_run:
-            analysis_tasks.append(analyze_with_claude(payload_str, settings.CLAUDE_API_KEY))
-            analysis_labels.append("claude")
-
-        if "claude_opus" in models_to_run:
-            analysis_tasks.append(analyze_with_claude_opus(payload_str, settings.CLAUDE_API_KEY))
-            analysis_labels.append("claude_opus")
-
-        if "openai" in models_to_run:
-            openai_key = getattr(settings, "OPENAI_API_KEY", "")
-            analysis_tasks.append(analyze_with_openai(payload_str, openai_key))
-            analysis_labels.append("openai")
-
-        analysis_results_raw = await asyncio.gather(*analysis_tasks, return_exceptions=True)
-
-        analyses: dict[str, Any] = {}
-        for label, result in zip(analysis_labels, analysis_results_raw):
-            if isinstance(result, Exception):
-                logger.error(f"Reanalysis {report_id}: {label} raised exception: {result}")
-                analyses[label] = {"error": str(result)}
-            else:
-                analyses[label] = result
+        analyses = await run_analyses(payload_str, models_to_run, f"Reanalysis {report_id}", bypass_analysis_cache)
 
         # 3. Previous report for PDF comparison
         prev_report = (
@@ -0,0 +1,92 @@
+"""
+In-process latency histograms for hot paths (webhook handling, etc.).
+
+Counters live for the lifetime of the process and are exposed read-only via
+GET /api/metrics/latency. Bucket bounds are in seconds.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self, name: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                idx = i
+                break
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bucket bound containing the q-th quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running >= target and n:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, n in zip(self.buckets, self.counts):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {
+                "count": self.count,
+                "sum_seconds": round(self.total, 6),
+                "mean_seconds": round(self.total / self.count, 6) if self.count else None,
+                "max_seconds": round(self.max, 6),
+                "p50_le": self.percentile(0.50),
+                "p95_le": self.percentile(0.95),
+                "p99_le": self.percentile(0.99),
+                "buckets": buckets,
+            }
+
+
+_histograms: dict[str, Histogram] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str) -> Histogram:
+    """Get or create the named histogram."""
+    with _registry_lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = Histogram(name)
+        return h
+
+
+def latency_snapshot() -> dict:
+    return {name: h.snapshot() for name, h in sorted(_histograms.items())}
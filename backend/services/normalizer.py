@@ -1,8 +1,8 @@
 import logging
 import statistics
-from typing import Any
+from typing import Any, Sequence
 
-from api.claude_client import normalize_ltv_values
+from api.claude_client import PercentileRanker, normalize_ltv_values
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +17,33 @@ def normalize_and_stats(
         and a 10-bucket distribution.
     """
     percentiles = normalize_ltv_values(ltv_values)
+    return percentiles, _stats(ltv_values, percentiles)
 
-    # Compute stats
+
+def ranker_and_stats(
+    ltv_values: Sequence[float],
+) -> tuple[PercentileRanker, dict[str, Any]]:
+    """Streaming form of normalize_and_stats: returns a ranker instead of a
+    percentile list, so only the float array is held for the whole location."""
+    ranker = PercentileRanker(ltv_values)
+    return ranker, _stats(ranker.sorted_values, (ranker.rank(v) for v in ltv_values), presorted=True)
+
+
+def _median_sorted(values: Sequence[float]) -> float:
+    n = len(values)
+    mid = n // 2
+    return values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def _stats(ltv_values: Sequence[float], percentiles, presorted: bool = False) -> dict[str, Any]:
+    if not ltv_values:
+        median = 0
+    else:
+        median = _median_sorted(ltv_values) if presorted else statistics.median(ltv_values)
     stats: dict[str, Any] = {
         "min_ltv": float(min(ltv_values)) if ltv_values else 0,
         "max_ltv": float(max(ltv_values)) if ltv_values else 0,
-        "median_ltv": float(statistics.median(ltv_values)) if ltv_values else 0,
+        "median_ltv": float(median) if ltv_values else 0,
         "mean_ltv": float(statistics.mean(ltv_values)) if ltv_values else 0,
         "count": len(ltv_values),
     }
@@ -38,4 +59,4 @@ def normalize_and_stats(
         f"Normalization stats: min=${stats['min_ltv']:.2f}, "
         f"max=${stats['max_ltv']:.2f}, median=${stats['median_ltv']:.2f}"
     )
-    return percentiles, stats
+    return stats
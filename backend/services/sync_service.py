@@ -1,31 +1,61 @@
+import asyncio
 import logging
+import threading
+from array import array
+from contextlib import AsyncExitStack
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import TYPE_CHECKING
+from typing import Callable, Iterable, Iterator, TYPE_CHECKING
 
 from sqlalchemy.orm import Session
 
 from api import ghl_client, meta_client
-from models import SyncConfig, SyncRun, SyncContact, SyncStatus
+from config import settings
+from models import SyncConfig, SyncRun, SyncStatus
 from services.hasher import prepare_contact_row
-from services.normalizer import normalize_and_stats
-from services import email_service
+from services.normalizer import ranker_and_stats
+from services import audience_delta, bulk_writer, contact_mirror, email_service, job_lease
 
 if TYPE_CHECKING:
     from services.credential_resolver import AccountCredentials
 
 logger = logging.getLogger(__name__)
 
-# Track if a sync is currently running
-_running_sync_id: int | None = None
+# ── Per-account run registry ─────────────────────────────────────────────────
+# config_id → SyncRun id (None while the run row is being created). Shared by
+# the API event loop and the scheduler thread, hence the threading lock.
+_running: dict[int, int | None] = {}
+_registry_lock = threading.Lock()
 
 
-def is_sync_running() -> bool:
-    return _running_sync_id is not None
+class SyncAlreadyRunning(RuntimeError):
+    pass
 
 
-def get_running_sync_id() -> int | None:
-    return _running_sync_id
+def is_sync_running(config_id: int | None = None) -> bool:
+    """Whether `config_id` (or, with no argument, any account) is syncing."""
+    with _registry_lock:
+        return config_id in _running if config_id is not None else bool(_running)
+
+
+def get_running_sync_id(config_id: int | None = None) -> int | None:
+    with _registry_lock:
+        if config_id is not None:
+            return _running.get(config_id)
+        return next((run_id for run_id in _running.values() if run_id is not None), None)
+
+
+def running_syncs() -> dict[int, int | None]:
+    """Snapshot of config_id → running SyncRun id."""
+    with _registry_lock:
+        return dict(_running)
+
+
+def _claim(config_id: int) -> None:
+    with _registry_lock:
+        if config_id in _running:
+            raise SyncAlreadyRunning(f"A sync is already running for config {config_id}")
+        _running[config_id] = None
 
 
 async def run_sync(
@@ -33,15 +63,30 @@ async def run_sync(
     db: Session,
     skip_email: bool = False,
     creds: "AccountCredentials | None" = None,
-) -> None:
-    """Execute the full sync workflow."""
-    global _running_sync_id
-
-    run = SyncRun(config_id=config_id, status=SyncStatus.RUNNING)
-    db.add(run)
-    db.commit()
-    db.refresh(run)
-    _running_sync_id = run.id
+) -> int:
+    """
+    Execute the full sync workflow and return the SyncRun id.
+    Raises SyncAlreadyRunning if this config is mid-sync in this process or
+    (via its job lease) in any other worker.
+    """
+    _claim(config_id)
+    lease = None
+    try:
+        lease = job_lease.try_acquire("sync", config_id)
+        run = SyncRun(config_id=config_id, status=SyncStatus.RUNNING)
+        db.add(run)
+        db.commit()
+        db.refresh(run)
+    except Exception as e:
+        if lease:
+            lease.release()
+        with _registry_lock:
+            _running.pop(config_id, None)
+        if isinstance(e, job_lease.LeaseUnavailable):
+            raise SyncAlreadyRunning(f"A sync is already running for config {config_id} on another worker") from e
+        raise
+    with _registry_lock:
+        _running[config_id] = run.id
 
     try:
         config = db.query(SyncConfig).filter(SyncConfig.id == config_id).first()
@@ -55,44 +100,61 @@ async def run_sync(
 
         logger.info(f"Starting sync run {run.id}, LTV field: {config.ghl_ltv_field_name}")
 
-        # Step 1: Fetch all contacts from GHL
-        logger.info("Step 1: Fetching all contacts from GHL...")
-        all_contacts = await ghl_client.get_all_contacts(creds=creds)
-        if not all_contacts:
+        # Step 1: Refresh the GHL contact mirror; contacts are streamed from it below
+        logger.info("Step 1: Refreshing GHL contact mirror...")
+        location_id = await contact_mirror.ensure_fresh(db, creds=creds)
+        total_contacts = contact_mirror.count_contacts(db, location_id)
+        if not total_contacts:
             raise ValueError("No contacts found in GHL location")
 
-        contacts = [c for c in all_contacts if c.get("email") or c.get("phone")]
-        skipped = len(all_contacts) - len(contacts)
-        if skipped:
-            logger.info(f"Skipped {skipped} contacts with no email or phone (unidentifiable by Meta)")
+        def identifiable_contacts() -> Iterator[dict]:
+            # Contacts with no email or phone are unidentifiable by Meta
+            return contact_mirror.iter_contacts(db, location_id, identifiable_only=True)
 
-        # Step 2: Extract LTV values
+        # Step 2: Extract LTV values — first pass keeps only the float array
         logger.info("Step 2: Extracting LTV values...")
         custom_fields = await ghl_client.get_custom_fields(creds=creds)
         ltv_field_uuid = _resolve_ltv_field_uuid(custom_fields, config.ghl_ltv_field_key)
         logger.info(f"Resolved LTV field '{config.ghl_ltv_field_key}' → UUID '{ltv_field_uuid}'")
 
-        ltv_values = []
-        for c in contacts:
+        ltv_values = array("d")
+        for c in identifiable_contacts():
             ltv_values.append(_extract_ltv(c, ltv_field_uuid) or 0.0)
 
+        skipped = total_contacts - len(ltv_values)
+        if skipped:
+            logger.info(f"Skipped {skipped} contacts with no email or phone (unidentifiable by Meta)")
         nonzero_count = sum(1 for v in ltv_values if v > 0)
-        logger.info(f"{nonzero_count}/{len(contacts)} contacts have non-zero LTV values; remainder uploaded with LTV=0")
+        logger.info(f"{nonzero_count}/{len(ltv_values)} contacts have non-zero LTV values; remainder uploaded with LTV=0")
 
-        run.contacts_processed = len(contacts)
+        run.contacts_processed = len(ltv_values)
         db.commit()
 
-        # Step 3: Normalize via Claude
-        logger.info("Step 3: Normalizing LTV values via Claude API...")
-        percentiles, norm_stats = normalize_and_stats(ltv_values)
+        # Step 3: Percentile-rank LTV values against the full distribution
+        logger.info("Step 3: Normalizing LTV values...")
+        ranker, norm_stats = ranker_and_stats(ltv_values)
 
-        # Step 4: Hash PII and prepare rows
-        logger.info("Step 4: Preparing contact data (hashing PII)...")
+        # Step 4: Hash PII and prepare rows lazily, contact by contact
         schema = ["EMAIL", "PHONE", "FN", "LN", "CT", "ST", "ZIP", "COUNTRY", "LOOKALIKE_VALUE"]
-        rows = [
-            prepare_contact_row(contact, pct)
-            for contact, pct in zip(contacts, percentiles)
-        ]
+        writer = bulk_writer.SyncContactWriter(db, run.id)
+
+        def prepared(contacts: Iterable[dict], record: bool = False) -> Iterator[tuple[str, list]]:
+            """(ghl_contact_id, upload row) per contact; `record` also queues its sync_contacts row."""
+            for contact in contacts:
+                raw_ltv = _extract_ltv(contact, ltv_field_uuid) or 0.0
+                pct = ranker.rank(raw_ltv)
+                if record:
+                    writer.add({
+                        "ghl_contact_id": contact.get("id", ""),
+                        "email": contact.get("email"),
+                        "phone": contact.get("phone"),
+                        "first_name": contact.get("firstName"),
+                        "last_name": contact.get("lastName"),
+                        "raw_ltv": Decimal(str(raw_ltv)),
+                        "normalized_value": pct,
+                        "meta_matched": True,
+                    })
+                yield contact.get("id", ""), prepare_contact_row(contact, pct)
 
         # Step 5: Get or create Meta Custom Audience
         audience_name = "GHL-HighValue"
@@ -119,9 +181,65 @@ async def run_sync(
                 creds=creds,
             )
 
-        # Step 6: Upload contacts in batches
-        logger.info("Step 6: Uploading contacts to Meta...")
-        upload_result = await meta_client.upload_users(audience["id"], schema, rows, creds=creds)
+        # Step 6: Upload the delta against what the audience was last sent
+        # (or replace the whole audience when a full refresh is due)
+        audience_id = audience["id"]
+        stored = audience_delta.stored_count(db, audience_id)
+        full_reason = audience_delta.full_refresh_reason(config, stored, len(ltv_values))
+        plan = None
+        if not full_reason:
+            logger.info("Step 6: Comparing contacts with stored audience members...")
+            plan = audience_delta.plan_delta(
+                db, audience_id, location_id, schema, prepared(identifiable_contacts(), record=True),
+            )
+            full_reason = audience_delta.full_refresh_reason(config, stored, len(ltv_values), plan)
+        run_stats = {"audience": plan.summary() if plan else {"stored": stored}}
+
+        if full_reason:
+            logger.info(f"Step 6: Replacing all {len(ltv_values)} audience members ({full_reason})...")
+            audience_delta.delete_members(db, audience_id)
+            rows = audience_delta.record_members(
+                db, audience_id, schema, prepared(identifiable_contacts(), record=plan is None),
+            )
+            upload_result = await meta_client.upload_batches(
+                audience_id, schema, meta_client.batched(rows), len(ltv_values),
+                creds=creds, endpoint="usersreplace",
+            )
+            if upload_result["stats"]["batches"]:
+                config.last_full_sync_at = datetime.now(timezone.utc)
+            else:
+                # Nothing identifiable to send: Meta can't replace with an empty list,
+                # so the audience keeps its members and the next run retries the refresh
+                logger.warning(f"Step 6: No identifiable contacts; audience {audience_id} left unchanged")
+                run_stats["audience"]["skipped"] = "no identifiable contacts"
+            matched = upload_result.get("num_received", 0)
+            run_stats["audience"].update(mode="full", reason=full_reason)
+            run_stats["upload"] = upload_result.get("stats")
+        else:
+            logger.info(
+                f"Step 6: Uploading delta to Meta — {plan.added} added, {plan.changed} changed, "
+                f"{plan.departed} removed, {plan.unchanged} unchanged"
+            )
+            run_stats["audience"]["mode"] = "delta"
+            if plan.reidentified or plan.departed:
+                removals = audience_delta.removal_rows(db, audience_id, location_id, schema, plan)
+                remove_result = await meta_client.upload_batches(
+                    audience_id, audience_delta.identity_schema(schema), meta_client.batched(removals),
+                    len(plan.reidentified) + plan.departed, creds=creds, method="delete",
+                )
+                audience_delta.delete_members(db, audience_id, plan.departed_ids)
+                run_stats["remove"] = remove_result.get("stats")
+            upload_result = {"num_received": 0}
+            if plan.upsert_ids:
+                rows = audience_delta.record_members(
+                    db, audience_id, schema,
+                    prepared(contact_mirror.iter_contacts_by_ids(db, location_id, plan.upsert_ids)),
+                )
+                upload_result = await meta_client.upload_batches(
+                    audience_id, schema, meta_client.batched(rows), len(plan.upsert_ids), creds=creds,
+                )
+                run_stats["upload"] = upload_result.get("stats")
+            matched = plan.unchanged + upload_result.get("num_received", 0)
 
         # Step 7: Get or create Lookalike Audience
         lookalike_name = f"{audience_name}-LAL-1%"
@@ -140,38 +258,25 @@ async def run_sync(
                 creds=creds,
             )
 
-        # Step 8: Update sync run record
+        # Step 8: Flush the sync_contacts rows queued while streaming and
+        # commit them with the audience store and the run record
+        logger.info("Step 8: Storing contact details...")
+        run_stats["contacts_write"] = writer.close()
         run.status = SyncStatus.SUCCESS
         run.completed_at = datetime.now(timezone.utc)
-        run.contacts_processed = len(contacts)
-        run.contacts_matched = upload_result.get("num_received", 0)
+        run.contacts_processed = len(ltv_values)
+        run.contacts_matched = matched
         run.meta_audience_id = audience["id"]
         run.meta_audience_name = audience["name"]
         run.meta_lookalike_id = lookalike["id"]
         run.meta_lookalike_name = lookalike["name"]
         run.normalization_stats = norm_stats
+        run.run_stats = run_stats
         db.commit()
 
-        # Step 9: Store contact details
-        logger.info("Step 9: Storing contact details...")
-        for contact, raw_ltv, pct in zip(contacts, ltv_values, percentiles):
-            sc = SyncContact(
-                sync_run_id=run.id,
-                ghl_contact_id=contact.get("id", ""),
-                email=contact.get("email"),
-                phone=contact.get("phone"),
-                first_name=contact.get("firstName"),
-                last_name=contact.get("lastName"),
-                raw_ltv=Decimal(str(raw_ltv)),
-                normalized_value=pct,
-                meta_matched=True,
-            )
-            db.add(sc)
-        db.commit()
-
-        # Step 10: Send success email (skipped when scheduler sends combined email)
+        # Step 9: Send success email (skipped when scheduler sends combined email)
         if not skip_email:
-            logger.info("Step 10: Sending success email...")
+            logger.info("Step 9: Sending success email...")
             try:
                 email_service.send_success_email(run)
             except Exception as e:
@@ -181,6 +286,8 @@ async def run_sync(
 
     except Exception as e:
         logger.error(f"Sync run {run.id} failed: {e}", exc_info=True)
+        # Discard uncommitted audience-store and sync_contacts writes
+        db.rollback()
         run.status = SyncStatus.FAILED
         run.error_message = str(e)
         run.completed_at = datetime.now(timezone.utc)
@@ -192,7 +299,64 @@ async def run_sync(
             logger.error(f"Failed to send failure email: {email_err}")
 
     finally:
-        _running_sync_id = None
+        lease.release()
+        with _registry_lock:
+            _running.pop(config_id, None)
+    return run.id
+
+
+def _credential_keys(creds: "AccountCredentials") -> list[str]:
+    """Rate-limit scopes a sync consumes: the GHL location and the Meta ad account."""
+    return sorted({f"ghl:{creds.ghl_location_id}", f"meta:{creds.meta_ad_account_id}"})
+
+
+async def run_syncs(
+    config_ids: list[int],
+    session_factory: Callable[[], Session],
+    skip_email_for: set[int] | None = None,
+    max_concurrency: int | None = None,
+) -> dict[int, int | None]:
+    """
+    Run several accounts' syncs concurrently, each with its own DB session.
+
+    At most `max_concurrency` (SYNC_MAX_CONCURRENCY) syncs run at once, and
+    syncs that share a GHL location or Meta ad account — and therefore a rate
+    limit — run one after another. Returns config_id → SyncRun id (None when a
+    sync could not start).
+    """
+    from services.credential_resolver import resolve
+
+    skip_email_for = skip_email_for or set()
+    slots = asyncio.Semaphore(max(max_concurrency or settings.SYNC_MAX_CONCURRENCY, 1))
+    locks: dict[str, asyncio.Lock] = {}
+    results: dict[int, int | None] = {}
+
+    async def run_one(config_id: int) -> None:
+        db = session_factory()
+        try:
+            config = db.query(SyncConfig).filter(SyncConfig.id == config_id).first()
+            if not config:
+                logger.warning(f"Config {config_id} not found, skipping")
+                return
+            creds = resolve(config.meta_ad_account_id, db)
+            async with AsyncExitStack() as stack:
+                # Fixed (sorted) acquisition order, so overlapping key sets can't deadlock
+                for key in _credential_keys(creds):
+                    await stack.enter_async_context(locks.setdefault(key, asyncio.Lock()))
+                await stack.enter_async_context(slots)
+                results[config_id] = await run_sync(
+                    config_id, db, skip_email=config_id in skip_email_for, creds=creds,
+                )
+        except SyncAlreadyRunning as e:
+            logger.warning(str(e))
+        except Exception as e:
+            logger.error(f"Sync for config {config_id} could not run: {e}", exc_info=True)
+        finally:
+            results.setdefault(config_id, None)
+            db.close()
+
+    await asyncio.gather(*(run_one(cid) for cid in config_ids))
+    return results
 
 
 def _resolve_ltv_field_uuid(custom_fields: list[dict], field_key: str) -> str:
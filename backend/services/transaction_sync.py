@@ -2,273 +2,550 @@
 Stripe transaction history pull and LTV recomputation.
 All Stripe API calls are gated by STRIPE_SECRET_KEY being set.
 """
+import asyncio
+import functools
+import hashlib
 import logging
 import re
+import time
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import text
+from sqlalchemy import case, func, literal_column, text
 from sqlalchemy.orm import Session
 
-from api.ghl_client import get_all_contacts
 from config import settings
-from models import ContactLtv, StripeTransaction
-from services.identity_resolver import match_stripe_to_ghl, normalize_phone
+from models import StripeSyncCursor, StripeTransaction
+from services import job_lease, loop_monitor
+from services.contact_mirror import get_contacts
+from services.identity_resolver import ContactIndex, match_stripe_to_ghl, normalize_phone
 
 logger = logging.getLogger(__name__)
 
 
 # ── LTV recomputation ────────────────────────────────────────────────────────
 
-async def recompute_all_ltv(db: Session) -> int:
-    """
-    Recompute contact_ltv for every GHL contact with at least one matched
-    succeeded transaction. Returns count of contacts updated.
-    """
-    rows = db.execute(text("""
+# One set-based upsert: per-contact totals and a per-product summary from
+# stripe_transactions, names/emails from the local ghl_contacts mirror (the
+# most recently synced copy when a contact is mirrored for several locations).
+RECOMPUTE_LTV_SQL = """
+    WITH matched AS (
         SELECT
             ghl_contact_id,
-            SUM(amount_cents)        AS total_cents,
-            SUM(refunded_amount)     AS total_refund_cents,
-            COUNT(*)                 AS txn_count,
-            MIN(stripe_created_at)   AS first_purchase,
-            MAX(stripe_created_at)   AS last_purchase,
-            json_agg(json_build_object(
-                'name',   product_name,
-                'amount', amount_cents / 100.0,
-                'date',   stripe_created_at
-            )) AS products
+            amount_cents,
+            COALESCE(refunded_amount, 0) AS refunded_amount,
+            stripe_created_at,
+            COALESCE(NULLIF(TRIM(product_name), ''), 'Unknown') AS product
         FROM stripe_transactions
         WHERE ghl_contact_id IS NOT NULL
           AND status = 'succeeded'
+    ),
+    totals AS (
+        SELECT
+            ghl_contact_id,
+            SUM(amount_cents) / 100.0       AS total_revenue,
+            SUM(refunded_amount) / 100.0    AS total_refunds,
+            COUNT(*)                        AS txn_count,
+            MIN(stripe_created_at)          AS first_purchase,
+            MAX(stripe_created_at)          AS last_purchase,
+            COALESCE(DATE_PART('day', MAX(stripe_created_at) - MIN(stripe_created_at)), 0)::int AS days
+        FROM matched
         GROUP BY ghl_contact_id
-    """)).fetchall()
-
-    contacts_map = {c["id"]: c for c in await get_all_contacts()}
-    updated = 0
-
-    for row in rows:
-        ghl_id = row.ghl_contact_id
-        total_rev = (row.total_cents or 0) / 100.0
-        total_refunds = (row.total_refund_cents or 0) / 100.0
-        net = total_rev - total_refunds
-        txn_count = row.txn_count or 0
-        first = row.first_purchase
-        last = row.last_purchase
-        days = (last - first).days if first and last else 0
-        frequency = round((txn_count / max(days, 1)) * 30, 2) if days > 0 else 0.0
-        aov = round(net / txn_count, 2) if txn_count else 0.0
-
-        # Aggregate products
-        product_summary: dict = {}
-        for p in (row.products or []):
-            name = (p.get("name") or "Unknown").strip() or "Unknown"
-            if name not in product_summary:
-                product_summary[name] = {"name": name, "count": 0, "total": 0.0}
-            product_summary[name]["count"] += 1
-            product_summary[name]["total"] += float(p.get("amount") or 0)
-
-        contact = contacts_map.get(ghl_id, {})
-        ghl_name = (
-            f"{contact.get('firstName', '')} {contact.get('lastName', '')}".strip()
-            if contact else ""
-        )
-        ghl_email = contact.get("email", "") if contact else ""
-
-        existing = db.query(ContactLtv).filter_by(ghl_contact_id=ghl_id).first()
-        if existing:
-            existing.ghl_name = ghl_name
-            existing.ghl_email = ghl_email
-            existing.total_revenue = total_rev
-            existing.total_refunds = total_refunds
-            existing.net_revenue = net
-            existing.transaction_count = txn_count
-            existing.first_purchase_at = first
-            existing.last_purchase_at = last
-            existing.avg_order_value = aov
-            existing.products_purchased = list(product_summary.values())
-            existing.days_as_customer = days
-            existing.purchase_frequency = frequency
-            existing.updated_at = datetime.now(timezone.utc)
-        else:
-            db.add(ContactLtv(
-                ghl_contact_id=ghl_id,
-                ghl_name=ghl_name,
-                ghl_email=ghl_email,
-                total_revenue=total_rev,
-                total_refunds=total_refunds,
-                net_revenue=net,
-                transaction_count=txn_count,
-                first_purchase_at=first,
-                last_purchase_at=last,
-                avg_order_value=aov,
-                products_purchased=list(product_summary.values()),
-                days_as_customer=days,
-                purchase_frequency=frequency,
-            ))
+    ),
+    products AS (
+        SELECT
+            ghl_contact_id,
+            json_agg(json_build_object('name', product, 'count', n, 'total', total)
+                     ORDER BY first_seen, product) AS products
+        FROM (
+            SELECT ghl_contact_id, product, COUNT(*) AS n,
+                   SUM(amount_cents) / 100.0 AS total, MIN(stripe_created_at) AS first_seen
+            FROM matched
+            GROUP BY ghl_contact_id, product
+        ) per_product
+        GROUP BY ghl_contact_id
+    ),
+    names AS (
+        SELECT DISTINCT ON (ghl_contact_id) ghl_contact_id, data
+        FROM ghl_contacts
+        WHERE ghl_contact_id IN (SELECT ghl_contact_id FROM totals)
+        ORDER BY ghl_contact_id, synced_at DESC
+    )
+    INSERT INTO contact_ltv (
+        ghl_contact_id, ghl_name, ghl_email,
+        total_revenue, total_refunds, net_revenue, transaction_count,
+        first_purchase_at, last_purchase_at, avg_order_value, products_purchased,
+        days_as_customer, purchase_frequency, updated_at
+    )
+    SELECT
+        t.ghl_contact_id,
+        TRIM(CONCAT_WS(' ', n.data->>'firstName', n.data->>'lastName')),
+        COALESCE(n.data->>'email', ''),
+        t.total_revenue,
+        t.total_refunds,
+        t.total_revenue - t.total_refunds,
+        t.txn_count,
+        t.first_purchase,
+        t.last_purchase,
+        ROUND((t.total_revenue - t.total_refunds) / t.txn_count, 2),
+        p.products,
+        t.days,
+        CASE WHEN t.days > 0 THEN ROUND(t.txn_count::numeric / t.days * 30, 2) ELSE 0 END,
+        NOW() AT TIME ZONE 'UTC'
+    FROM totals t
+    JOIN products p USING (ghl_contact_id)
+    LEFT JOIN names n USING (ghl_contact_id)
+    ON CONFLICT (ghl_contact_id) DO UPDATE SET
+        ghl_name           = EXCLUDED.ghl_name,
+        ghl_email          = EXCLUDED.ghl_email,
+        total_revenue      = EXCLUDED.total_revenue,
+        total_refunds      = EXCLUDED.total_refunds,
+        net_revenue        = EXCLUDED.net_revenue,
+        transaction_count  = EXCLUDED.transaction_count,
+        first_purchase_at  = EXCLUDED.first_purchase_at,
+        last_purchase_at   = EXCLUDED.last_purchase_at,
+        avg_order_value    = EXCLUDED.avg_order_value,
+        products_purchased = EXCLUDED.products_purchased,
+        days_as_customer   = EXCLUDED.days_as_customer,
+        purchase_frequency = EXCLUDED.purchase_frequency,
+        updated_at         = EXCLUDED.updated_at
+"""
 
-        db.commit()
-        updated += 1
 
+async def recompute_all_ltv(db: Session) -> int:
+    """
+    Recompute contact_ltv for every GHL contact with at least one matched
+    succeeded transaction, in a single INSERT ... SELECT ... ON CONFLICT
+    statement. Names and emails come from the ghl_contacts mirror as it
+    stands (no GHL API calls). Returns count of contacts updated.
+    """
+    updated = db.execute(text(RECOMPUTE_LTV_SQL)).rowcount
+    db.commit()
     logger.info(f"LTV recomputed for {updated} contacts")
     return updated
 
 
 # ── Stripe transaction sync ──────────────────────────────────────────────────
 
+PAYMENT_INTENT = "payment_intent"
+CHARGE = "charge"
+EXISTS_CHUNK = 1000
+LIST_PAGE_SIZE = 100
+# Listed payments are matched and stored this many at a time while listing continues
+PIPELINE_CHUNK = 500
+_LISTING_DONE = object()
+
+
+def _stripe_account_key() -> str:
+    return hashlib.sha256(settings.STRIPE_SECRET_KEY.encode()).hexdigest()[:16]
+
+
+def _load_cursors(db: Session) -> dict[str, StripeSyncCursor]:
+    return {
+        c.object_type: c
+        for c in db.query(StripeSyncCursor).filter(StripeSyncCursor.stripe_account == _stripe_account_key())
+    }
+
+
+def _advance_cursor(db: Session, cursors: dict[str, StripeSyncCursor], object_type: str, listing: dict) -> None:
+    """Move the high-water mark forward after a complete listing (never backwards)."""
+    if not listing["complete"] or listing["newest_created"] is None:
+        return
+    newest = datetime.utcfromtimestamp(listing["newest_created"])
+    cursor = cursors.get(object_type)
+    if cursor is None:
+        cursor = StripeSyncCursor(stripe_account=_stripe_account_key(), object_type=object_type)
+        db.add(cursor)
+    elif cursor.last_created_at >= newest:
+        return
+    cursor.last_created_at = newest
+    cursor.last_object_id = listing["newest_id"]
+    cursor.updated_at = datetime.now(timezone.utc)
+    db.commit()
+
+
+def _since_ts(days_back: int | None, cursor: StripeSyncCursor | None) -> int | None:
+    """Lower `created` bound: the cursor minus the overlap, narrowed further by days_back."""
+    bounds = []
+    if days_back:
+        bounds.append(datetime.utcnow() - timedelta(days=days_back))
+    if cursor is not None:
+        bounds.append(cursor.last_created_at - timedelta(hours=settings.STRIPE_SYNC_OVERLAP_HOURS))
+    if not bounds:
+        return None
+    return int(max(bounds).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _succeeded_payment_intent(pi) -> dict | None:
+    return _normalize_payment_intent(pi) if pi.status == "succeeded" else None
+
+
+def _orphan_charge(charge) -> dict | None:
+    # Charges with a PaymentIntent are stored via the intent (this run or an earlier one)
+    if charge.status != "succeeded" or _attr(charge, "payment_intent"):
+        return None
+    return _normalize_charge(charge)
+
+
+def _existing_payment_ids(db: Session, payment_ids: list[str]) -> set[str]:
+    existing: set[str] = set()
+    for i in range(0, len(payment_ids), EXISTS_CHUNK):
+        chunk = payment_ids[i : i + EXISTS_CHUNK]
+        existing.update(
+            pid for (pid,) in db.query(StripeTransaction.stripe_payment_id)
+            .filter(StripeTransaction.stripe_payment_id.in_(chunk))
+        )
+    return existing
+
+
 async def run_transaction_sync(
     db: Session,
     days_back: int | None = None,
     limit: int = 5000,
+    full_resync: bool = False,
 ) -> dict:
     """
-    Pull all Stripe PaymentIntents + orphan Charges, store in stripe_transactions,
-    match each to a GHL contact, then recompute LTV.
-    Requires STRIPE_SECRET_KEY.
+    Pull Stripe PaymentIntents + orphan Charges created since the last
+    complete sync (StripeSyncCursor), limited to the last days_back days if
+    given; without a cursor, or with full_resync, the whole window / history
+    is listed. Both are paged concurrently in worker threads (the Stripe SDK
+    blocks) and fed through a queue to matching and storage, so the event loop
+    stays responsive; stats["max_loop_lag_ms"] reports the worst loop lag seen
+    during the run when the loop monitor is running. New payments are stored
+    in stripe_transactions and matched to GHL contacts, then LTV is recomputed.
+    Requires STRIPE_SECRET_KEY. Skipped while another worker holds the lease.
     """
+    try:
+        with job_lease.lease("transaction_sync"):
+            return await _run_transaction_sync(db, days_back, limit, full_resync)
+    except job_lease.LeaseUnavailable:
+        logger.warning("Transaction sync skipped: already running on another worker")
+        return {"status": "skipped", "reason": "transaction sync already running"}
+
+
+async def _run_transaction_sync(
+    db: Session,
+    days_back: int | None,
+    limit: int,
+    full_resync: bool = False,
+) -> dict:
     if not settings.STRIPE_SECRET_KEY:
         return {"status": "skipped", "reason": "STRIPE_SECRET_KEY not configured"}
 
     import stripe as stripe_lib
     stripe_lib.api_key = settings.STRIPE_SECRET_KEY
 
-    since_ts = None
-    if days_back:
-        since_ts = int((datetime.utcnow() - timedelta(days=days_back)).timestamp())
-
-    # -- Pull PaymentIntents --
-    all_payments: list[dict] = []
-    seen_charge_ids: set[str] = set()
-    params: dict = {"limit": 100}
-    if since_ts:
-        params["created"] = {"gte": since_ts}
-
-    has_more = True
-    starting_after = None
-    while has_more and len(all_payments) < limit:
-        p = dict(params)
-        if starting_after:
-            p["starting_after"] = starting_after
-        batch = stripe_lib.PaymentIntent.list(**p, expand=["data.latest_charge", "data.customer"])
-        for pi in batch.data:
-            if pi.status != "succeeded":
-                continue
-            normalized = _normalize_payment_intent(pi)
-            all_payments.append(normalized)
-            if normalized.get("charge_id"):
-                seen_charge_ids.add(normalized["charge_id"])
-        has_more = batch.has_more
-        if batch.data:
-            starting_after = batch.data[-1].id
-
-    # -- Pull orphan Charges (no linked PaymentIntent) --
-    charge_params: dict = {"limit": 100}
-    if since_ts:
-        charge_params["created"] = {"gte": since_ts}
-    has_more = True
-    starting_after = None
-    while has_more and len(all_payments) < limit:
-        p = dict(charge_params)
-        if starting_after:
-            p["starting_after"] = starting_after
-        batch = stripe_lib.Charge.list(**p)
-        for charge in batch.data:
-            if charge.status != "succeeded":
-                continue
-            if charge.id in seen_charge_ids:
+    cursors = _load_cursors(db)
+    resume = {} if full_resync else cursors
+    listings = {
+        kind: {"newest_created": None, "newest_id": None, "complete": False}
+        for kind in (PAYMENT_INTENT, CHARGE)
+    }
+    started = time.monotonic()
+
+    # -- List PaymentIntents and orphan Charges concurrently, off the event loop --
+    queue: asyncio.Queue = asyncio.Queue()
+    listed = {"count": 0}
+
+    async def list_pages(kind: str, list_page, to_payment) -> None:
+        # Each (blocking) SDK page request runs in a worker thread; both
+        # listers share `listed` so together they stop at `limit`.
+        listing = listings[kind]
+        params: dict = {"limit": LIST_PAGE_SIZE}
+        since_ts = _since_ts(days_back, resume.get(kind))
+        if since_ts:
+            params["created"] = {"gte": since_ts}
+        has_more = True
+        starting_after = None
+        while has_more and listed["count"] < limit:
+            p = dict(params)
+            if starting_after:
+                p["starting_after"] = starting_after
+            batch = await asyncio.to_thread(list_page, **p)
+            for obj in batch.data:
+                if listing["newest_created"] is None or obj.created > listing["newest_created"]:
+                    listing["newest_created"] = obj.created
+                    listing["newest_id"] = obj.id
+                payment = to_payment(obj)
+                if payment is not None:
+                    listed["count"] += 1
+                    queue.put_nowait(payment)
+            has_more = batch.has_more
+            if batch.data:
+                starting_after = batch.data[-1].id
+        listing["complete"] = not has_more
+
+    async def list_all() -> None:
+        listers = [
+            asyncio.create_task(list_pages(
+                PAYMENT_INTENT,
+                functools.partial(
+                    stripe_lib.PaymentIntent.list,
+                    expand=["data.latest_charge", "data.latest_charge.refunds", "data.customer"],
+                ),
+                _succeeded_payment_intent,
+            )),
+            asyncio.create_task(list_pages(
+                CHARGE, functools.partial(stripe_lib.Charge.list, expand=["data.refunds"]), _orphan_charge,
+            )),
+        ]
+        try:
+            await asyncio.gather(*listers)
+        finally:
+            for lister in listers:
+                lister.cancel()
+            queue.put_nowait(_LISTING_DONE)
+
+    # -- Match new payments and upsert, a chunk at a time while listing continues --
+    # Matching and the DB work run in worker threads on their own session, so
+    # storing a chunk doesn't hold the event loop either.
+    contact_index = ContactIndex(await get_contacts(db))
+    stats = {
+        "total": 0, "new": 0, "matched": 0, "refunds_updated": 0, "skipped": 0,
+        "incremental": bool(resume),
+    }
+    store_db = Session(bind=db.get_bind())
+    writer = TransactionUpserter(store_db, set())
+    line_items_fetched: dict[str, list] = {}
+
+    def match_and_add(chunk: list[dict], existing_ids: set[str], line_items_by_session: dict[str, list]) -> None:
+        for payment in chunk:
+            if payment["payment_id"] in existing_ids:
+                # Already stored: the upsert only refreshes its refund columns
+                writer.add(_transaction_row(payment))
                 continue
-            all_payments.append(_normalize_charge(charge))
-        has_more = batch.has_more
-        if batch.data:
-            starting_after = batch.data[-1].id
-
-    # -- Store and match --
-    contacts = await get_all_contacts()
-    stats = {"total": len(all_payments), "new": 0, "matched": 0, "skipped": 0}
-
-    for payment in all_payments:
-        existing = db.query(StripeTransaction).filter_by(
-            stripe_payment_id=payment["payment_id"]
-        ).first()
-        if existing:
-            stats["skipped"] += 1
-            continue
-
-        # Fetch line items for checkout sessions
-        line_items: list = []
-        product_name = None
-        product_id = None
-        price_id = None
-        if payment.get("session_id"):
-            try:
-                items = stripe_lib.checkout.Session.list_line_items(payment["session_id"], limit=10)
-                line_items = [item.to_dict() for item in items.data]
-                if line_items:
-                    first = line_items[0]
-                    product_name = first.get("description", "")
-                    price_data = first.get("price") or {}
-                    if isinstance(price_data, dict):
-                        product_id = price_data.get("product")
-                        price_id = price_data.get("id")
-            except Exception as e:
-                logger.warning(f"Could not fetch line items for {payment['session_id']}: {e}")
-
-        if not product_name:
-            product_name = (
-                (payment.get("metadata") or {}).get("product_name")
-                or payment.get("description")
-                or ""
+            match_result = match_stripe_to_ghl(
+                {
+                    "customer_id": payment.get("customer_id"),
+                    "email": payment.get("email", ""),
+                    "phone": payment.get("phone", ""),
+                    "name": payment.get("name", ""),
+                },
+                contact_index,
+                store_db,
             )
+            if match_result["ghl_contact"]:
+                stats["matched"] += 1
+            line_items = line_items_by_session.get(payment.get("session_id"), [])
+            writer.add(_transaction_row(payment, line_items, match_result))
 
-        match_result = await match_stripe_to_ghl(
-            {
-                "customer_id": payment.get("customer_id"),
-                "email": payment.get("email", ""),
-                "phone": payment.get("phone", ""),
-                "name": payment.get("name", ""),
-            },
-            contacts,
-            db,
+    async def store(chunk: list[dict]) -> None:
+        existing_ids = await asyncio.to_thread(
+            _existing_payment_ids, store_db, [p["payment_id"] for p in chunk],
         )
-        ghl_contact = match_result["ghl_contact"]
-
-        txn = StripeTransaction(
-            stripe_payment_id=payment["payment_id"],
-            stripe_customer_id=payment.get("customer_id"),
-            stripe_session_id=payment.get("session_id"),
-            stripe_invoice_id=payment.get("invoice_id"),
-            customer_email=payment.get("email"),
-            customer_phone=payment.get("phone"),
-            customer_name=payment.get("name"),
-            amount_cents=payment["amount_cents"],
-            currency=payment["currency"],
-            status="succeeded",
-            payment_method=payment.get("payment_method_type"),
-            stripe_created_at=payment["created_at"],
-            line_items=line_items,
-            product_name=product_name or None,
-            product_id=product_id,
-            price_id=price_id,
-            quantity=line_items[0].get("quantity", 1) if line_items else 1,
-            stripe_metadata=payment.get("metadata") or {},
-            ghl_contact_id=ghl_contact.get("id") if ghl_contact else None,
-            match_method=match_result["match_method"],
-            match_status="matched" if ghl_contact else "unmatched",
+        writer.existing_ids |= existing_ids
+        line_items_by_session = await _fetch_line_items(
+            stripe_lib,
+            [p["session_id"] for p in chunk if p.get("session_id") and p["payment_id"] not in existing_ids],
+            line_items_fetched,
         )
-        db.add(txn)
+        await asyncio.to_thread(match_and_add, chunk, existing_ids, line_items_by_session)
+
+    try:
+        listing_task = asyncio.create_task(list_all())
         try:
-            db.commit()
-            stats["new"] += 1
-            if ghl_contact:
-                stats["matched"] += 1
-        except Exception as e:
-            db.rollback()
-            logger.warning(f"Could not store transaction {payment['payment_id']}: {e}")
+            chunk: list[dict] = []
+            while (payment := await queue.get()) is not _LISTING_DONE:
+                stats["total"] += 1
+                chunk.append(payment)
+                if len(chunk) >= PIPELINE_CHUNK:
+                    await store(chunk)
+                    chunk = []
+            if chunk:
+                await store(chunk)
+        finally:
+            listing_task.cancel()
+            [listing_error] = await asyncio.gather(listing_task, return_exceptions=True)
+        await asyncio.to_thread(writer.close)
+    finally:
+        store_db.close()
+    if isinstance(listing_error, Exception):
+        raise listing_error
+
+    if not all(listing["complete"] for listing in listings.values()):
+        logger.warning(f"Transaction sync stopped at limit={limit}; cursor not advanced past unlisted payments")
+
+    stats["new"] = writer.inserted
+    stats["refunds_updated"] = writer.updated
+    stats["skipped"] = len(writer.existing_ids) - writer.updated
+    if writer.failed:
+        stats["failed"] = writer.failed
+    else:
+        for kind, listing in listings.items():
+            _advance_cursor(db, cursors, kind, listing)
+
+    lag = loop_monitor.max_lag_since(started)
+    if lag is not None:
+        stats["max_loop_lag_ms"] = round(lag * 1000, 1)
 
     stats["ltv_updated"] = await recompute_all_ltv(db)
     stats["status"] = "completed"
     return stats
 
 
+# ── Checkout line items ──────────────────────────────────────────────────────
+
+async def _fetch_line_items(stripe_lib, session_ids: list[str], fetched: dict[str, list]) -> dict[str, list]:
+    """
+    Line items per checkout session id, fetched with the (blocking) Stripe
+    SDK in worker threads, STRIPE_LINE_ITEM_CONCURRENCY at a time, so the
+    event loop keeps serving requests. Only new payments need line items, so
+    nothing is read back from stripe_transactions: each session is fetched
+    once per run, and `fetched` (shared by the run's chunks) holds what was
+    already fetched. Failures map to [] and are not kept, so a later chunk
+    tries them again.
+    """
+    wanted = list(dict.fromkeys(session_ids))
+    if not wanted:
+        return {}
+
+    semaphore = asyncio.Semaphore(max(settings.STRIPE_LINE_ITEM_CONCURRENCY, 1))
+
+    async def fetch(session_id: str) -> tuple[str, list] | None:
+        async with semaphore:
+            try:
+                items = await asyncio.to_thread(
+                    stripe_lib.checkout.Session.list_line_items, session_id, limit=10,
+                )
+                return session_id, [item.to_dict() for item in items.data]
+            except Exception as e:
+                logger.warning(f"Could not fetch line items for {session_id}: {e}")
+                return None
+
+    missing = [sid for sid in wanted if sid not in fetched]
+    fetched.update(r for r in await asyncio.gather(*[fetch(sid) for sid in missing]) if r is not None)
+    logger.info(f"Line items: fetched {len(missing)} sessions ({len(wanted) - len(missing)} already fetched this run)")
+    return {sid: fetched.get(sid, []) for sid in wanted}
+
+
+# ── Transaction storage ──────────────────────────────────────────────────────
+
+UPSERT_CHUNK = 1000
+
+
+def _transaction_row(payment: dict, line_items: list | None = None, match_result: dict | None = None) -> dict:
+    """stripe_transactions column values for a normalized payment."""
+    line_items = line_items or []
+    product_name = product_id = price_id = None
+    if line_items:
+        first = line_items[0]
+        product_name = first.get("description", "")
+        price_data = first.get("price") or {}
+        if isinstance(price_data, dict):
+            product_id = price_data.get("product")
+            price_id = price_data.get("id")
+    if not product_name:
+        product_name = (
+            (payment.get("metadata") or {}).get("product_name")
+            or payment.get("description")
+            or ""
+        )
+
+    ghl_contact = (match_result or {}).get("ghl_contact")
+    refunded = payment.get("refunded_amount") or 0
+    return {
+        "stripe_payment_id": payment["payment_id"],
+        "stripe_customer_id": payment.get("customer_id"),
+        "stripe_session_id": payment.get("session_id"),
+        "stripe_invoice_id": payment.get("invoice_id"),
+        "customer_email": payment.get("email"),
+        "customer_phone": payment.get("phone"),
+        "customer_name": payment.get("name"),
+        "amount_cents": payment["amount_cents"],
+        "currency": payment["currency"],
+        "status": "succeeded",
+        "payment_method": payment.get("payment_method_type"),
+        "stripe_created_at": payment["created_at"],
+        "line_items": line_items,
+        "product_name": product_name or None,
+        "product_id": product_id,
+        "price_id": price_id,
+        "quantity": line_items[0].get("quantity", 1) if line_items else 1,
+        "stripe_metadata": payment.get("metadata") or {},
+        "ghl_contact_id": ghl_contact.get("id") if ghl_contact else None,
+        "match_method": (match_result or {}).get("match_method"),
+        "match_status": "matched" if ghl_contact else "unmatched",
+        "refunded_amount": refunded,
+        "refund_date": payment.get("refund_date") if refunded else None,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+class TransactionUpserter:
+    """
+    Buffers stripe_transactions rows and writes them UPSERT_CHUNK at a time
+    with INSERT ... ON CONFLICT (stripe_payment_id) DO UPDATE ... RETURNING.
+    New payments are inserted; for payments already stored only the refund
+    columns are updated, and only when the refunded amount changed. Commits
+    per chunk; a failed chunk is rolled back, logged and counted.
+    """
+
+    def __init__(self, db: Session, existing_ids: set[str]):
+        self.db = db
+        self.existing_ids = existing_ids
+        self.postgres = db.get_bind().dialect.name == "postgresql"
+        self.buffer: list[dict] = []
+        self.seen: set[str] = set()
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+
+    def add(self, row: dict) -> None:
+        # A row may appear only once per statement (ON CONFLICT can't touch it twice)
+        if row["stripe_payment_id"] in self.seen:
+            return
+        self.seen.add(row["stripe_payment_id"])
+        self.buffer.append(row)
+        if len(self.buffer) >= UPSERT_CHUNK:
+            self.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _statement(self, rows: list[dict]):
+        if self.postgres:
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = StripeTransaction.__table__
+        stmt = insert(table).values(rows)
+        refund_grew = stmt.excluded.refunded_amount > func.coalesce(table.c.refunded_amount, 0)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["stripe_payment_id"],
+            set_={
+                "refunded_amount": stmt.excluded.refunded_amount,
+                "refund_date": case(
+                    (refund_grew, func.coalesce(stmt.excluded.refund_date, table.c.refund_date)),
+                    else_=table.c.refund_date,
+                ),
+                "updated_at": stmt.excluded.updated_at,
+            },
+            where=func.coalesce(table.c.refunded_amount, 0) != stmt.excluded.refunded_amount,
+        )
+        # xmax = 0 marks a freshly inserted row; other dialects fall back to the pre-check
+        inserted = literal_column("(xmax = 0)") if self.postgres else literal_column("NULL")
+        return stmt.returning(table.c.stripe_payment_id, inserted)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        try:
+            returned = self.db.execute(self._statement(rows)).fetchall()
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            self.failed += len(rows)
+            logger.warning(f"Could not store {len(rows)} transactions: {e}")
+            return
+        for payment_id, inserted in returned:
+            if inserted is None:
+                inserted = payment_id not in self.existing_ids
+            if inserted:
+                self.inserted += 1
+            else:
+                self.updated += 1
+
+
 # ── CAPI backfill (send historical conversions to Meta) ──────────────────────
 
 async def run_capi_backfill(
@@ -283,8 +560,24 @@ async def run_capi_backfill(
     - Events ≤7 days old:  action_source="website"
     - Events 8–90 days:    action_source="physical_store" (Meta offline signals)
     - Events >90 days:     skipped (Meta hard limit)
-    Requires META_CAPI_DATASET_ID + META_CAPI_ACCESS_TOKEN.
+    Requires META_CAPI_DATASET_ID + META_CAPI_ACCESS_TOKEN. Skipped while
+    another worker holds the lease.
     """
+    try:
+        with job_lease.lease("capi_backfill"):
+            return await _run_capi_backfill(db, days_back, limit, dry_run, retry_failed)
+    except job_lease.LeaseUnavailable:
+        logger.warning("CAPI backfill skipped: already running on another worker")
+        return {"status": "skipped", "reason": "CAPI backfill already running"}
+
+
+async def _run_capi_backfill(
+    db: Session,
+    days_back: int,
+    limit: int,
+    dry_run: bool,
+    retry_failed: bool,
+) -> dict:
     from services.conversion_tracker import build_capi_event, extract_ghl_attribution, send_to_meta_capi
     from models import MatchedConversion
 
@@ -308,7 +601,7 @@ async def run_capi_backfill(
         .all()
     )
 
-    contacts = await get_all_contacts()
+    contacts = await get_contacts(db)
     contacts_map = {c["id"]: c for c in contacts}
 
     stats = {"total": len(txns), "sent": 0, "failed": 0, "skipped": 0, "too_old": 0, "dry_run": dry_run}
@@ -426,6 +719,13 @@ def _attr(obj, key, default=None):
     return getattr(obj, key, default)
 
 
+def _refund_date(charge) -> datetime | None:
+    """When the charge's latest refund was created; None if refunds weren't expanded."""
+    refunds = _attr(_attr(charge, "refunds"), "data") or []
+    created = [r_created for r in refunds if (r_created := _attr(r, "created"))]
+    return datetime.utcfromtimestamp(max(created)) if created else None
+
+
 def _normalize_payment_intent(pi) -> dict:
     charge = _attr(pi, "latest_charge")
     if isinstance(charge, str):
@@ -469,6 +769,8 @@ def _normalize_payment_intent(pi) -> dict:
         "created_at": datetime.utcfromtimestamp(_attr(pi, "created")),
         "metadata": metadata,
         "description": _attr(pi, "description") or "",
+        "refunded_amount": _attr(charge, "amount_refunded") or 0,
+        "refund_date": _refund_date(charge),
     }
 
 
@@ -493,4 +795,6 @@ def _normalize_charge(charge) -> dict:
         "created_at": datetime.utcfromtimestamp(charge.created),
         "metadata": {k: v for k, v in charge.metadata.items()} if charge.metadata else {},
         "description": charge.description or "",
+        "refunded_amount": _attr(charge, "amount_refunded") or 0,
+        "refund_date": _refund_date(charge),
     }
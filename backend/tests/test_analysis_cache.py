@@ -0,0 +1,89 @@
+"""Tests for the content-addressed audit analysis cache."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from config import settings
+from models import LlmAnalysisCache
+from services import analysis_cache
+
+
+@pytest.fixture
+def cache_db(monkeypatch):
+    # Lookups and writes run in a worker thread; share the one in-memory connection
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    LlmAnalysisCache.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(analysis_cache, "SessionLocal", Session)
+    monkeypatch.setattr(settings, "LLM_ANALYSIS_CACHE_TTL_HOURS", 24)
+    return Session
+
+
+def _model(calls: list, result: dict):
+    async def analyze():
+        calls.append(1)
+        return result
+    return analyze
+
+
+def _run(analyze, payload="{}", bypass=False, model="m"):
+    return asyncio.run(analysis_cache.cached_analysis(model, "system", payload, analyze, bypass=bypass))
+
+
+class TestAnalysisCache:
+    def test_identical_request_is_served_from_cache(self, cache_db):
+        calls = []
+        assert _run(_model(calls, {"summary": "a"})) == {"summary": "a"}
+        assert _run(_model(calls, {"summary": "b"})) == {"summary": "a"}
+        assert len(calls) == 1
+
+    def test_key_covers_model_prompt_and_payload(self):
+        key = analysis_cache.cache_key("m", "system", "{}")
+        assert key != analysis_cache.cache_key("other", "system", "{}")
+        assert key != analysis_cache.cache_key("m", "system2", "{}")
+        assert key != analysis_cache.cache_key("m", "system", '{"a": 1}')
+
+    def test_bypass_calls_model_and_refreshes_entry(self, cache_db):
+        calls = []
+        _run(_model(calls, {"summary": "a"}))
+        assert _run(_model(calls, {"summary": "b"}), bypass=True) == {"summary": "b"}
+        assert _run(_model(calls, {"summary": "c"})) == {"summary": "b"}
+        assert len(calls) == 2
+
+    def test_errors_are_not_cached(self, cache_db):
+        calls = []
+        _run(_model(calls, {"error": "timeout"}))
+        assert _run(_model(calls, {"summary": "ok"})) == {"summary": "ok"}
+        assert len(calls) == 2
+
+    def test_expired_entry_is_ignored(self, cache_db):
+        calls = []
+        _run(_model(calls, {"summary": "old"}))
+        db = cache_db()
+        db.query(LlmAnalysisCache).update({"created_at": datetime.now(timezone.utc) - timedelta(hours=25)})
+        db.commit()
+        db.close()
+        assert _run(_model(calls, {"summary": "new"})) == {"summary": "new"}
+        assert len(calls) == 2
+
+    def test_unavailable_cache_falls_through_to_model(self, monkeypatch):
+        class _BrokenSession:
+            def query(self, *args):
+                raise OperationalError("SELECT", {}, Exception("connection refused"))
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr(analysis_cache, "SessionLocal", _BrokenSession)
+        monkeypatch.setattr(settings, "LLM_ANALYSIS_CACHE_TTL_HOURS", 24)
+        calls = []
+        assert _run(_model(calls, {"summary": "a"})) == {"summary": "a"}
+        assert len(calls) == 1
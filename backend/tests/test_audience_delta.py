@@ -0,0 +1,103 @@
+"""Tests for Custom Audience delta planning."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import AudienceMember, GhlContact, SyncConfig
+from services import audience_delta, contact_mirror
+from services.audience_delta import _digest, identity_row
+
+SCHEMA = ["EMAIL", "PHONE", "LOOKALIKE_VALUE"]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    AudienceMember.__table__.create(engine)
+    GhlContact.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _store(db, rows: dict[str, list], audience_id: str = "aud"):
+    for cid, row in rows.items():
+        db.add(AudienceMember(
+            audience_id=audience_id, ghl_contact_id=cid, row=row,
+            fingerprint=_digest(row), identity_hash=_digest(identity_row(SCHEMA, row)),
+        ))
+    db.commit()
+
+
+def _mirror(db, contacts: list[dict]):
+    for c in contacts:
+        db.add(GhlContact(location_id="loc", ghl_contact_id=c["id"], data=c))
+    db.commit()
+
+
+class TestPlanDelta:
+    def test_classifies_adds_changes_removals(self, db):
+        _store(db, {
+            "same": ["e1", "p1", 10],
+            "value": ["e2", "p2", 20],
+            "ident": ["e3", "p3", 30],
+            "gone": ["e4", "p4", 40],
+            "blank": ["e6", "p6", 60],
+        })
+        _mirror(db, [
+            {"id": "same", "email": "x"}, {"id": "value", "phone": "y"}, {"id": "ident", "email": "z"},
+            {"id": "new", "email": "w"}, {"id": "blank", "email": "", "phone": None},
+        ])
+        plan = audience_delta.plan_delta(db, "aud", "loc", SCHEMA, [
+            ("same", ["e1", "p1", 10]),
+            ("value", ["e2", "p2", 25]),
+            ("ident", ["e3-new", "p3", 30]),
+            ("new", ["e5", "p5", 50]),
+        ])
+        assert plan.summary() == {"stored": 5, "added": 1, "changed": 2, "removed": 2, "unchanged": 1}
+        assert plan.upsert_ids == ["value", "ident", "new"]
+        # Value-only changes are just re-uploaded; superseded identifiers are removed first
+        assert plan.reidentified == [["e3", "p3"]]
+
+        removals = list(audience_delta.removal_rows(db, "aud", "loc", SCHEMA, plan))
+        assert sorted(removals) == [["e3", "p3"], ["e4", "p4"], ["e6", "p6"]]
+        assert sorted(plan.departed_ids) == ["blank", "gone"]
+
+    def test_other_audiences_ignored(self, db):
+        _store(db, {"x": ["e", "p", 1]}, audience_id="other")
+        plan = audience_delta.plan_delta(db, "aud", "loc", SCHEMA, [("a", ["e", "p", 1]), ("", [])])
+        assert plan.stored == 0 and plan.added == 1 and plan.departed == 0
+
+
+class TestIdentifiable:
+    def test_matches_python_filter(self, db):
+        contacts = [
+            {"id": "a", "email": "a@x.com"}, {"id": "b", "phone": "555"}, {"id": "c", "email": "", "phone": ""},
+            {"id": "d"}, {"id": "e", "email": None, "phone": " "},
+        ]
+        _mirror(db, contacts)
+        streamed = [c["id"] for c in contact_mirror.iter_contacts(db, "loc", identifiable_only=True, batch_size=2)]
+        assert streamed == [c["id"] for c in contacts if c.get("email") or c.get("phone")]
+        assert contact_mirror.count_contacts(db, "loc", identifiable_only=True) == 3
+
+
+class TestFullRefreshReason:
+    def _plan(self, upserts=0):
+        return audience_delta.DeltaPlan(stored=100, upsert_ids=["c"] * upserts)
+
+    def test_full_when_nothing_stored(self):
+        config = SyncConfig(last_full_sync_at=datetime.now(timezone.utc))
+        assert audience_delta.full_refresh_reason(config, 0, 100)
+
+    def test_full_when_refresh_overdue(self):
+        stale = (datetime.now(timezone.utc) - timedelta(days=30)).replace(tzinfo=None)
+        assert audience_delta.full_refresh_reason(SyncConfig(last_full_sync_at=stale), 100, 100)
+        assert audience_delta.full_refresh_reason(SyncConfig(last_full_sync_at=None), 100, 100)
+
+    def test_delta_when_recent_and_small(self):
+        config = SyncConfig(last_full_sync_at=datetime.now(timezone.utc))
+        assert audience_delta.full_refresh_reason(config, 100, 100) is None
+        assert audience_delta.full_refresh_reason(config, 100, 100, self._plan(upserts=5)) is None
+        assert audience_delta.full_refresh_reason(config, 100, 100, self._plan(upserts=80))
@@ -0,0 +1,46 @@
+"""Tests for the chunked sync_contacts bulk writer."""
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import SyncContact
+from services import bulk_writer
+from services.bulk_writer import _csv_field
+
+
+class TestCsvField:
+    def test_null_is_unquoted_empty_and_strings_quoted(self):
+        assert _csv_field(None) == ""
+        assert _csv_field("") == '""'
+        assert _csv_field('say "hi", ok') == '"say ""hi"", ok"'
+
+    def test_scalars(self):
+        assert _csv_field(True) == "t"
+        assert _csv_field(7) == "7"
+        assert _csv_field(Decimal("12.50")) == "12.50"
+        assert _csv_field(datetime(2024, 1, 2, 3, 4, 5)) == "2024-01-02T03:04:05"
+
+
+class TestSyncContactWriter:
+    def test_writes_all_rows_in_chunks(self, monkeypatch):
+        monkeypatch.setattr(bulk_writer, "CHUNK_SIZE", 3)
+        engine = create_engine("sqlite://")
+        SyncContact.__table__.create(engine)
+        db = sessionmaker(bind=engine)()
+
+        writer = bulk_writer.SyncContactWriter(db, 42)
+        for i in range(10):
+            writer.add({"ghl_contact_id": f"c{i}", "email": None if i % 2 else f"u{i}@x.com",
+                        "raw_ltv": Decimal(i), "normalized_value": i, "meta_matched": True})
+        assert writer.rows == 9  # three full chunks flushed, one row buffered
+        stats = writer.close()
+        db.commit()
+
+        assert stats["rows"] == 10 and stats["method"] == "insert"
+        stored = db.query(SyncContact).order_by(SyncContact.id).all()
+        assert [s.ghl_contact_id for s in stored] == [f"c{i}" for i in range(10)]
+        assert {s.sync_run_id for s in stored} == {42}
+        assert stored[1].email is None and stored[2].email == "u2@x.com"
+        db.close()
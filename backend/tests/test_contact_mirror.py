@@ -0,0 +1,145 @@
+"""Tests for the GHL contact mirror: full refresh, the paginated pull behind it and name matching."""
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api import ghl_client
+from config import settings
+from models import GhlContact, GhlContactSyncState
+from services import contact_mirror
+from services.identity_resolver import match_by_name_fuzzy
+
+LOCATION = "test-location-id"
+
+
+def _contacts(start, n):
+    return [{"id": f"c{i}", "email": f"c{i}@example.com"} for i in range(start, start + n)]
+
+
+def _pages(monkeypatch, pages):
+    """Serve /contacts/ pages in order, regardless of the cursor sent."""
+    served = iter(pages)
+
+    async def request(_client, _method, _url, creds=None, **kwargs):
+        return httpx.Response(200, json=next(served))
+
+    monkeypatch.setattr(ghl_client, "_request_with_retry", request)
+
+
+class TestGetAllContacts:
+    def test_pagination_loop_raises_when_strict(self, monkeypatch):
+        page = {"contacts": _contacts(0, 100), "meta": {"startAfterId": "c99"}}
+        _pages(monkeypatch, [page, page])
+        with pytest.raises(ghl_client.GhlPaginationError):
+            asyncio.run(ghl_client.get_all_contacts(raise_on_error=True))
+
+    def test_pagination_loop_returns_partial_by_default(self, monkeypatch):
+        page = {"contacts": _contacts(0, 100), "meta": {"startAfterId": "c99"}}
+        _pages(monkeypatch, [page, page])
+        assert len(asyncio.run(ghl_client.get_all_contacts())) == 100
+
+    def test_missing_cursor_raises_when_strict(self, monkeypatch):
+        page = {"contacts": _contacts(0, 99) + [{"email": "no-id@example.com"}], "meta": {}}
+        _pages(monkeypatch, [page])
+        with pytest.raises(ghl_client.GhlPaginationError):
+            asyncio.run(ghl_client.get_all_contacts(raise_on_error=True))
+
+
+@pytest.fixture
+def mirror_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    for table in (GhlContact.__table__, GhlContactSyncState.__table__):
+        table.create(engine)
+    db = sessionmaker(bind=engine)()
+    old = datetime(2024, 1, 1)
+    db.add_all(
+        GhlContact(location_id=LOCATION, ghl_contact_id=c["id"], data=c, synced_at=old)
+        for c in _contacts(0, 100)
+    )
+    db.add(GhlContactSyncState(location_id=LOCATION, contact_count=100))
+    db.commit()
+
+    def upsert(db_, location_id, contacts):
+        # The real upsert is Postgres-only; stamping synced_at is what refresh relies on
+        now = contact_mirror._utcnow()
+        ids = [c["id"] for c in contacts]
+        db_.query(GhlContact).filter(GhlContact.ghl_contact_id.in_(ids)).update(
+            {"synced_at": now}, synchronize_session=False,
+        )
+        db_.commit()
+        return len(ids)
+
+    monkeypatch.setattr(contact_mirror, "upsert_contacts", upsert)
+    monkeypatch.setattr(settings, "GHL_MIRROR_MAX_DELETE_FRACTION", 0.2)
+    yield db
+    db.close()
+
+
+def _full_refresh(db, monkeypatch, contacts):
+    async def pull(creds=None, raise_on_error=False):
+        assert raise_on_error
+        return contacts
+
+    monkeypatch.setattr(ghl_client, "get_all_contacts", pull)
+    return asyncio.run(contact_mirror.refresh_contacts(db, full=True))
+
+
+class TestFullRefresh:
+    def test_truncated_pull_keeps_mirror(self, mirror_db, monkeypatch):
+        stats = _full_refresh(mirror_db, monkeypatch, _contacts(0, 10))
+        assert (stats["deleted"], stats["delete_skipped"]) == (0, 90)
+        assert mirror_db.query(GhlContact).count() == 100
+        assert mirror_db.query(GhlContactSyncState).one().contact_count == 100
+
+    def test_plausible_removals_are_deleted(self, mirror_db, monkeypatch):
+        stats = _full_refresh(mirror_db, monkeypatch, _contacts(0, 95))
+        assert (stats["deleted"], stats["delete_skipped"]) == (5, 0)
+        assert mirror_db.query(GhlContact).count() == 95
+
+    def test_failed_pull_deletes_nothing(self, mirror_db, monkeypatch):
+        async def pull(creds=None, raise_on_error=False):
+            raise ghl_client.GhlPaginationError("Pagination loop after 10 contacts")
+
+        monkeypatch.setattr(ghl_client, "get_all_contacts", pull)
+        with pytest.raises(ghl_client.GhlPaginationError):
+            asyncio.run(contact_mirror.refresh_contacts(mirror_db, full=True))
+        assert mirror_db.query(GhlContact).count() == 100
+
+
+class TestNameCandidates:
+    @pytest.fixture
+    def names_db(self):
+        engine = create_engine("sqlite://")
+        GhlContact.__table__.create(engine)
+        db = sessionmaker(bind=engine)()
+        people = [("John", "Smith"), ("Maria Luisa", "Garcia"), ("Ann", "Lee"), ("Bob", "Stone")]
+        db.add_all(
+            GhlContact(location_id=LOCATION, ghl_contact_id=f"c{i}", first_name=first.lower(),
+                       last_name=last.lower(), data={"id": f"c{i}", "firstName": first, "lastName": last})
+            for i, (first, last) in enumerate(people)
+        )
+        db.commit()
+        yield db
+        db.close()
+
+    def _ids(self, db, name, **kw):
+        return [c["id"] for c in contact_mirror.find_name_candidates(db, LOCATION, name, **kw)]
+
+    def test_block_keeps_typos_reordered_and_multi_word_names(self, names_db):
+        assert self._ids(names_db, "Jon Smith") == ["c0"]
+        assert self._ids(names_db, "Garcia Maria") == ["c1"]
+        contact, score, _ = match_by_name_fuzzy("Jon Smith", contact_mirror.find_name_candidates(
+            names_db, LOCATION, "Jon Smith"), 82)
+        assert contact["id"] == "c0" and score >= 82
+
+    def test_limit_keeps_shared_token_contacts_first(self, names_db, caplog):
+        with caplog.at_level("WARNING", logger="services.contact_mirror"):
+            assert self._ids(names_db, "Bob Smythe", limit=1) == ["c3"]  # "sm" also matches Smith
+        assert any("capped at 1" in r.getMessage() for r in caplog.records)
+
+    def test_no_usable_tokens(self, names_db):
+        assert self._ids(names_db, "J") == []
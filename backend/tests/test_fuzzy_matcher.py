@@ -0,0 +1,78 @@
+"""Tests for the blocked, vectorized FuzzyNameMatcher."""
+import random
+
+from services import fuzzy_matcher
+from services.fuzzy_matcher import FuzzyNameMatcher, soundex
+from services.identity_resolver import _fuzzy_name_score
+
+FIRST = ["John", "Jon", "Maria", "Mariah", "Chris", "Christopher", "Ann", "Anne", "José", "Li"]
+LAST = ["Smith", "Smyth", "Garcia", "O'Neil", "Oneil", "Nguyen", "Lee", "Van Der Berg", ""]
+
+
+def _contacts(n: int = 300, seed: int = 3) -> list[dict]:
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(n):
+        c = {"id": f"c{i}", "firstName": rng.choice(FIRST), "lastName": rng.choice(LAST)}
+        if i % 7 == 0:
+            c["contactName"] = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+        if i % 11 == 0:
+            c = {"id": f"c{i}", "name": rng.choice(FIRST)}
+        contacts.append(c)
+    return contacts
+
+
+def _linear(name: str, contacts: list[dict], threshold: int):
+    """The pre-vectorization linear scan, kept as the reference result."""
+    candidates = []
+    for c in contacts:
+        full = f"{(c.get('firstName') or '').strip()} {(c.get('lastName') or '').strip()}".strip()
+        name_field = (c.get("contactName") or c.get("name") or "").strip()
+        score = max(
+            _fuzzy_name_score(name, full) if full else 0,
+            _fuzzy_name_score(name, name_field) if name_field else 0,
+        )
+        if score >= 50:
+            candidates.append({"contact": c, "score": score, "ghl_name": full or name_field})
+    candidates.sort(key=lambda x: x["score"], reverse=True)
+    top_3 = [{"id": c["contact"]["id"], "name": c["ghl_name"], "score": c["score"]} for c in candidates[:3]]
+    if candidates and candidates[0]["score"] >= threshold:
+        return candidates[0]["contact"], candidates[0]["score"], top_3
+    return None, 0, top_3
+
+
+QUERIES = ["john smith", "Jon Smyth", "SMITH JOHN", "maria", "Chris O'Neil", "josé garcia",
+           "Anne Van der Berg", "li", "Zed Unknown", "  Christopher  Nguyen "]
+
+
+class TestFuzzyNameMatcher:
+    def test_matches_linear_scorer_exactly(self):
+        contacts = _contacts()
+        matcher = FuzzyNameMatcher(contacts)
+        for q in QUERIES:
+            assert matcher.match(q, 82) == _linear(q, contacts, 82), q
+
+    def test_threshold_controls_best_match_not_candidates(self):
+        contacts = [{"id": "a", "firstName": "Jonathan", "lastName": "Smithers"}]
+        matcher = FuzzyNameMatcher(contacts)
+        best, score, top = matcher.match("Jon Smith", threshold=99)
+        assert best is None and score == 0
+        assert top and top[0]["id"] == "a"
+
+    def test_blocking_still_finds_typos(self, monkeypatch):
+        monkeypatch.setattr(fuzzy_matcher, "FULL_SCAN_LIMIT", 0)
+        contacts = _contacts(2000, seed=9)
+        contacts.append({"id": "target", "firstName": "Bartholomew", "lastName": "Kowalczyk"})
+        matcher = FuzzyNameMatcher(contacts)
+        best, score, _ = matcher.match("Bartholomew Kowalcyzk", 82)
+        assert best["id"] == "target" and score >= 82
+        assert len(matcher.candidates("Bartholomew Kowalcyzk")) < len(matcher)
+
+    def test_empty_inputs(self):
+        assert FuzzyNameMatcher([]).match("john", 82) == (None, 0, [])
+        assert FuzzyNameMatcher(_contacts(5)).match("", 82) == (None, 0, [])
+
+    def test_soundex(self):
+        assert soundex("robert") == soundex("rupert") == "R163"
+        assert soundex("ashcraft") == "A261"
+        assert soundex("123") == ""
@@ -0,0 +1,45 @@
+"""Tests for the ContactIndex used by the Stripe → GHL match cascade."""
+from services.identity_resolver import ContactIndex, match_by_email, match_by_phone
+
+CONTACTS = [
+    {"id": "c1", "email": "Alice@Example.com", "phone": "+1 (555) 111-2222"},
+    {"id": "c2", "email": "bob@example.com", "additionalEmails": ["alice@example.com"],
+     "phone": "5553334444"},
+    {"id": "c3", "email": "", "additionalEmails": ["carol@alt.com", None],
+     "additionalPhones": ["1-555-111-2222", "555.999.0000"]},
+    {"id": "c4", "email": None, "phone": "12"},
+]
+
+
+class TestContactIndex:
+    def test_lookup_by_id(self):
+        index = ContactIndex(CONTACTS)
+        assert index.get("c3")["id"] == "c3"
+        assert index.get("missing") is None
+        assert index.get(None) is None
+
+    def test_email_is_case_and_whitespace_insensitive(self):
+        index = ContactIndex(CONTACTS)
+        assert index.match_email("  ALICE@example.COM ")["id"] == "c1"
+
+    def test_additional_email_matches(self):
+        index = ContactIndex(CONTACTS)
+        assert index.match_email("carol@alt.com")["id"] == "c3"
+
+    def test_phone_normalized_on_both_sides(self):
+        index = ContactIndex(CONTACTS)
+        assert index.match_phone("555-333-4444")["id"] == "c2"
+        assert index.match_phone("+15559990000")["id"] == "c3"
+
+    def test_short_or_empty_keys_never_match(self):
+        index = ContactIndex(CONTACTS)
+        assert index.match_phone("12") is None
+        assert index.match_email("") is None
+
+    def test_first_contact_in_list_order_wins(self):
+        """Same winner as the linear scans when a key appears on several contacts."""
+        index = ContactIndex(CONTACTS)
+        for email in ("alice@example.com", "bob@example.com", "carol@alt.com", "nobody@x.com"):
+            assert index.match_email(email) is match_by_email(email, CONTACTS)
+        for phone in ("5551112222", "5553334444", "5559990000", "5550000000"):
+            assert index.match_phone(phone) is match_by_phone(phone, CONTACTS)
@@ -0,0 +1,141 @@
+"""Tests for the Postgres job queue's claim / retry / stale-recovery bookkeeping."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Job, JobStatus
+from services import job_queue
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Job.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _job(db, **kw) -> Job:
+    kw.setdefault("status", JobStatus.QUEUED.value)
+    job = Job(job_type="sync", payload={"config_id": 1},
+              run_after=datetime.now(timezone.utc) - timedelta(seconds=1), **kw)
+    db.add(job)
+    db.commit()
+    return job
+
+
+class TestClaim:
+    def test_claims_oldest_runnable(self, db):
+        first = _job(db)
+        _job(db)
+        _job(db, status=JobStatus.RUNNING.value)
+        claimed = job_queue.claim(db, "w1")
+        assert claimed.id == first.id
+        assert claimed.status == JobStatus.RUNNING.value
+        assert claimed.attempts == 1 and claimed.locked_by == "w1"
+
+    def test_skips_future_jobs(self, db):
+        _job(db).run_after = datetime.now(timezone.utc) + timedelta(hours=1)
+        db.commit()
+        assert job_queue.claim(db, "w1") is None
+
+
+class TestFinish:
+    def test_success(self, db):
+        _job(db)
+        job = job_queue.claim(db, "w1")
+        assert job_queue._finish(db, job.id, "w1", 1, result={"ok": True})
+        assert job.status == JobStatus.SUCCEEDED.value and job.result == {"ok": True}
+        assert job.locked_by is None and job.finished_at
+
+    def test_failure_retries_until_out_of_attempts(self, db):
+        _job(db, max_attempts=2)
+        job = job_queue.claim(db, "w1")
+        job_queue._finish(db, job.id, "w1", 1, error="boom")
+        assert job.status == JobStatus.QUEUED.value and job.error == "boom"
+        assert job.run_after.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+
+        job.run_after = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+        job = job_queue.claim(db, "w1")
+        assert job.attempts == 2
+        job_queue._finish(db, job.id, "w1", 2, error="boom again")
+        assert job.status == JobStatus.FAILED.value
+
+
+class TestRequeueStale:
+    def test_requeues_or_fails_dead_jobs(self, db):
+        old = datetime.now(timezone.utc) - timedelta(hours=1)
+        retryable = _job(db, status=JobStatus.RUNNING.value, attempts=1, max_attempts=3, heartbeat_at=old)
+        exhausted = _job(db, status=JobStatus.RUNNING.value, attempts=1, heartbeat_at=old)
+        alive = _job(db, status=JobStatus.RUNNING.value, attempts=1, heartbeat_at=datetime.now(timezone.utc))
+        assert job_queue.requeue_stale(db) == 2
+        assert retryable.status == JobStatus.QUEUED.value
+        assert exhausted.status == JobStatus.FAILED.value
+        assert alive.status == JobStatus.RUNNING.value
+
+    def test_late_finish_after_stale_requeue_is_dropped(self, db):
+        _job(db, max_attempts=2)
+        job = job_queue.claim(db, "w1")
+        job.heartbeat_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.commit()
+        assert job_queue.requeue_stale(db) == 1
+        job = job_queue.claim(db, "w2")
+        assert job.attempts == 2
+
+        # The original run finally returns: its outcome must not touch w2's attempt
+        assert not job_queue._finish(db, job.id, "w1", 1, result={"late": True})
+        assert not job_queue.heartbeat(db, job.id, "w1", 1)
+        assert job.status == JobStatus.RUNNING.value and job.locked_by == "w2" and job.result is None
+
+        assert job_queue._finish(db, job.id, "w2", 2, result={"ok": True})
+        assert job.status == JobStatus.SUCCEEDED.value
+
+    def test_late_finish_does_not_revive_failed_job(self, db):
+        _job(db)
+        job = job_queue.claim(db, "w1")
+        job.heartbeat_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.commit()
+        job_queue.requeue_stale(db)
+        assert not job_queue._finish(db, job.id, "w1", 1, result={"late": True})
+        assert job.status == JobStatus.FAILED.value and job.error == "Worker stopped responding"
+
+
+class TestHeartbeat:
+    def test_heartbeats_while_event_loop_is_blocked(self, monkeypatch):
+        engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        Job.__table__.create(engine)
+        Session = sessionmaker(bind=engine)
+        monkeypatch.setattr(job_queue, "SessionLocal", Session)
+        db = Session()
+        _job(db)
+        job = job_queue.claim(db, "w1")
+        job.heartbeat_at = started = datetime(2024, 1, 1)
+        db.commit()
+
+        async def blocking_handler(_db, _payload):
+            time.sleep(0.3)  # holds the event loop, like a long sync SQLAlchemy stretch
+            return {"ok": True}
+
+        monkeypatch.setattr(job_queue, "HEARTBEAT_SECONDS", 0.05)
+        monkeypatch.setitem(job_queue.HANDLERS, "sync", blocking_handler)
+        beats = []
+        real_heartbeat = job_queue.heartbeat
+
+        def recording_heartbeat(session, *args):
+            beats.append(session.get(Job, args[0]).heartbeat_at)
+            return real_heartbeat(session, *args)
+
+        monkeypatch.setattr(job_queue, "heartbeat", recording_heartbeat)
+        asyncio.run(job_queue.execute(job.id, "w1"))
+
+        assert len(beats) >= 2 and beats[-1] > started
+        db.expire_all()
+        assert db.get(Job, job.id).status == JobStatus.SUCCEEDED.value
+        db.close()
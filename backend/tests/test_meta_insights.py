@@ -0,0 +1,310 @@
+"""Tests for the Meta insights fetch paths used by audits."""
+import asyncio
+import json
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from models import MetaInsightsCache
+from services import insights_cache, meta_audit
+
+
+class FakeGraph:
+    """Stands in for _api_get / _api_post; records the URLs hit."""
+
+    def __init__(self, statuses: list[str], pages: list[list[dict]]):
+        self.statuses = list(statuses)
+        self.pages = pages
+        self.calls: list[str] = []
+
+    async def post(self, url, token, params=None, timeout=60.0):
+        self.calls.append(f"POST {url}")
+        return {"report_run_id": "rr1"}
+
+    async def get(self, url, token, params=None, timeout=60.0):
+        self.calls.append(f"GET {url}")
+        if url.endswith("/rr1"):
+            return {"async_status": self.statuses.pop(0), "async_percent_completion": 50}
+        page = int(url.rsplit("=", 1)[1]) if "?page=" in url else 0
+        out = {"data": self.pages[page]}
+        if page + 1 < len(self.pages):
+            out["paging"] = {"next": f"{url.split('?')[0]}?page={page + 1}"}
+        return out
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    def install(statuses, pages):
+        fake = FakeGraph(statuses, pages)
+        monkeypatch.setattr(meta_audit, "_api_post", fake.post)
+        monkeypatch.setattr(meta_audit, "_api_get", fake.get)
+        monkeypatch.setattr(meta_audit, "ASYNC_REPORT_POLL_SECONDS", (0,))
+        monkeypatch.setattr(settings, "META_INSIGHTS_CACHE", False)
+        return fake
+    return install
+
+
+class TestAsyncInsights:
+    def test_polls_then_streams_report_pages(self, graph):
+        fake = graph(["Job Running", "Job Completed"], [
+            [{"impressions": "5"}, {"impressions": "0"}],
+            [{"impressions": "7"}],
+        ])
+        rows = asyncio.run(meta_audit.fetch_insights("act_1", "t", "adset", "2024-01-01", "2024-01-31", "1", use_async=True))
+        assert rows == [{"impressions": "5"}, {"impressions": "7"}]
+        assert fake.calls[0] == f"POST {meta_audit.BASE_URL}/act_1/insights"
+        assert f"GET {meta_audit.BASE_URL}/rr1/insights" in fake.calls
+
+    def test_failed_report_falls_back_to_synchronous_query(self, graph):
+        fake = graph(["Job Failed"], [[{"impressions": "3"}]])
+        rows = asyncio.run(meta_audit.fetch_breakdown("act_1", "t", "age,gender", "2024-01-01", "2024-01-31", use_async=True))
+        assert rows == [{"impressions": "3"}]
+        assert fake.calls[-1] == f"GET {meta_audit.BASE_URL}/act_1/insights"
+
+    def test_synchronous_by_default(self, graph):
+        fake = graph([], [[{"impressions": "1"}]])
+        asyncio.run(meta_audit.fetch_insights("act_1", "t", "ad", "2024-01-01", "2024-01-31", "all_days"))
+        assert fake.calls == [f"GET {meta_audit.BASE_URL}/act_1/insights"]
+
+
+class TestDeriveWindowRows:
+    def test_slices_daily_rows_into_each_window(self):
+        rows = [{"date_start": d, "spend": "1"} for d in ("2024-03-01", "2024-03-20", "2024-03-30", "2024-03-31")]
+        windows = {"7d": ("2024-03-25", "2024-03-31"), "30d": ("2024-03-02", "2024-03-31")}
+        derived = meta_audit.derive_window_rows(rows, windows)
+        assert [r["date_start"] for r in derived["7d"]] == ["2024-03-30", "2024-03-31"]
+        assert [r["date_start"] for r in derived["30d"]] == ["2024-03-20", "2024-03-30", "2024-03-31"]
+
+    def test_derived_totals_match_direct_aggregation(self):
+        rows = [
+            {"campaign_id": "c", "campaign_name": "C", "date_start": f"2024-03-{d:02d}",
+             "spend": "10", "impressions": "100", "reach": "80", "clicks": "5"}
+            for d in range(1, 31)
+        ]
+        windows = {"7d": ("2024-03-24", "2024-03-30")}
+        derived = meta_audit.derive_window_rows(rows, windows)["7d"]
+        [summary] = meta_audit.summarize_entities(derived, "campaign_id", "campaign_name", daily=True)
+        assert summary["spend"] == 70 and summary["impressions"] == 700 and summary["clicks"] == 35
+        assert summary["days_active"] == 7
+
+
+def _row(entity, spend, actions, values=(), costs=(), **extra):
+    return {
+        "ad_id": entity, "ad_name": entity.upper(), "spend": spend, "impressions": "100", "reach": "50", "clicks": "4",
+        "actions": [{"action_type": t, "value": v} for t, v in actions],
+        "action_values": [{"action_type": t, "value": v} for t, v in values],
+        "cost_per_action_type": [{"action_type": t, "value": v} for t, v in costs],
+        **extra,
+    }
+
+
+class TestActionAggregation:
+    def test_entities_sum_actions_in_first_seen_order(self):
+        rows = [
+            _row("a", "1.10", [("link_click", "3"), ("lead", "1")], values=[("lead", "20.5")]),
+            _row("b", "5", [("purchase", "2")], values=[("purchase", "99")]),
+            _row("a", "2.20", [("purchase", "1"), ("link_click", "2"), ("lead", "1")],
+                 values=[("purchase", "10"), ("add_to_cart", "7")]),
+            _row("", "9", [("lead", "1")]),
+        ]
+        by_id = {s["id"]: s for s in meta_audit.summarize_entities(rows, "ad_id", "ad_name", daily=False)}
+        a = by_id["a"]
+        assert set(by_id) == {"a", "b"}
+        assert a["spend"] == round(1.10 + 2.20, 2) and a["impressions"] == 200 and a["clicks"] == 8
+        assert list(a["all_actions"]) == ["link_click", "lead", "purchase"]
+        assert a["all_actions"]["lead"] == {"count": 2.0, "value": 20.5, "cost": round((1.10 + 2.20) / 2, 4)}
+        assert a["all_actions"]["purchase"]["value"] == 10.0
+        assert "add_to_cart" not in a["all_actions"]  # value without a matching action is ignored
+        assert by_id["b"]["all_actions"]["purchase"]["count"] == 2.0
+
+    def test_breakdown_keeps_first_row_cost_and_defaults_missing_dims(self):
+        rows = [
+            _row("x", "4", [("lead", "1")], costs=[("lead", "4")], age="25-34", gender="female"),
+            _row("x", "6", [("lead", "3")], costs=[("lead", "2")], age="25-34", gender="female"),
+            _row("x", "1", [], age="65+"),
+        ]
+        out = meta_audit.summarize_demographic_breakdown(rows, total_spend=11)
+        assert [(g["age"], g["gender"]) for g in out] == [("25-34", "female"), ("65+", "unknown")]
+        assert out[0]["all_actions"] == {"lead": {"count": 4.0, "value": 0.0, "cost": 4.0}}
+        assert out[0]["pct_of_total_spend"] == round(10 / 11 * 100, 2)
+        assert out[1]["all_actions"] == {}
+
+    def test_rows_without_actions(self):
+        [summary] = meta_audit.summarize_entities([_row("a", "3", [])], "ad_id", "ad_name", daily=False)
+        assert summary["all_actions"] == {} and summary["spend"] == 3.0
+
+
+@pytest.fixture
+def cache_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    MetaInsightsCache.__table__.create(engine)
+    monkeypatch.setattr(insights_cache, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "META_INSIGHTS_SETTLE_DAYS", 3)
+    return sessionmaker(bind=engine)
+
+
+class TestInsightsCache:
+    def _fetcher(self, calls):
+        async def fetch(since, until):
+            calls.append((since, until))
+            start, end = date.fromisoformat(since), date.fromisoformat(until)
+            return [
+                {"date_start": (start + timedelta(days=i)).isoformat(), "spend": "1"}
+                for i in range((end - start).days + 1)
+            ]
+        return fetch
+
+    def test_only_missing_and_unsettled_days_are_fetched(self, cache_db):
+        today = date.today()
+        since, until = (today - timedelta(days=20)).isoformat(), (today - timedelta(days=1)).isoformat()
+        params = {"level": "adset", "fields": "spend", "limit": 500}
+
+        calls = []
+        rows = asyncio.run(insights_cache.daily_rows("act_1", "adset", params, since, until, self._fetcher(calls)))
+        assert calls == [(since, until)] and len(rows) == 20
+
+        calls.clear()
+        rows = asyncio.run(insights_cache.daily_rows("act_1", "adset", params, since, until, self._fetcher(calls)))
+        # Only the last three (still-settling) days go back to Meta
+        assert calls == [((today - timedelta(days=3)).isoformat(), until)]
+        assert [r["date_start"] for r in rows] == [
+            (today - timedelta(days=20 - i)).isoformat() for i in range(20)
+        ]
+
+    def test_gaps_fetched_separately_and_keys_isolated(self, cache_db):
+        old = date.today() - timedelta(days=60)
+        params = {"level": "ad", "fields": "spend"}
+        calls = []
+        asyncio.run(insights_cache.daily_rows(
+            "act_1", "ad", params, (old + timedelta(days=3)).isoformat(), (old + timedelta(days=4)).isoformat(),
+            self._fetcher(calls),
+        ))
+        calls.clear()
+        asyncio.run(insights_cache.daily_rows(
+            "act_1", "ad", params, old.isoformat(), (old + timedelta(days=6)).isoformat(), self._fetcher(calls),
+        ))
+        assert calls == [
+            (old.isoformat(), (old + timedelta(days=2)).isoformat()),
+            ((old + timedelta(days=5)).isoformat(), (old + timedelta(days=6)).isoformat()),
+        ]
+        # Different fields hash → separate cache entries
+        calls.clear()
+        asyncio.run(insights_cache.daily_rows(
+            "act_1", "ad", {"level": "ad", "fields": "spend,clicks"}, old.isoformat(), old.isoformat(),
+            self._fetcher(calls),
+        ))
+        assert calls == [(old.isoformat(), old.isoformat())]
+        assert insights_cache.stats()["hit_rate"] is not None
+
+
+def _audit_payload(n_ads: int) -> dict:
+    def entity(i):
+        return {
+            "id": str(i), "name": f"Ad «{i}»", "spend": i * 1.5,
+            "all_actions": {f"action_{k}": {"count": float(k), "value": 0.0, "cost": 1.0} for k in range(8)},
+            "creative": {"body": "x" * 200, "headline": "Headline", "cta": "SHOP_NOW"},
+        }
+    windows = {
+        w: {"date_range": {"since": "2024-01-01"}, "campaigns": [entity(0)], "adsets": [entity(1)],
+            "ads": [entity(i) for i in range(n_ads)]}
+        for w in ("7d", "30d", "60d", "90d")
+    }
+    return {"account": {"name": "Acme"}, "windows": windows, "audiences": [], "business_context": {}}
+
+
+class TestTruncatePayload:
+    def test_small_payload_untouched(self):
+        payload = _audit_payload(3)
+        expected = json.dumps(payload)
+        out, text = meta_audit._truncate_payload(payload)
+        assert text == expected and "_truncation_note" not in out
+
+    @pytest.mark.parametrize("n_ads", [60, 150, 400])
+    def test_text_matches_json_dumps_after_truncation(self, n_ads):
+        out, text = meta_audit._truncate_payload(_audit_payload(n_ads))
+        assert text == json.dumps(out)
+        assert out["_truncation_note"][0] == "90d ad-level data removed"
+
+    def test_size_tracks_edits(self):
+        payload = _audit_payload(20)
+        doc = meta_audit._SerializedPayload(payload)
+        assert doc.size() == len(json.dumps(payload))
+        payload["windows"]["7d"].pop("ads")
+        doc.refresh("7d", "ads")
+        doc.set("_truncation_note", ["x"])
+        assert doc.size() == len(json.dumps(payload)) == len(doc.text())
+
+
+class FakeBatchApi:
+    """Stands in for the Batch API; `fail` maps ad id -> codes returned on successive attempts."""
+
+    def __init__(self, fail: dict[str, list[int]] | None = None):
+        self.fail = {ad_id: list(codes) for ad_id, codes in (fail or {}).items()}
+        self.requested: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def post(self, url, token, params=None, timeout=60.0):
+        ad_ids = [item["relative_url"].split("/")[1].split("?")[0] for item in json.loads(params["batch"])]
+        self.requested.append(ad_ids)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        out = []
+        for ad_id in ad_ids:
+            code = self.fail[ad_id].pop(0) if self.fail.get(ad_id) else 200
+            if code == 200:
+                body = {"creative": {"object_type": "SHARE", "title": f"T{ad_id}", "body": "B"}}
+            else:
+                body = {"error": {"code": 17 if code == 400 else 2}}
+            out.append({"code": code, "headers": [], "body": json.dumps(body)})
+        return out
+
+
+@pytest.fixture
+def creative_db(monkeypatch):
+    from models import MetaCreativeCache
+    from services import creative_cache
+
+    engine = create_engine("sqlite://")
+    MetaCreativeCache.__table__.create(engine)
+    monkeypatch.setattr(creative_cache, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "META_CREATIVE_CACHE_TTL_HOURS", 24)
+    monkeypatch.setattr(settings, "META_CREATIVE_BATCH_CONCURRENCY", 3)
+    monkeypatch.setattr(meta_audit.rate_limiter.TokenBucket, "observe_meta", lambda *a, **kw: None)
+
+    def install(fake):
+        monkeypatch.setattr(meta_audit, "_api_post", fake.post)
+        return fake
+    return install
+
+
+class TestCreativeMetadata:
+    def test_batches_run_concurrently_and_parse(self, creative_db):
+        fake = creative_db(FakeBatchApi())
+        ids = [str(i) for i in range(160)]
+        out = asyncio.run(meta_audit.fetch_creative_metadata(ids, "t"))
+        assert [len(b) for b in fake.requested] == [50, 50, 50, 10]
+        assert fake.max_in_flight == 3
+        assert out["7"] == {"format": "LINK", "headline": "T7", "body": "B", "call_to_action": "",
+                            "thumbnail_url": "", "link_url": ""}
+
+    def test_only_failed_sub_requests_are_retried(self, creative_db):
+        # "1" is throttled once (code 17), "2" hits a 500 twice, "3" is a permanent 404
+        fake = creative_db(FakeBatchApi({"1": [400], "2": [500, 500], "3": [404]}))
+        out = asyncio.run(meta_audit.fetch_creative_metadata(["0", "1", "2", "3"], "t"))
+        assert fake.requested == [["0", "1", "2", "3"], ["1", "2"], ["2"]]
+        assert out["1"]["headline"] == "T1" and out["2"]["headline"] == "T2"
+        assert out["3"] is None
+
+    def test_cached_creatives_are_not_refetched(self, creative_db):
+        creative_db(FakeBatchApi())
+        asyncio.run(meta_audit.fetch_creative_metadata(["a", "b"], "t"))
+        fake = creative_db(FakeBatchApi())
+        out = asyncio.run(meta_audit.fetch_creative_metadata(["a", "b", "c"], "t"))
+        assert fake.requested == [["c"]]
+        assert out["a"]["headline"] == "Ta"
@@ -0,0 +1,75 @@
+"""Tests for the bounded-concurrency Custom Audience upload session."""
+import asyncio
+import json
+import random
+
+import pytest
+
+from api import meta_client
+
+
+class _FakeMeta:
+    def __init__(self, fail_seq: int | None = None):
+        self.fail_seq = fail_seq
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed: list[int] = []
+        self.last_started_after: list[int] | None = None
+        self.sessions: list[dict] = []
+
+    async def request(self, method, url, **kwargs):
+        body = json.loads(kwargs["content"])
+        session = body["session"]
+        self.sessions.append(session)
+        if session["last_batch_flag"]:
+            self.last_started_after = list(self.completed)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.005))
+            if session["batch_seq"] == self.fail_seq:
+                raise RuntimeError("boom")
+            self.completed.append(session["batch_seq"])
+            return {"num_received": len(body["payload"]["data"]), "num_invalid_entries": 0}
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_meta(monkeypatch):
+    def install(**kwargs):
+        fake = _FakeMeta(**kwargs)
+        monkeypatch.setattr(meta_client, "_request", fake.request)
+        monkeypatch.setattr(meta_client, "BATCH_SIZE", 10)
+        return fake
+    return install
+
+
+class TestUploadUsers:
+    def test_last_batch_sent_after_all_others_acknowledged(self, fake_meta):
+        fake = fake_meta()
+        rows = [[f"h{i}", i] for i in range(95)]
+        result = asyncio.run(meta_client.upload_users("aud", ["EMAIL", "LOOKALIKE_VALUE"], rows, concurrency=3))
+
+        assert result["num_received"] == 95
+        assert fake.max_in_flight <= 3
+        assert sorted(fake.last_started_after) == list(range(1, 10))
+        last = [s for s in fake.sessions if s["last_batch_flag"]]
+        assert len(last) == 1 and last[0]["batch_seq"] == 10
+        assert {s["session_id"] for s in fake.sessions} == {result["stats"]["session_id"]}
+        assert all(s["estimated_num_total"] == 95 for s in fake.sessions)
+        assert [b["batch_seq"] for b in result["stats"]["per_batch"]] == list(range(1, 11))
+
+    def test_zero_batches_sends_nothing(self, fake_meta):
+        fake = fake_meta()
+        result = asyncio.run(meta_client.replace_users("aud", ["EMAIL"], []))
+        assert fake.sessions == []
+        assert result["num_received"] == 0 and result["num_invalid"] == 0
+        assert result["stats"]["batches"] == 0 and result["stats"]["per_batch"] == []
+
+    def test_failed_batch_aborts_before_last_batch(self, fake_meta):
+        fake = fake_meta(fail_seq=2)
+        rows = [["h", 1]] * 60
+        with pytest.raises(RuntimeError):
+            asyncio.run(meta_client.upload_users("aud", ["EMAIL", "LOOKALIKE_VALUE"], rows, concurrency=2))
+        assert not any(s["last_batch_flag"] for s in fake.sessions)
@@ -0,0 +1,25 @@
+"""Tests for the streaming percentile ranker."""
+import random
+from array import array
+
+from api.claude_client import PercentileRanker
+from services.normalizer import normalize_and_stats, ranker_and_stats
+
+
+class TestRankerAndStats:
+    def test_matches_list_based_normalization(self):
+        rng = random.Random(5)
+        values = [round(rng.uniform(0, 500), 2) if rng.random() < 0.6 else 0.0 for _ in range(501)]
+        percentiles, stats = normalize_and_stats(values)
+        ranker, streamed_stats = ranker_and_stats(array("d", values))
+        assert [ranker.rank(v) for v in values] == percentiles
+        assert streamed_stats == stats
+
+    def test_even_count_median_and_single_value(self):
+        _, stats = ranker_and_stats(array("d", [4.0, 1.0, 3.0, 2.0]))
+        assert stats["median_ltv"] == 2.5
+        assert PercentileRanker([7.0]).rank(7.0) == 50
+
+    def test_empty(self):
+        _, stats = ranker_and_stats(array("d"))
+        assert stats["count"] == 0 and stats["median_ltv"] == 0
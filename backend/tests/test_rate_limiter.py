@@ -0,0 +1,156 @@
+"""Tests for the header-driven GHL / Meta rate-limit buckets."""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from api.rate_limiter import MAX_BACKOFF_SECONDS, RateLimited, TokenBucket
+
+
+def _bucket(rate: float = 5.0, capacity: float = 5.0) -> TokenBucket:
+    return TokenBucket("test", "k", rate, capacity)
+
+
+class TestGhlHeaders:
+    def test_paces_under_advertised_window(self):
+        b = _bucket()
+        b.observe_ghl(200, {
+            "x-ratelimit-max": "100",
+            "x-ratelimit-interval-milliseconds": "10000",
+            "x-ratelimit-remaining": "40",
+        })
+        assert b.capacity == 100
+        assert b.rate == 9.0  # 10/s × 0.9 headroom
+        assert b.tokens <= 40
+        assert b.snapshot()["usage"]["remaining"] == 40
+
+    def test_exhausted_window_pauses(self):
+        b = _bucket()
+        b.observe_ghl(200, {"x-ratelimit-remaining": "0", "x-ratelimit-interval-milliseconds": "2000"})
+        assert 1.5 < b.snapshot()["paused_for_seconds"] <= 2.0
+
+    def test_429_honours_retry_after(self):
+        b = _bucket()
+        b.observe_ghl(429, {"retry-after": "7"})
+        assert b.throttled == 1
+        assert 6.5 < b.snapshot()["paused_for_seconds"] <= 7.0
+
+
+class TestMetaHeaders:
+    def test_slows_down_as_usage_climbs(self):
+        b = _bucket(rate=10.0)
+        b.observe_meta(200, {"x-app-usage": json.dumps({"call_count": 20, "total_cputime": 5, "total_time": 5})})
+        assert b.rate == 10.0
+        b.observe_meta(200, {"x-ad-account-usage": json.dumps({"acc_id_util_pct": 75})})
+        assert b.rate == 5.0
+        # Responses without usage headers keep the last known pace
+        b.observe_meta(200, {})
+        assert b.rate == 5.0
+
+    def test_business_use_case_regain_time_pauses(self):
+        b = _bucket()
+        buc = {"123": [{"type": "ads_insights", "call_count": 100, "total_cputime": 40,
+                        "total_time": 30, "estimated_time_to_regain_access": 2}]}
+        b.observe_meta(400, {"x-business-use-case-usage": json.dumps(buc)}, error_code=80000)
+        snap = b.snapshot()
+        assert snap["throttled"] == 1
+        assert 119 < snap["paused_for_seconds"] <= 120
+        assert snap["usage"]["business_use_case"]["123"]["max_pct"] == 100
+
+    def test_regain_time_beyond_cap_fails_instead_of_sleeping(self):
+        b = _bucket()
+        buc = {"123": [{"type": "ads_insights", "call_count": 100, "estimated_time_to_regain_access": 60}]}
+        b.observe_meta(400, {"x-business-use-case-usage": json.dumps(buc)}, error_code=80000)
+        snap = b.snapshot()
+        assert snap["paused_for_seconds"] == 0
+        assert MAX_BACKOFF_SECONDS < snap["blocked_for_seconds"] <= 3600
+        with pytest.raises(RateLimited, match="budget exhausted"):
+            asyncio.run(b.acquire())
+
+
+class TestAcquire:
+    def test_waits_for_refill_once_burst_is_spent(self):
+        b = _bucket(rate=50.0, capacity=2.0)
+
+        async def run():
+            for _ in range(4):
+                await b.acquire()
+
+        start = time.monotonic()
+        asyncio.run(run())
+        # Two tokens up front, two more at 50/s
+        assert time.monotonic() - start >= 0.03
+        assert b.requests == 4
+
+
+class TestGhlRetry:
+    def test_attempts_logged_out_of_total_and_give_up_reported(self, monkeypatch, caplog):
+        from api import ghl_client, rate_limiter
+
+        class _Bucket:
+            async def acquire(self):
+                pass
+
+            def observe_ghl(self, status, headers):
+                pass
+
+        class _Client:
+            calls = 0
+
+            async def request(self, method, url, **kwargs):
+                self.calls += 1
+                return httpx.Response(429)
+
+        monkeypatch.setattr(rate_limiter, "ghl", lambda _loc: _Bucket())
+        client = _Client()
+        with caplog.at_level("WARNING", logger="api.ghl_client"):
+            resp = asyncio.run(ghl_client._request_with_retry(client, "GET", "https://ghl/x", max_retries=2))
+
+        assert resp.status_code == 429 and client.calls == 3
+        messages = [r.getMessage() for r in caplog.records]
+        assert [m for m in messages if "(attempt" in m][-1].endswith("(attempt 3/3)")
+        assert any("giving up" in m for m in messages)
+
+
+class TestMetaRequest:
+    def _install(self, monkeypatch, responses):
+        from api import http_pool, rate_limiter
+
+        observed = []
+
+        class _Bucket:
+            key = "k"
+
+            async def acquire(self):
+                pass
+
+            def observe_meta(self, status, headers, error_code=None):
+                observed.append((status, error_code))
+
+        class _Client:
+            async def request(self, method, url, **kwargs):
+                return responses.pop(0)
+
+        monkeypatch.setattr(rate_limiter, "meta", lambda _token: _Bucket())
+        monkeypatch.setattr(http_pool, "get_client", lambda _url: _Client())
+        return observed
+
+    def test_retries_throttled_then_returns_response(self, monkeypatch):
+        from api import rate_limiter
+
+        observed = self._install(monkeypatch, [
+            httpx.Response(400, json={"error": {"code": 17}}),
+            httpx.Response(200, json={"id": "1"}),
+        ])
+        resp = asyncio.run(rate_limiter.meta_request("GET", "https://graph/x", "tok"))
+        assert resp.json() == {"id": "1"}
+        assert observed == [(400, 17), (200, None)]
+
+    def test_gives_up_after_max_attempts(self, monkeypatch):
+        from api import rate_limiter
+
+        self._install(monkeypatch, [httpx.Response(429) for _ in range(2)])
+        with pytest.raises(RuntimeError, match="still rate limited"):
+            asyncio.run(rate_limiter.meta_request("GET", "https://graph/x?access_token=t", "tok", max_attempts=2))
@@ -1,6 +1,13 @@
-"""Tests for LTV field resolution and extraction logic in sync_service."""
+"""Tests for LTV field resolution, extraction and multi-account runs in sync_service."""
+import asyncio
+
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
+from models import SyncConfig
+from services import credential_resolver, sync_service
+from services.credential_resolver import AccountCredentials
 from services.sync_service import _resolve_ltv_field_uuid, _extract_ltv
 
 # ---------------------------------------------------------------------------
@@ -129,3 +136,64 @@ class TestLtvExtractionLoop:
         values = self._extract_all(contacts, "uuid-ltv")
         assert all(v == 0.0 for v in values)
         assert sum(1 for v in values if v > 0) == 0
+
+
+# ---------------------------------------------------------------------------
+# run_syncs
+# ---------------------------------------------------------------------------
+
+class TestRunSyncs:
+    def _setup(self, monkeypatch, locations: dict[str, str]):
+        engine = create_engine("sqlite://")
+        SyncConfig.__table__.create(engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        for account in locations:
+            db.add(SyncConfig(ghl_ltv_field_key="k", ghl_ltv_field_name="n", meta_ad_account_id=account))
+        db.commit()
+        ids = {c.meta_ad_account_id: c.id for c in db.query(SyncConfig)}
+        db.close()
+
+        monkeypatch.setattr(credential_resolver, "resolve", lambda account, db=None: AccountCredentials(
+            meta_ad_account_id=account, ghl_location_id=locations[account],
+        ))
+        log: list[tuple[str, int]] = []
+        state = {"active": 0, "peak": 0}
+
+        async def fake_run_sync(config_id, db, skip_email=False, creds=None):
+            sync_service._claim(config_id)
+            try:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                log.append(("start", config_id))
+                await asyncio.sleep(0.01)
+                log.append(("end", config_id))
+                state["active"] -= 1
+                return config_id * 10
+            finally:
+                sync_service._running.pop(config_id, None)
+
+        monkeypatch.setattr(sync_service, "run_sync", fake_run_sync)
+        return factory, ids, log, state
+
+    def test_runs_accounts_in_parallel_up_to_limit(self, monkeypatch):
+        factory, ids, _, state = self._setup(
+            monkeypatch, {"act_1": "loc1", "act_2": "loc2", "act_3": "loc3"})
+        result = asyncio.run(sync_service.run_syncs(list(ids.values()), factory, max_concurrency=2))
+        assert result == {cid: cid * 10 for cid in ids.values()}
+        assert state["peak"] == 2
+
+    def test_shared_ghl_location_is_serialized(self, monkeypatch):
+        factory, ids, log, _ = self._setup(
+            monkeypatch, {"act_1": "shared", "act_2": "shared"})
+        asyncio.run(sync_service.run_syncs(list(ids.values()), factory, max_concurrency=4))
+        assert [e for e, _ in log] == ["start", "end", "start", "end"]
+
+    def test_already_running_config_is_skipped(self, monkeypatch):
+        factory, ids, log, _ = self._setup(monkeypatch, {"act_1": "loc1"})
+        sync_service._claim(ids["act_1"])
+        try:
+            result = asyncio.run(sync_service.run_syncs([ids["act_1"]], factory))
+        finally:
+            sync_service._running.pop(ids["act_1"], None)
+        assert result == {ids["act_1"]: None} and not log
@@ -0,0 +1,305 @@
+"""Tests for the Stripe transaction sync (listing, cursors, storage)."""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import stripe
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from config import settings
+from models import StripeSyncCursor, StripeTransaction
+from services import loop_monitor, transaction_sync
+
+
+def _pi(pid, created, status="succeeded"):
+    return SimpleNamespace(
+        id=pid, created=created, status=status, latest_charge=None, customer=None, metadata={},
+        invoice=None, amount_received=1000, amount=1000, currency="usd", payment_method_types=["card"],
+        description="",
+    )
+
+
+def _charge(cid, created, payment_intent=None):
+    return SimpleNamespace(
+        id=cid, created=created, status="succeeded", payment_intent=payment_intent, billing_details=None,
+        customer=None, invoice=None, amount=500, currency="usd", payment_method_details=None,
+        metadata={}, description="",
+    )
+
+
+class FakeStripe:
+    """Serves objects newest-first, honouring created[gte] and starting_after."""
+
+    def __init__(self, payment_intents, charges, delay=0.0):
+        self.objects = {"pi": payment_intents, "ch": charges}
+        self.calls: list[tuple[str, dict]] = []
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.threads: set[int] = set()
+
+    def lister(self, kind):
+        def list_(**params):
+            with self.lock:
+                self.calls.append((kind, params))
+                self.threads.add(threading.get_ident())
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(self.delay)  # a blocking HTTP round trip
+            with self.lock:
+                self.active -= 1
+            gte = params.get("created", {}).get("gte", 0)
+            rows = sorted((o for o in self.objects[kind] if o.created >= gte), key=lambda o: -o.created)
+            if "starting_after" in params:
+                ids = [o.id for o in rows]
+                rows = rows[ids.index(params["starting_after"]) + 1:]
+            page = rows[: params["limit"]]
+            return SimpleNamespace(data=page, has_more=len(rows) > len(page))
+        return list_
+
+
+@pytest.fixture
+def sync_env(monkeypatch):
+    # Storage runs in worker threads on its own session; share the one in-memory connection
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    for table in (StripeTransaction.__table__, StripeSyncCursor.__table__):
+        table.create(engine)
+    db = sessionmaker(bind=engine)()
+
+    async def no_contacts(_db):
+        return []
+
+    def no_match(*_args, **_kwargs):
+        return {"ghl_contact": None, "match_method": "none"}
+
+    async def no_ltv(_db):
+        return 0
+
+    monkeypatch.setattr(settings, "STRIPE_SECRET_KEY", "sk_test_1")
+    monkeypatch.setattr(settings, "STRIPE_SYNC_OVERLAP_HOURS", 1)
+    monkeypatch.setattr(transaction_sync, "get_contacts", no_contacts)
+    monkeypatch.setattr(transaction_sync, "match_stripe_to_ghl", no_match)
+    monkeypatch.setattr(transaction_sync, "recompute_all_ltv", no_ltv)
+
+    def install(fake):
+        monkeypatch.setattr(stripe.PaymentIntent, "list", fake.lister("pi"))
+        monkeypatch.setattr(stripe.Charge, "list", fake.lister("ch"))
+        return fake
+
+    yield db, install
+    db.close()
+
+
+def _sync(db, **kw):
+    return asyncio.run(transaction_sync._run_transaction_sync(db, kw.pop("days_back", None), kw.pop("limit", 5000), **kw))
+
+
+class TestIncrementalSync:
+    def test_first_run_lists_everything_and_sets_cursors(self, sync_env):
+        db, install = sync_env
+        now = int(time.time())
+        install(FakeStripe([_pi("pi_1", now - 86400 * 30), _pi("pi_2", now - 60)],
+                           [_charge("ch_1", now - 120), _charge("ch_2", now - 60, payment_intent="pi_2")]))
+        stats = _sync(db)
+        assert stats["new"] == 3 and stats["incremental"] is False
+        cursors = {c.object_type: c for c in db.query(StripeSyncCursor)}
+        assert cursors["payment_intent"].last_object_id == "pi_2"
+        assert cursors["charge"].last_object_id == "ch_2"
+
+    def test_second_run_only_pages_since_cursor_minus_overlap(self, sync_env):
+        db, install = sync_env
+        now = int(time.time())
+        install(FakeStripe([_pi("pi_1", now - 86400 * 30)], []))
+        _sync(db)
+        fake = install(FakeStripe([_pi("pi_1", now - 86400 * 30), _pi("pi_2", now - 10)], []))
+        stats = _sync(db)
+        [(_, params)] = [c for c in fake.calls if c[0] == "pi"]
+        assert params["created"]["gte"] == now - 86400 * 30 - 3600
+        assert stats["incremental"] is True
+        assert stats["new"] == 1 and stats["skipped"] == 1
+
+    def test_truncated_listing_does_not_advance_cursor(self, sync_env):
+        db, install = sync_env
+        now = int(time.time())
+        install(FakeStripe([_pi(f"pi_{i}", now - i) for i in range(150)], []))
+        _sync(db, limit=100)
+        assert db.query(StripeSyncCursor).filter_by(object_type="payment_intent").first() is None
+
+    def test_full_resync_ignores_cursor(self, sync_env):
+        db, install = sync_env
+        now = int(time.time())
+        install(FakeStripe([_pi("pi_1", now - 86400 * 30)], []))
+        _sync(db)
+        fake = install(FakeStripe([_pi("pi_1", now - 86400 * 30)], []))
+        _sync(db, full_resync=True)
+        assert all("created" not in params for _, params in fake.calls)
+        assert db.query(StripeSyncCursor).count() == 1
+
+
+class TestListingPipeline:
+    def test_lists_both_kinds_concurrently_off_the_loop(self, sync_env, monkeypatch):
+        db, install = sync_env
+        monkeypatch.setattr(transaction_sync, "LIST_PAGE_SIZE", 2)
+        monkeypatch.setattr(transaction_sync, "PIPELINE_CHUNK", 3)
+        now = int(time.time())
+        fake = install(FakeStripe(
+            [_pi(f"pi_{i}", now - i) for i in range(6)],
+            [_charge(f"ch_{i}", now - i) for i in range(5)] + [_charge("ch_pi", now, payment_intent="pi_0")],
+            delay=0.05,
+        ))
+        match_threads = set()
+
+        def match(*_args, **_kwargs):
+            match_threads.add(threading.get_ident())
+            return {"ghl_contact": None, "match_method": "none"}
+
+        monkeypatch.setattr(transaction_sync, "match_stripe_to_ghl", match)
+        stats = _sync(db)
+        assert fake.peak == 2
+        assert threading.get_ident() not in fake.threads | match_threads
+        assert (stats["total"], stats["new"], stats["skipped"]) == (11, 11, 0)
+        assert db.query(StripeTransaction).count() == 11
+        assert db.query(StripeSyncCursor).count() == 2
+
+    def test_event_loop_stays_responsive(self, sync_env, monkeypatch):
+        db, install = sync_env
+        monkeypatch.setattr(transaction_sync, "LIST_PAGE_SIZE", 1)
+        now = int(time.time())
+        install(FakeStripe([_pi(f"pi_{i}", now - i) for i in range(3)], [], delay=0.3))
+
+        async def run():
+            loop_monitor.start(interval=0.01)
+            try:
+                return await transaction_sync._run_transaction_sync(db, None, 5000)
+            finally:
+                await loop_monitor.stop()
+
+        stats = asyncio.run(run())
+        assert stats["new"] == 3
+        assert stats["max_loop_lag_ms"] < 150
+
+    def test_listing_error_propagates_without_advancing_cursors(self, sync_env, monkeypatch):
+        db, install = sync_env
+        install(FakeStripe([_pi("pi_1", int(time.time()))], []))
+
+        def broken(**_params):
+            raise stripe.APIConnectionError("down")
+
+        monkeypatch.setattr(stripe.Charge, "list", broken)
+        with pytest.raises(stripe.APIConnectionError):
+            _sync(db)
+        assert db.query(StripeSyncCursor).count() == 0
+
+
+class TestTransactionUpserter:
+    def _payment(self, pid, refunded=0, refund_date=None):
+        return {"payment_id": pid, "amount_cents": 1000, "currency": "usd",
+                "created_at": datetime(2024, 1, 1), "refunded_amount": refunded, "refund_date": refund_date}
+
+    def test_inserts_in_chunks_and_updates_refunds(self, sync_env, monkeypatch):
+        db, _ = sync_env
+        monkeypatch.setattr(transaction_sync, "UPSERT_CHUNK", 2)
+        writer = transaction_sync.TransactionUpserter(db, set())
+        for i in range(5):
+            writer.add(transaction_sync._transaction_row(self._payment(f"pi_{i}")))
+        writer.add(transaction_sync._transaction_row(self._payment("pi_0")))  # duplicate in run
+        writer.close()
+        assert (writer.inserted, writer.updated, writer.failed) == (5, 0, 0)
+
+        writer = transaction_sync.TransactionUpserter(db, {"pi_0", "pi_1"})
+        writer.add(transaction_sync._transaction_row(self._payment("pi_0", refunded=400, refund_date=datetime(2024, 2, 3))))
+        writer.add(transaction_sync._transaction_row(self._payment("pi_1")))
+        writer.close()
+        assert (writer.inserted, writer.updated) == (0, 1)
+        refunded = db.query(StripeTransaction).filter_by(stripe_payment_id="pi_0").one()
+        assert refunded.refunded_amount == 400 and refunded.refund_date == datetime(2024, 2, 3)
+        assert db.query(StripeTransaction).count() == 5
+
+    def test_refund_date_comes_from_stripe_not_the_sync_clock(self, sync_env):
+        db, _ = sync_env
+        charge = SimpleNamespace(amount_refunded=700, refunds=SimpleNamespace(data=[
+            SimpleNamespace(created=int(datetime(2023, 5, 1).timestamp())),
+            SimpleNamespace(created=int(datetime(2023, 6, 1).timestamp())),
+        ]))
+        assert transaction_sync._refund_date(charge) == datetime.utcfromtimestamp(int(datetime(2023, 6, 1).timestamp()))
+        assert transaction_sync._refund_date(SimpleNamespace(refunds=None)) is None
+
+        writer = transaction_sync.TransactionUpserter(db, set())
+        writer.add(transaction_sync._transaction_row(self._payment("pi_dated", 400, datetime(2023, 6, 1))))
+        writer.add(transaction_sync._transaction_row(self._payment("pi_unknown", 400)))
+        writer.close()
+        dates = dict(db.query(StripeTransaction.stripe_payment_id, StripeTransaction.refund_date))
+        assert dates == {"pi_dated": datetime(2023, 6, 1), "pi_unknown": None}
+
+        # A larger refund without a known date keeps the stored one
+        writer = transaction_sync.TransactionUpserter(db, {"pi_dated"})
+        writer.add(transaction_sync._transaction_row(self._payment("pi_dated", 600)))
+        writer.close()
+        assert db.query(StripeTransaction).filter_by(stripe_payment_id="pi_dated").one().refund_date == datetime(2023, 6, 1)
+
+
+class TestLineItems:
+    def test_fetched_concurrently_once_per_session_per_run(self, monkeypatch):
+        monkeypatch.setattr(settings, "STRIPE_LINE_ITEM_CONCURRENCY", 4)
+
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0, "calls": []}
+
+        def list_line_items(session_id, limit=10):
+            with lock:
+                state["calls"].append(session_id)
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            if session_id == "cs_bad":
+                raise stripe.APIConnectionError("down")
+            item = SimpleNamespace(to_dict=lambda: {"description": f"Item {session_id}"})
+            return SimpleNamespace(data=[item])
+
+        monkeypatch.setattr(stripe.checkout.Session, "list_line_items", list_line_items)
+        fetched = {"cs_earlier": [{"description": "Earlier chunk"}]}
+        sessions = ["cs_earlier", "cs_bad"] + [f"cs_{i}" for i in range(8)] + ["cs_0"]
+        out = asyncio.run(transaction_sync._fetch_line_items(stripe, sessions, fetched))
+
+        assert sorted(state["calls"]) == sorted(["cs_bad"] + [f"cs_{i}" for i in range(8)])
+        assert 1 < state["peak"] <= 4
+        assert out["cs_earlier"] == [{"description": "Earlier chunk"}]
+        assert out["cs_3"] == [{"description": "Item cs_3"}]
+        assert out["cs_bad"] == [] and "cs_bad" not in fetched
+
+        # A later chunk reuses what this run fetched and retries the failure
+        state["calls"].clear()
+        asyncio.run(transaction_sync._fetch_line_items(stripe, ["cs_3", "cs_bad"], fetched))
+        assert state["calls"] == ["cs_bad"]
+
+
+class TestRecomputeLtv:
+    def test_single_upsert_without_ghl_calls(self, monkeypatch):
+        async def no_ghl(_db):
+            raise AssertionError("LTV recompute must read the contact mirror, not GHL")
+
+        monkeypatch.setattr(transaction_sync, "get_contacts", no_ghl)
+        executed = []
+
+        class FakeDb:
+            def execute(self, stmt):
+                executed.append(stmt)
+                return SimpleNamespace(rowcount=3)
+
+            def commit(self):
+                pass
+
+        assert asyncio.run(transaction_sync.recompute_all_ltv(FakeDb())) == 3
+        [stmt] = executed
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        assert compiled.params == {}
+        assert "ON CONFLICT (ghl_contact_id) DO UPDATE" in str(compiled)
@@ -0,0 +1,47 @@
+"""
+Standalone job worker: python -m worker
+
+Claims jobs from the `jobs` table (see services/job_queue.py) and runs them
+until SIGINT/SIGTERM, then finishes the jobs it has in flight. Run as many
+as needed; pair with JOB_WORKER_EMBEDDED=false on the web app.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from api import http_pool
+from config import settings
+from database import init_db, run_migrations
+
+logging.basicConfig(
+    level=getattr(logging, settings.LOG_LEVEL),
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("worker")
+
+
+async def main(concurrency: int | None) -> None:
+    from services import job_queue, loop_monitor
+
+    init_db()
+    run_migrations()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    loop_monitor.start()
+    try:
+        await job_queue.run_worker(stop, concurrency=concurrency)
+    finally:
+        await loop_monitor.stop()
+        await http_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the background job worker")
+    parser.add_argument("--concurrency", type=int, default=None, help="Jobs run at once (default JOB_WORKER_CONCURRENCY)")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -53,10 +53,20 @@ export interface SyncRunDetail extends SyncRun {
   contact_samples: ContactSample[];
 }
 
+export interface AccountSyncStatus {
+  config_id: number;
+  account_id: string;
+  sync_enabled: boolean;
+  is_running: boolean;
+  running_sync_id: number | null;
+  last_run: SyncRun | null;
+}
+
 export interface SyncStatus {
   is_running: boolean;
   running_sync_id: number | null;
   last_run: SyncRun | null;
+  accounts: AccountSyncStatus[];
 }
 
 export interface SyncHistory {